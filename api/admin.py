@@ -0,0 +1,42 @@
+"""
+Admin endpoints for cache inspection and invalidation.
+"""
+from fastapi import APIRouter
+from typing import Optional
+from core.itinerary_cache import invalidate_itineraries, itinerary_cache_stats
+from core.tools import search_stats
+from core.extractor import fast_path_stats
+from core.session_cache import session_cache
+from core.admission import admission_stats
+from core.prefetch import prefetch_stats
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the session, itinerary and search caches, the chat fast path and research prefetch."""
+    return {
+        "sessions": session_cache.stats(),
+        "itineraries": itinerary_cache_stats(),
+        "search": search_stats(),
+        "fast_path": fast_path_stats(),
+        "prefetch": prefetch_stats()
+    }
+
+
+@router.delete("/cache/itineraries")
+async def clear_itinerary_cache(destination: Optional[str] = None):
+    """Invalidate cached itineraries, for one destination or all of them."""
+    removed = invalidate_itineraries(destination)
+    logger.info(f"Invalidated {removed} cached itineraries (destination={destination})")
+    return {"removed": removed}
+
+
+@router.get("/queue")
+async def queue_stats():
+    """Admission control: active chat turns and planning jobs, model rate-limit buckets and rejections."""
+    return admission_stats()
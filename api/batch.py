@@ -0,0 +1,36 @@
+"""
+Batch planning endpoint for bulk and partner jobs.
+"""
+import json
+from typing import Optional
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+from core.batch import run_batch, BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/batch/plan")
+async def batch_plan(request: Request, concurrency: int = Query(BATCH_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY),
+                     owner: Optional[str] = Query(None, description="User or partner the batch is counted against")):
+    """
+    Plans a JSONL body of preference records, one per line:
+    {"id": "...", "destination": "...", "duration": "...", "interests": "...", "budget": "..."}
+
+    Streams one JSONL result per record as soon as it finishes, with `status`
+    completed, failed, invalid_destination or invalid. Running crews hold planning
+    slots keyed by `owner`, so a batch shares the planning queue with chat users.
+    """
+    body = await request.body()
+    lines = body.decode("utf-8").splitlines()
+    logger.info(f"Batch planning request with {len(lines)} lines", owner=owner)
+
+    def results():
+        # Sync generator: Starlette iterates it on a worker thread, off the event loop
+        for result in run_batch(lines, concurrency=concurrency, owner=owner):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -3,35 +3,48 @@ Smart Chat API endpoint powered by Gemini LLM.
 Replaces rigid state machine with an intelligent conversational agent.
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import TYPE_CHECKING, Optional, Dict, List
 import uuid
+import asyncio
+import time
 from datetime import datetime
 import sys
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
-from core.logger import get_logger
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
-from core.database import get_db, ChatSession
+from core.logger import get_logger, dump_session_logs
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db, empty_preferences
+from core.session_cache import session_cache, SessionConflict
+from core.metrics import (
+    span, collect_timings, summarize_timings, record_token_usage, CHAT_TURN_SECONDS, LLM_CALLS, CACHE_REQUESTS
+)
 
 logger = get_logger(__name__)
+# Per-turn records; sampled in production (see LOG_SAMPLE_RATES)
+turn_logger = get_logger(__name__, sampled=True)
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.crew import run_travel_planning
-from core.models import Itinerary
+from core.jobs import (
+    load_job, load_active_job, new_planning_job, submit_planning_job, get_event_log, TERMINAL_EVENTS
+)
+from core.itinerary_cache import get_cached_itinerary
+from core.itinerary_store import save_itinerary_async
+from core.prefetch import prefetch_research, cancel_prefetch
+from core.extractor import extract_preferences, record_fast_path
+from core.admission import (
+    chat_turns, planning_jobs, planning_retry_after, acquire_llm_token_async, Overloaded
+)
+from core import gazetteer
 
-load_dotenv()
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found")
-genai.configure(api_key=api_key)
+load_dotenv()
 
 router = APIRouter()
 
@@ -48,8 +61,19 @@ class ChatResponse(BaseModel):
     session_id: str
     message: str
     needs_more_info: bool
-    state: str # 'collecting' | 'ready' | 'completed' | 'error'
+    state: str # 'collecting' | 'planning' | 'completed' | 'error'
     itinerary: Optional[dict] = None
+    job_id: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None # Milliseconds per stage, only with ?debug=true
+
+class JobStatus(BaseModel):
+    """Status of a background planning job."""
+    job_id: str
+    session_id: str
+    state: str # 'queued' | 'running' | 'completed' | 'failed'
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 # --- Structured Output for Conversation Manager ---
 
@@ -71,9 +95,17 @@ class ConversationStatus(BaseModel):
 
 # --- Logic ---
 
-def get_conversation_manager():
-    """Returns the configured Gemini model for conversation management."""
-    system_prompt = """
+# Reject destinations the offline gazetteer does not know instead of passing them to the LLM checks
+GAZETTEER_STRICT = os.getenv("GAZETTEER_STRICT", "false").lower() == "true"
+
+# How often streaming endpoints check for new job events, and when they send a keep-alive
+SSE_POLL_INTERVAL_SECONDS = 0.25
+SSE_KEEPALIVE_SECONDS = 15.0
+
+# Maximum number of conversation-manager calls in flight at once
+CHAT_LLM_CONCURRENCY = int(os.getenv("CHAT_LLM_CONCURRENCY", "32"))
+
+CONVERSATION_MANAGER_PROMPT = """
     You are an expert, charming AI Travel Consultant.
     
     YOUR GOAL:
@@ -112,14 +144,43 @@ def get_conversation_manager():
         "is_off_topic": boolean
     }
     """
-    
-    return genai.GenerativeModel(
-        model_name="gemini-2.0-flash-001",
-        generation_config={
-            "response_mime_type": "application/json"
-        },
-        system_instruction=system_prompt
-    )
+
+_conversation_manager: Optional["genai.GenerativeModel"] = None
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+def get_conversation_manager() -> "genai.GenerativeModel":
+    """
+    Returns the process-wide Gemini model for conversation management, built on first use.
+
+    The SDK is imported here rather than at module import, so a cold API process
+    answers /health before it is loaded (see the warm-up in api.main).
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set
+    """
+    global _conversation_manager
+    if _conversation_manager is None:
+        import google.generativeai as genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found")
+        genai.configure(api_key=api_key)
+        _conversation_manager = genai.GenerativeModel(
+            model_name="gemini-2.0-flash-001",
+            generation_config={
+                "response_mime_type": "application/json"
+            },
+            system_instruction=CONVERSATION_MANAGER_PROMPT
+        )
+    return _conversation_manager
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore bounding concurrent conversation-manager calls."""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(CHAT_LLM_CONCURRENCY)
+    return _llm_semaphore
 
 async def process_with_llm(user_message: str, current_data: dict) -> ConversationStatus:
     """Sends context to LLM and gets structured decision."""
@@ -133,7 +194,17 @@ async def process_with_llm(user_message: str, current_data: dict) -> Conversatio
     Update the data and generate a response.
     """
     
-    response = model.generate_content(prompt)
+    # Async SDK call so concurrent sessions overlap instead of queueing on the event loop
+    # Chat turns are served first on the shared per-model rate limit, but never wait long
+    await acquire_llm_token_async(model.model_name)
+    LLM_CALLS.inc(component="conversation")
+    async with get_llm_semaphore():
+        with span("conversation_llm"):
+            response = await model.generate_content_async(prompt)
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_token_usage("conversation", usage.prompt_token_count, usage.candidates_token_count)
     
     # Parse JSON response
     try:
@@ -149,124 +220,324 @@ async def process_with_llm(user_message: str, current_data: dict) -> Conversatio
             is_ready=False
         )
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(chat_message: ChatMessage, db: Session = Depends(get_db)):
+# Templated replies for turns answered by the local extractor
+SLOT_ACKNOWLEDGEMENTS = {
+    "destination": "{destination} is a wonderful choice!",
+    "duration": "{duration} sounds great.",
+    "interests": "Noted: {interests}.",
+    "budget": "Got it, budget: {budget}."
+}
+
+SLOT_QUESTIONS = {
+    "destination": "Where would you like to go?",
+    "duration": "How many days are you planning to stay?",
+    "interests": "What are you most into: art, food, history, nature, nightlife...?",
+    "budget": "What budget should I plan for: low, medium or high?"
+}
+
+PREFERENCE_FIELDS = ("destination", "duration", "interests", "budget")
+
+def fast_path_decision(user_message: str, current_data: dict) -> Optional[ConversationStatus]:
     """
-    Smart Chat Endpoint.
+    Answers a turn without the LLM when the local extractor understood all of it.
+
+    Returns:
+        ConversationStatus with a templated reply, or None to fall back to the LLM
+    """
+    extraction = extract_preferences(user_message, current_data)
+    if not extraction.fully_parsed:
+        record_fast_path(hit=False)
+        return None
+
+    merged = {**current_data, **extraction.values}
+    missing = [field for field in PREFERENCE_FIELDS if not merged.get(field)]
+
+    acknowledgements = " ".join(
+        SLOT_ACKNOWLEDGEMENTS[field].format(**{field: extraction.values[field]})
+        for field in PREFERENCE_FIELDS if field in extraction.values
+    )
+    if missing:
+        reply = f"{acknowledgements} {SLOT_QUESTIONS[missing[0]]}"
+    else:
+        reply = (
+            f"{acknowledgements} Perfect, a {merged['duration']} {merged['budget'].lower()}-budget trip to "
+            f"{merged['destination']} focused on {merged['interests']}. Let me put your itinerary together!"
+        )
+
+    record_fast_path(hit=True)
+    return ConversationStatus(
+        response_to_user=reply,
+        updated_preferences=TravelPreferences(**extraction.values),
+        missing_info=missing,
+        is_ready=not missing,
+        is_valid_destination=True,
+        is_off_topic=False
+    )
+
+def admission_key(chat_message: ChatMessage) -> str:
+    """Who a turn is counted against by admission control: the user, else the session."""
+    return chat_message.user_id or chat_message.session_id
+
+async def handle_chat_turn(chat_message: ChatMessage, db: AsyncSession) -> ChatResponse:
+    """
+    Processes one user message and returns the reply; planning is queued, not awaited.
+
+    Hot sessions come from the write-behind session cache; the database is only
+    read on a cache miss and written when something changed.
+
+    Raises:
+        Overloaded: If the planning queue (or the user's share of it) is full; the
+        preferences of the turn are still saved, so a retry can go straight to planning
+        SessionConflict: If another worker kept writing the session while this turn saved it
     """
+    started = time.perf_counter()
+
     # 1. Session Management
     session_id = chat_message.session_id or str(uuid.uuid4())
     
-    db_session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
-    
-    if not db_session:
-        # Create new session in database
-        db_session = ChatSession(
-            session_id=session_id,
-            user_id=chat_message.user_id,
-            data={
-                "destination": None,
-                "duration": None,
-                "interests": None,
-                "budget": None
-            }
-        )
-        db.add(db_session)
-        db.commit()
-        db.refresh(db_session)
+    with span("session_load", session_id):
+        cached_session = await session_cache.get(db, session_id)
+    data = dict(cached_session.data) if cached_session and cached_session.data else empty_preferences()
+    # What this turn read: only the fields it changes are applied over overlapping turns
+    base = dict(data)
     
     user_text = chat_message.message.strip()
     
     # 2. AI Processing (The "Brain")
-    # We pass the currently known data so the AI knows what's missing
-    ai_decision = await process_with_llm(user_text, db_session.data)
+    # Short, fully parsable turns ("5 days", "cheap") are answered locally;
+    # everything else goes to the LLM with the currently known data
+    with span("fast_path", session_id):
+        ai_decision = fast_path_decision(user_text, data)
+    if ai_decision is None:
+        ai_decision = await process_with_llm(user_text, data)
     
     # Debug logging to see AI decision
-    logger.info(f"AI Decision: is_ready={ai_decision.is_ready}, missing={ai_decision.missing_info}, current_data={db_session.data}, updated={ai_decision.updated_preferences.model_dump()}")
+    turn_logger.debug(
+        "AI Decision: is_ready={}, missing={}, current_data={}, updated={}",
+        ai_decision.is_ready, ai_decision.missing_info, data, ai_decision.updated_preferences
+    )
     
     # 3. Update Session State
     # Only update fields that are not None in the AI output
     preferences_dict = ai_decision.updated_preferences.model_dump()
     for key, value in preferences_dict.items():
         if value:
-            db_session.data[key] = value
-    
-    # Tell SQLAlchemy that the JSON column was modified
-    flag_modified(db_session, "data")
-    db.commit()  # Save changes to database
-    
-    # Debug: verify data was saved
-    logger.debug(f"After commit, db_session.data = {db_session.data}")
+            data[key] = value
+
+    # Canonicalize a new destination against the offline gazetteer ("Roma" -> "Rome").
+    # Unknown names keep the user's spelling: a near miss may be a real place the
+    # gazetteer lacks ("Parma" is not "Palma"), so it is only offered as a suggestion
+    unknown_destination = None
+    suggestion = None
+    if preferences_dict.get("destination"):
+        place = gazetteer.resolve(preferences_dict["destination"])
+        if place is not None:
+            data["destination"] = place.name
+        elif GAZETTEER_STRICT:
+            unknown_destination = preferences_dict["destination"]
+            suggestion = gazetteer.suggest(unknown_destination)
             
     # 4. Handle Logic based on AI decision
+    itinerary = None
+    new_job = None
+    overloaded = None
     
     # CASE A: Invalid Destination (e.g. Narnia)
-    if not ai_decision.is_valid_destination:
+    if not ai_decision.is_valid_destination or unknown_destination:
         # Reset destination if it was invalid
-        db_session.data["destination"] = None
-        flag_modified(db_session, "data")
-        db.commit()  # Save changes to database
-        return ChatResponse(
+        data["destination"] = None
+        cancel_prefetch(session_id)
+        message = ai_decision.response_to_user # AI will contain the polite rejection
+        if ai_decision.is_valid_destination:
+            if suggestion is not None:
+                message = f"I couldn't find \"{unknown_destination}\" on the map. Did you mean {suggestion.name}?"
+            else:
+                message = f"I couldn't find \"{unknown_destination}\" on the map. Could you check the spelling or pick another destination?"
+        response = ChatResponse(
             session_id=session_id,
-            message=ai_decision.response_to_user, # AI will contain the polite rejection
+            message=message,
             needs_more_info=True,
             state="collecting"
         )
 
     # CASE B: Ready to Plan!
-    if ai_decision.is_ready:
-        destination = db_session.data.get("destination")
-        duration = db_session.data.get("duration")
-        interests = db_session.data.get("interests")
-        budget = db_session.data.get("budget")
-        
-        # Notify user we are starting
-        # Note: In a real WebSocket app, we'd send this message immediately, then the result later.
-        # For HTTP, we have to block. We'll append a notification to the AI's last words.
-        
-        try:
-            logger.info(f"Starting CrewAI planning for {destination} with duration {duration}, interests {interests}, and budget {budget}")
-            result = run_travel_planning(
-                destination=destination,
-                duration=duration,
-                interests=interests,
-                budget=budget
+    elif ai_decision.is_ready:
+        # Identical preferences were planned recently: answer straight from the cache
+        with span("itinerary_cache", session_id):
+            itinerary = get_cached_itinerary(data)
+        CACHE_REQUESTS.inc(cache="itinerary", result="hit" if itinerary is not None else "miss")
+        if itinerary is not None:
+            turn_logger.info("Itinerary cache hit for session {}", session_id)
+            response = ChatResponse(
+                session_id=session_id,
+                message=f"{ai_decision.response_to_user} (Generating your itinerary now... Done!)",
+                needs_more_info=False,
+                state="completed",
+                itinerary=itinerary
             )
-            
-            if isinstance(result.pydantic, Itinerary):
-                itinerary_dict = result.pydantic.model_dump()
-                db_session.itinerary = itinerary_dict
-                flag_modified(db_session, "itinerary")
-                db.commit()  # Save itinerary to database
-                
-                return ChatResponse(
+        else:
+            # Planning runs on the worker pool; the client polls the job for the result
+            with span("job_lookup", session_id):
+                job = await load_active_job(db, session_id)
+            if job is None:
+                reason = planning_jobs.try_acquire(admission_key(chat_message))
+                if reason is not None:
+                    overloaded = Overloaded(reason, planning_retry_after())
+                else:
+                    logger.info("Queueing planning job for session {} with preferences {}", session_id, data)
+                    job = new_job = new_planning_job(db, session_id, data, admission_key(chat_message))
+
+            if job is not None:
+                response = ChatResponse(
                     session_id=session_id,
-                    message=f"{ai_decision.response_to_user} (Generating your itinerary now... Done!)",
+                    message=f"{ai_decision.response_to_user} (Generating your itinerary now...)",
                     needs_more_info=False,
-                    state="completed",
-                    itinerary=itinerary_dict
+                    state="planning",
+                    job_id=job.job_id
                 )
-        except Exception as e:
-            logger.error(f"CrewAI planning failed", error=str(e), destination=destination)
-            return ChatResponse(
-                session_id=session_id,
-                message="I have all the info, but something went wrong generating the plan. Please try again.",
-                needs_more_info=False,
-                state="error"
-            )
 
     # CASE C: Still collecting info
-    return ChatResponse(
-        session_id=session_id,
-        message=ai_decision.response_to_user,
-        needs_more_info=True,
-        state="collecting"
-    )
+    else:
+        # Research only needs the destination: start it while the other answers are collected
+        if data.get("destination"):
+            prefetch_research(session_id, data["destination"])
+        response = ChatResponse(
+            session_id=session_id,
+            message=ai_decision.response_to_user,
+            needs_more_info=True,
+            state="collecting"
+        )
+
+    # 5. Persist: preference changes are written behind; itineraries and new jobs
+    # are committed right away, together with the session, in one transaction
+    cached_session = session_cache.put(session_id, chat_message.user_id, data, base=base)
+    if itinerary is not None or new_job is not None:
+        try:
+            with span("db_commit", session_id):
+                write = await session_cache.store(db, session_id, itinerary=itinerary)
+                if new_job is not None and write.stored != data:
+                    # Another worker answered more questions meanwhile: plan for the merged preferences
+                    new_job.preferences = write.stored
+                if itinerary is not None:
+                    await save_itinerary_async(db, itinerary, session_id, cached_session.user_id, data)
+                await db.commit()
+        except Exception:
+            if new_job is not None:
+                planning_jobs.release(admission_key(chat_message))
+            raise
+        session_cache.stored(write)
+
+    if new_job is not None:
+        submit_planning_job(new_job.job_id, owner=admission_key(chat_message))
+
+    if overloaded is not None:
+        logger.warning(f"Planning rejected for session {session_id}: {overloaded.reason}")
+        raise overloaded
+
+    CHAT_TURN_SECONDS.observe(time.perf_counter() - started, state=response.state)
+    return response
+
+async def timed_chat_turn(chat_message: ChatMessage, db: AsyncSession, debug: bool) -> ChatResponse:
+    """
+    Runs a chat turn under the chat concurrency caps, attaching the per-stage
+    timing breakdown when `debug` is set.
+    """
+    # New sessions get their id here so the turn can be counted against it
+    chat_message.session_id = chat_message.session_id or str(uuid.uuid4())
+    with logger.contextualize(session_id=chat_message.session_id):
+        try:
+            with chat_turns.slot(admission_key(chat_message)), collect_timings() as timings:
+                response = await handle_chat_turn(chat_message, db)
+        except (Overloaded, SessionConflict, HTTPException):
+            raise
+        except Exception:
+            dump_session_logs(chat_message.session_id, "Chat turn failed")
+            raise
+    if debug:
+        response.timings = summarize_timings(timings)
+    return response
+
+def format_sse(event: str, payload: dict) -> str:
+    """Encodes one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+async def iter_job_events(job_id: str):
+    """Yields SSE frames for a planning job until it completes or fails."""
+    log = get_event_log(job_id)
+    cursor = 0
+    idle = 0.0
+    while True:
+        events = log.since(cursor)
+        for event, payload in events:
+            yield format_sse(event, payload)
+        cursor += len(events)
+
+        if events and events[-1][0] in TERMINAL_EVENTS:
+            return
+
+        if events:
+            idle = 0.0
+        elif idle >= SSE_KEEPALIVE_SECONDS:
+            # Comment frame keeps proxies and load balancers from closing an idle stream
+            yield ": keep-alive\n\n"
+            idle = 0.0
+
+        await asyncio.sleep(SSE_POLL_INTERVAL_SECONDS)
+        idle += SSE_POLL_INTERVAL_SECONDS
+
+def replay_finished_job(job):
+    """Seeds the event log of a job that finished before this process kept its events (e.g. after a restart)."""
+    log = get_event_log(job.job_id)
+    if len(log) == 0 and job.status == "completed":
+        log.publish("completed", {"job_id": job.job_id, "itinerary": job.result})
+    elif len(log) == 0 and job.status == "failed":
+        log.publish("failed", {"job_id": job.job_id, "error": job.error})
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(chat_message: ChatMessage, debug: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """
+    Smart Chat Endpoint.
+
+    With `?debug=true` the response includes a per-stage timing breakdown.
+    """
+    return await timed_chat_turn(chat_message, db, debug)
+
+@router.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, debug: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """
+    Streaming Chat Endpoint (Server-Sent Events).
+
+    Sends the conversational reply as a `message` event right away. If planning was
+    started, the stream continues with `research_started`, `research_done`, one
+    `day_plan` per (re)planned day and finally `completed` (with the itinerary) or `failed`.
+    """
+    response = await timed_chat_turn(chat_message, db, debug)
+
+    async def event_stream():
+        yield format_sse("message", response.model_dump())
+        if response.job_id:
+            async for frame in iter_job_events(response.job_id):
+                yield frame
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Server-Sent Events stream of an existing planning job."""
+    job = await load_job(db, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    replay_finished_job(job)
+    return StreamingResponse(iter_job_events(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.get("/session/{session_id}")
-async def get_session(session_id: str, db: Session = Depends(get_db)):
+async def get_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Debug endpoint to see what the AI has collected."""
-    db_session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
+    db_session = await session_cache.get(db, session_id)
     
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -278,3 +549,50 @@ async def get_session(session_id: str, db: Session = Depends(get_db)):
         "created_at": db_session.created_at,
         "updated_at": db_session.updated_at
     }
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Poll the state of a planning job."""
+    job = await load_job(db, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JobStatus(
+        job_id=job.job_id,
+        session_id=job.session_id,
+        state=job.status,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@router.get("/jobs/{job_id}/result", response_model=ChatResponse)
+async def get_job_result(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Fetch the itinerary of a finished planning job."""
+    job = await load_job(db, job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status == "failed":
+        return ChatResponse(
+            session_id=job.session_id,
+            message="I have all the info, but something went wrong generating the plan. Please try again.",
+            needs_more_info=False,
+            state="error",
+            job_id=job.job_id
+        )
+
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+
+    return ChatResponse(
+        session_id=job.session_id,
+        message="Your itinerary is ready!",
+        needs_more_info=False,
+        state="completed",
+        itinerary=job.result,
+        job_id=job.job_id
+    )
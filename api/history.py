@@ -0,0 +1,69 @@
+"""
+Itinerary history endpoints: per-user and per-destination listings with cursor pagination.
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.itinerary_store import list_itineraries, load_itinerary, HistoryPage, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from core.logger import get_logger
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+
+
+def _page(page: HistoryPage) -> dict:
+    return {"items": page.items, "next_cursor": page.next_cursor}
+
+
+@router.get("/users/{user_id}/itineraries")
+async def user_itineraries(
+    user_id: str,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_itinerary: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    A user's itineraries, newest first. Pass `next_cursor` of a page as `cursor`
+    to get the next one; it is null on the last page.
+    """
+    try:
+        page = await list_itineraries(db, user_id=user_id, cursor=cursor, limit=limit,
+                                      include_itinerary=include_itinerary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page(page)
+
+
+@router.get("/itineraries")
+async def itineraries(
+    destination: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_itinerary: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    All stored itineraries, newest first, optionally for one destination and a
+    creation window [since, until) in UTC. Paginated like the per-user listing.
+    """
+    try:
+        page = await list_itineraries(db, destination=destination, since=since, until=until, cursor=cursor,
+                                      limit=limit, include_itinerary=include_itinerary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _page(page)
+
+
+@router.get("/itineraries/{itinerary_id}")
+async def get_itinerary(itinerary_id: str, db: AsyncSession = Depends(get_async_db)):
+    """A single stored itinerary."""
+    item = await load_itinerary(db, itinerary_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return item
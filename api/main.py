@@ -1,14 +1,43 @@
 """
 Main FastAPI application entry point.
+
+Importing this module does not load CrewAI or the Gemini SDKs; they are loaded
+by the startup warm-up (or on first use), so /health answers as soon as the
+process is up and /ready reports when the worker can actually serve traffic.
 """
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from .chat import router as chat_router
-from core.logger import get_logger
+from .chat import router as chat_router, get_conversation_manager
+from .admin import router as admin_router
+from .batch import router as batch_router
+from .history import router as history_router
+from core.logger import get_logger, logger as root_logger
+from core.jobs import start_workers, shutdown_workers, warm_up_workers
+from core.session_cache import session_cache, SessionConflict
+from core.metrics import REGISTRY, CONTENT_TYPE, render_metrics
+from core.itinerary_cache import itinerary_cache_stats
+from core.tools import search_stats
+from core.extractor import fast_path_stats
+from core.admission import chat_turns, planning_jobs, rate_limit_stats, Overloaded
+from core.prefetch import prefetch_stats, shutdown_prefetch
+from core.database import ping_database
 
 logger = get_logger(__name__)
 
+# How heavy dependencies (CrewAI, Gemini SDKs, agent templates) are loaded:
+# "background" - serve right away and warm up on a thread; /ready turns 200 when done
+# "blocking"   - warm up before serving the first request
+# "lazy"       - load on first use only
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background").lower()
+
+# Warm-up progress reported by /ready
+_warm_up = {"state": "pending", "seconds": None, "error": None}
+
 app = FastAPI(
     title="AI Travel Companion API",
     version="0.2.0",
@@ -26,6 +55,72 @@ app.add_middleware(
 
 # Include chat router
 app.include_router(chat_router, prefix="/api/v1", tags=["chat"])
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(batch_router, prefix="/api/v1", tags=["batch"])
+app.include_router(history_router, prefix="/api/v1", tags=["history"])
+
+# Cache and fast-path counters are read at scrape time
+REGISTRY.register_stats("session_cache", session_cache.stats)
+REGISTRY.register_stats("itinerary_cache", itinerary_cache_stats)
+REGISTRY.register_stats("search", search_stats)
+REGISTRY.register_stats("fast_path", fast_path_stats)
+REGISTRY.register_stats("admission_chat", chat_turns.stats)
+REGISTRY.register_stats("admission_planning", planning_jobs.stats)
+REGISTRY.register_stats("llm_rate_limit", rate_limit_stats)
+REGISTRY.register_stats("research_prefetch", prefetch_stats)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Admission control rejections: 429 with a Retry-After hint, so clients back off instead of queueing."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(SessionConflict)
+async def session_conflict_handler(request: Request, exc: SessionConflict):
+    """Session writes that lost every merge round to other workers: 409, safe to retry right away."""
+    return JSONResponse(status_code=409, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
+def warm_up():
+    """Loads the conversation model and the crew templates (runs on a worker thread)."""
+    started = time.perf_counter()
+    try:
+        get_conversation_manager()
+        warm_up_workers()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        _warm_up.update(state="failed", error=str(e))
+        return
+    _warm_up.update(state="done", seconds=round(time.perf_counter() - started, 2))
+    logger.info(f"Warm-up finished in {_warm_up['seconds']}s")
+
+
+@app.on_event("startup")
+async def startup():
+    """Warm up per STARTUP_MODE, pick up planning jobs interrupted by a previous shutdown and start the session flusher."""
+    if STARTUP_MODE == "blocking":
+        await asyncio.to_thread(warm_up)
+    elif STARTUP_MODE == "background":
+        app.state.warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    else:
+        _warm_up["state"] = "skipped"
+    start_workers()
+    session_cache.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the planning worker pool and write back cached sessions."""
+    shutdown_workers()
+    shutdown_prefetch()
+    await session_cache.close()
+    # Drain the enqueued log sinks
+    await root_logger.complete()
 
 
 class HealthCheck(BaseModel):
@@ -47,5 +142,29 @@ async def root():
 
 @app.get("/health", response_model=HealthCheck)
 async def health_check():
-    """Health check endpoint."""
+    """Liveness: the process is up and serving. Does not touch dependencies."""
     return HealthCheck(status="healthy", version="0.2.0")
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: the database answers, the Gemini key is set and the warm-up has
+    finished (or was skipped). 503 until then, so load balancers hold traffic.
+    """
+    checks = {
+        "database": await ping_database(),
+        "gemini_api_key": bool(os.getenv("GEMINI_API_KEY")),
+        "warm_up": _warm_up["state"] in ("done", "skipped")
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks, "warm_up": _warm_up}
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage timings, LLM/search/DB counters and cache statistics."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
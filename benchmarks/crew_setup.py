@@ -0,0 +1,126 @@
+"""
+Benchmark: per-request crew setup, rebuilt from scratch vs. copied from templates.
+
+"rebuild" reproduces the original path: every crew builds new Agent objects
+(configuration validation plus an LLM client each) and new Task objects.
+"templates" is the current path: agents and the research task are built once
+per process (see core.crew.warm_up) and each request copies them.
+
+Measures the three crews a request can build: the research crew, the
+planner-only crew and one day crew of parallel planning. No LLM is called.
+
+Usage:
+    python -m benchmarks.crew_setup --rounds 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20, help="Crews built per scenario and mode")
+    return parser.parse_args()
+
+
+args = parse_args()
+# Nothing is sent to Gemini, but agents refuse to build without a key
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+started = time.perf_counter()
+from crewai import Crew, Process
+from core.agents import build_research_agent, build_planner_agent, create_planner_agent
+from core.tasks import create_planning_task, create_day_task, _build_research_task
+from core.crew import warm_up, create_research_crew, create_travel_crew
+from core.models import ResearchOutput, Fact, TripSkeleton, DaySkeleton
+from core.logger import logger
+import_seconds = time.perf_counter() - started
+
+RESEARCH = ResearchOutput(destination="Rome", facts=[
+    Fact(
+        title=f"Landmark {index}",
+        description="Open daily 9:00-19:00. Tickets 18 EUR, free on the first Sunday of the month.",
+        source_url="https://example.org",
+        verification_date="2025-01-01"
+    )
+    for index in range(12)
+])
+SKELETON = TripSkeleton(
+    trip_title="Rome in five days",
+    summary="Classics and food",
+    wow_experience="Sunset from the Gianicolo",
+    wow_day=2,
+    days=[
+        DaySkeleton(day_number=number, theme="Ancient Rome", area="Centro", landmarks=[f"Landmark {number}"])
+        for number in range(1, 6)
+    ]
+)
+
+
+def rebuilt_research_crew():
+    researcher = build_research_agent()
+    return Crew(agents=[researcher], tasks=[_build_research_task(researcher)], verbose=True, process=Process.sequential)
+
+
+def rebuilt_planner_crew():
+    planner = build_planner_agent()
+    task = create_planning_task(planner, None, "Rome", "3", "art", "medium", research=RESEARCH)
+    return Crew(agents=[planner], tasks=[task], verbose=True, process=Process.sequential)
+
+
+def rebuilt_day_crew():
+    planner = build_planner_agent()
+    task = create_day_task(planner, SKELETON, SKELETON.days[0], RESEARCH, interests="art")
+    return Crew(agents=[planner], tasks=[task], verbose=True, process=Process.sequential)
+
+
+def template_day_crew():
+    planner = create_planner_agent()
+    task = create_day_task(planner, SKELETON, SKELETON.days[0], RESEARCH, interests="art")
+    return Crew(agents=[planner], tasks=[task], verbose=True, process=Process.sequential)
+
+
+SCENARIOS = {
+    "research_crew": (rebuilt_research_crew, lambda: create_research_crew("Rome")),
+    "planner_crew": (rebuilt_planner_crew, lambda: create_travel_crew("Rome", "3", "art", "medium", research=RESEARCH)),
+    "day_crew": (rebuilt_day_crew, template_day_crew)
+}
+
+
+def measure(build) -> dict:
+    samples = []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        build()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2)
+    }
+
+
+def main():
+    logger.remove()
+    warm_up_seconds = warm_up()
+
+    results = {"import_seconds": round(import_seconds, 2), "warm_up_seconds": round(warm_up_seconds, 2)}
+    for name, (rebuild, template) in SCENARIOS.items():
+        before, after = measure(rebuild), measure(template)
+        results[name] = {
+            "rebuild": before,
+            "templates": after,
+            "speedup": round(before["mean_ms"] / after["mean_ms"], 1) if after["mean_ms"] else None
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: cold-start import time of the API and the CLI demo.
+
+Each target is imported in a fresh interpreter (`--runs` times, median
+reported), which is what an autoscaled container pays before it can answer:
+- api: `api.main`, the module `run_api.py` hands to uvicorn
+- hello_crew: `examples.hello_crew`, up to its first prompt
+- crew: `core.crew`, the planning stack both of them load eventually
+
+The output also lists which heavy packages each import pulled in.
+With `--serve` the API is started under uvicorn and the time until /health
+and /ready first answer 200 is measured as well.
+
+Usage:
+    python -m benchmarks.import_time --runs 5
+    python -m benchmarks.import_time --runs 3 --serve
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "api": "api.main",
+    "hello_crew": "examples.hello_crew",
+    "crew": "core.crew"
+}
+HEAVY_MODULES = ("crewai", "litellm", "google.generativeai", "google.genai", "sqlalchemy", "loguru")
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed, ",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--serve", action="store_true", help="Also measure time to /health and /ready under uvicorn")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --serve")
+    return parser.parse_args()
+
+
+def benchmark_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    env.pop("ASYNC_DATABASE_URL", None)
+    return env
+
+
+def time_import(module: str, env: dict) -> tuple[float, list[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    seconds, loaded = output.split(" ", 1) if " " in output else (output, "")
+    return float(seconds), [name for name in loaded.split(",") if name]
+
+
+def wait_for(url: str, deadline: float) -> bool:
+    """Polls `url` until it answers 200; False if the deadline passes first."""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def time_serve(env: dict, port: int) -> dict:
+    """Starts uvicorn the way run_api.py does (without reload) and times the probes from process start."""
+    subprocess.run(
+        [sys.executable, "-c", "from core.database import init_db; init_db()"],
+        cwd=ROOT, env=env, capture_output=True, check=True
+    )
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + 120
+        base = f"http://127.0.0.1:{port}"
+        health = round(time.perf_counter() - started, 2) if wait_for(f"{base}/health", deadline) else None
+        ready = round(time.perf_counter() - started, 2) if wait_for(f"{base}/ready", deadline) else None
+        return {"health_seconds": health, "ready_seconds": ready}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    args = parse_args()
+    env = benchmark_env()
+
+    results = {}
+    for name, module in TARGETS.items():
+        samples, loaded = [], []
+        for _ in range(args.runs):
+            seconds, loaded = time_import(module, env)
+            samples.append(seconds)
+        results[name] = {
+            "module": module,
+            "median_seconds": round(statistics.median(samples), 3),
+            "max_seconds": round(max(samples), 3),
+            "heavy_modules_loaded": loaded
+        }
+
+    if args.serve:
+        results["serve"] = time_serve(env, args.port)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
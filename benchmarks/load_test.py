@@ -0,0 +1,223 @@
+"""
+Offline load test of the chat API.
+
+Runs multi-turn conversations from concurrent virtual users against
+`api.main:app` in-process, with the conversation-manager model, search and the
+crew LLM replaced by latency-simulating stubs (see benchmarks/stubs.py), so it
+costs nothing and needs no network.
+
+Reports, as JSON:
+- turn latency p50/p95/p99 per response state (collecting, planning, completed)
+- time from the final turn to a ready itinerary
+- throughput, DB statements and commits per turn, stub backend call counts
+
+Usage:
+    python -m benchmarks.load_test --users 50 --output results.json
+    python -m benchmarks.load_test --chat-llm lognormal:800:0.4 --crew-llm uniform:2000:5000
+
+Latencies: "fixed:MS", "uniform:LOW_MS:HIGH_MS" or "lognormal:MEDIAN_MS:SIGMA".
+Defaults to a throwaway SQLite file so it runs without a Postgres server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import httpx
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="Sync database URL (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--conversations", type=int, default=2, help="Conversations per user")
+    parser.add_argument("--workers", type=int, default=4, help="Planning worker threads")
+    parser.add_argument("--chat-llm", default="lognormal:600:0.3", help="Conversation-manager latency")
+    parser.add_argument("--search", default="uniform:200:600", help="Grounded search latency")
+    parser.add_argument("--crew-llm", default="uniform:300:900", help="Latency of each crew task")
+    parser.add_argument("--think-time", default="uniform:0:50", help="Pause between a user's turns")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between job status polls")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for one itinerary")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING", help="Console log level while the test runs")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    return parser.parse_args()
+
+
+def configure(args):
+    """Points the app at the benchmark database. Engines and worker pools are configured
+    when core is imported, so this runs before the first core import."""
+    if args.database_url is None:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["PLANNING_WORKERS"] = str(args.workers)
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+DESTINATIONS = ["Paris", "Rome", "Lisbon", "Kyoto", "Barcelona", "Prague", "Vienna", "Istanbul"]
+INTERESTS = ["food and art", "history", "museums and wine", "nature and hiking", "architecture"]
+BUDGETS = ["cheap", "moderate", "luxury"]
+
+counters = {"statements": 0, "commits": 0}
+
+
+def count_statement(*_):
+    counters["statements"] += 1
+
+
+def count_commit(*_):
+    counters["commits"] += 1
+
+
+def conversation(rng: random.Random) -> list[str]:
+    """One realistic conversation: slot-by-slot, all-in-one, or with small talk the extractor cannot parse."""
+    destination = rng.choice(DESTINATIONS)
+    days = rng.choice([2, 3, 5, 7])
+    interests = rng.choice(INTERESTS)
+    budget = rng.choice(BUDGETS)
+    style = rng.choice(["slots", "one_shot", "chatty"])
+    if style == "one_shot":
+        return [f"{destination} for {days} days, {interests}, {budget}"]
+    if style == "chatty":
+        return [
+            "Hello! Can you help me plan something?",
+            f"I'd like to go to {destination}",
+            f"{days} days",
+            f"We are into {interests}",
+            budget
+        ]
+    return [f"I want to visit {destination}", f"{days} days", interests, budget]
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": at(0.50),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 1)
+    }
+
+
+async def wait_for_itinerary(args, client: httpx.AsyncClient, job_id: str) -> str:
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        response = await client.get(f"/api/v1/jobs/{job_id}")
+        status = response.json()["state"]
+        if status in ("completed", "failed"):
+            return status
+        await asyncio.sleep(args.poll_interval)
+    return "timeout"
+
+
+async def run_user(args, client, rng, think_time, turn_latencies, itinerary_latencies, outcomes):
+    for _ in range(args.conversations):
+        session_id = None
+        for message in conversation(rng):
+            started = time.perf_counter()
+            response = await client.post("/api/v1/chat", json={"session_id": session_id, "message": message})
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                outcomes[f"http_{response.status_code}"] += 1
+                break
+
+            body = response.json()
+            session_id = body["session_id"]
+            turn_latencies[body["state"]].append(elapsed)
+
+            if body["state"] == "planning" and body.get("job_id"):
+                status = await wait_for_itinerary(args, client, body["job_id"])
+                itinerary_latencies.append(time.perf_counter() - started)
+                outcomes[status] += 1
+            elif body["state"] == "completed":
+                # Served from the itinerary cache
+                itinerary_latencies.append(elapsed)
+                outcomes["cached"] += 1
+            await asyncio.sleep(think_time.sample())
+
+
+async def main(args):
+    from loguru import logger
+    from sqlalchemy import event
+    from benchmarks import stubs
+    from core.database import Base, engine, async_engine
+    from api.main import app
+
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+        event.listen(sync_engine, "commit", count_commit)
+    # Per-turn INFO logs would dominate the measurement
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    random.seed(args.seed)
+    stubs.install(stubs.StubConfig(
+        chat_llm=stubs.Latency.parse(args.chat_llm),
+        search=stubs.Latency.parse(args.search),
+        crew_llm=stubs.Latency.parse(args.crew_llm)
+    ))
+    think_time = stubs.Latency.parse(args.think_time)
+    Base.metadata.create_all(bind=engine)
+
+    turn_latencies = defaultdict(list)
+    itinerary_latencies = []
+    outcomes = defaultdict(int)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+            counters.update(statements=0, commits=0)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_user(args, client, random.Random(args.seed + user), think_time, turn_latencies, itinerary_latencies, outcomes)
+                for user in range(args.users)
+            ))
+            elapsed = time.perf_counter() - started
+            cache_stats = (await client.get("/api/v1/admin/cache/stats")).json()
+
+    total_turns = sum(len(samples) for samples in turn_latencies.values())
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "database_url", "log_level")},
+        "database": engine.dialect.name,
+        "seconds": round(elapsed, 3),
+        "turns": total_turns,
+        "turns_per_second": round(total_turns / elapsed, 1),
+        "itineraries_per_second": round(len(itinerary_latencies) / elapsed, 2),
+        "turn_latency": {state: percentiles(samples) for state, samples in sorted(turn_latencies.items())},
+        "itinerary_latency": percentiles(itinerary_latencies),
+        "outcomes": dict(outcomes),
+        "db": {
+            "statements": counters["statements"],
+            "commits": counters["commits"],
+            "statements_per_turn": round(counters["statements"] / total_turns, 2) if total_turns else None,
+            "commits_per_turn": round(counters["commits"] / total_turns, 2) if total_turns else None
+        },
+        "backend_calls": dict(stubs.calls),
+        "caches": cache_stats
+    }
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(report + "\n")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure(arguments)
+    asyncio.run(main(arguments))
@@ -0,0 +1,193 @@
+"""
+Stub backends for offline benchmarks.
+
+Replaces the three paid backends with canned, latency-simulating fakes:
+- the conversation-manager model (`genai.GenerativeModel.generate_content[_async]`)
+- grounded search (`core.tools._run_search`, used by the Google Search tool)
+- the crew LLM (`crewai.Crew.kickoff`), which returns canned ResearchOutput,
+  TripSkeleton, DayPlan or Itinerary objects for each task
+
+Latencies are given as "fixed:MS", "uniform:LOW_MS:HIGH_MS" or
+"lognormal:MEDIAN_MS:SIGMA".
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+
+@dataclass
+class Latency:
+    """A latency distribution, sampled in seconds."""
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        parts = spec.split(":")
+        kind = parts[0]
+        values = [float(value) for value in parts[1:]] + [0.0, 0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        return cls(kind=kind, a=values[0], b=values[1])
+
+    def sample(self) -> float:
+        if self.kind == "uniform":
+            return random.uniform(self.a, self.b) / 1000
+        if self.kind == "lognormal":
+            return random.lognormvariate(0, self.b) * self.a / 1000
+        return self.a / 1000
+
+
+@dataclass
+class StubConfig:
+    """Latencies of the stubbed backends."""
+    chat_llm: Latency
+    search: Latency
+    crew_llm: Latency
+
+
+_calls_lock = Lock()
+calls = {"chat_llm": 0, "search": 0, "crew_tasks": 0}
+
+
+def _count(name: str):
+    with _calls_lock:
+        calls[name] += 1
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _conversation_reply(prompt: str) -> str:
+    """Canned conversation-manager decision: merges whatever the local extractor can read."""
+    from core.extractor import extract_preferences
+
+    data_match = re.search(r"Current Known Data: (\{.*?\})\n", prompt)
+    message_match = re.search(r'User\'s Latest Message: "(.*)"', prompt)
+    current = json.loads(data_match.group(1)) if data_match else {}
+    message = message_match.group(1) if message_match else ""
+
+    updates = extract_preferences(message, current).values
+    merged = {**current, **updates}
+    missing = [field for field in ("destination", "duration", "interests", "budget") if not merged.get(field)]
+    return json.dumps({
+        "response_to_user": "Sounds lovely! " + (f"Tell me your {missing[0]}." if missing else "Planning now."),
+        "updated_preferences": {field: updates.get(field) for field in ("destination", "duration", "interests", "budget")},
+        "missing_info": missing,
+        "is_ready": not missing,
+        "is_valid_destination": True,
+        "is_off_topic": False
+    })
+
+
+def canned_research(destination: str):
+    from core.models import Fact, ResearchOutput
+
+    return ResearchOutput(destination=destination, facts=[
+        Fact(
+            title=f"{destination} landmark {index}",
+            description=f"Main attraction number {index} in {destination}. Open 9:00-18:00, tickets €{10 + index}.",
+            source_url=f"https://example.org/{destination.lower().replace(' ', '-')}/{index}",
+            verification_date="Today"
+        )
+        for index in range(1, 6)
+    ])
+
+
+def canned_day(day_number: int, destination: str):
+    from core.models import Activity, DayPlan
+
+    return DayPlan(day_number=day_number, theme=f"{destination} highlights {day_number}", activities=[
+        Activity(name=f"Landmark {day_number}-{slot}", description="Guided visit.", time_slot=time_slot,
+                 duration="2 hours", cost_estimate="€15")
+        for slot, time_slot in enumerate(("09:00", "12:30", "15:00", "19:30"), start=1)
+    ])
+
+
+def canned_output(model, inputs: dict, description: str = ""):
+    """Builds a canned instance of a task's output model."""
+    from core.models import ResearchOutput, Itinerary, TripSkeleton, DaySkeleton, DayPlan
+    from core.preferences import normalize_duration
+
+    destination = inputs.get("destination") or "Somewhere"
+    days = normalize_duration(inputs.get("duration")) or 3
+
+    if model is ResearchOutput:
+        from core.tools import cached_search
+        cached_search(f"{destination} main museum ticket price")
+        cached_search(f"{destination} main museum ticket price 2025")
+        return canned_research(destination)
+    if model is TripSkeleton:
+        return TripSkeleton(
+            trip_title=f"{days} days in {destination}", summary="A stub trip.",
+            wow_experience="Sunset viewpoint", wow_day=1,
+            days=[DaySkeleton(day_number=day, theme=f"Theme {day}", area=f"Area {day}", landmarks=[f"Landmark {day}-1"])
+                  for day in range(1, days + 1)]
+        )
+    if model is DayPlan:
+        day_match = re.search(r"(?:Plan|Revise|Fix) Day (\d+)", description)
+        plan = canned_day(int(day_match.group(1)) if day_match else 1, destination)
+        wow_match = re.search(r'Include the trip\'s signature experience: "([^"]+)"', description)
+        if wow_match:
+            plan.activities[-1].name = wow_match.group(1)
+        return plan
+    if model is Itinerary:
+        return Itinerary(
+            trip_title=f"{days} days in {destination}", summary="A stub trip.",
+            days=[canned_day(day, destination) for day in range(1, days + 1)]
+        )
+    raise ValueError(f"No canned output for {model}")
+
+
+def install(config: StubConfig):
+    """Patches the Gemini SDK, the search tool and CrewAI with the stubs."""
+    import google.generativeai as genai
+    import core.tools
+    from crewai import Crew
+    from crewai.crews.crew_output import CrewOutput
+    from crewai.tasks.task_output import TaskOutput
+
+    def generate_content(self, prompt, *args, **kwargs):
+        _count("chat_llm")
+        time.sleep(config.chat_llm.sample())
+        return _StubResponse(_conversation_reply(str(prompt)))
+
+    async def generate_content_async(self, prompt, *args, **kwargs):
+        _count("chat_llm")
+        await asyncio.sleep(config.chat_llm.sample())
+        return _StubResponse(_conversation_reply(str(prompt)))
+
+    def run_search(query: str) -> str:
+        _count("search")
+        time.sleep(config.search.sample())
+        return f"Stub search results for: {query}. Ticket price €17, open 9:00-18:00. Source: https://example.org"
+
+    def kickoff(self, inputs=None, *args, **kwargs):
+        inputs = inputs or {}
+        outputs = []
+        for task in self.tasks:
+            _count("crew_tasks")
+            time.sleep(config.crew_llm.sample())
+            result = canned_output(task.output_pydantic, inputs, task.description)
+            output = TaskOutput(
+                description=task.description,
+                raw=result.model_dump_json(),
+                pydantic=result,
+                agent=task.agent.role if task.agent else "stub"
+            )
+            outputs.append(output)
+            if self.task_callback is not None:
+                self.task_callback(output)
+        return CrewOutput(raw=outputs[-1].raw, pydantic=outputs[-1].pydantic, tasks_output=outputs)
+
+    genai.GenerativeModel.generate_content = generate_content
+    genai.GenerativeModel.generate_content_async = generate_content_async
+    core.tools._run_search = run_search
+    Crew.kickoff = kickoff
@@ -0,0 +1,343 @@
+"""
+Admission control and fair scheduling.
+
+Three layers protect Gemini and the worker pool from traffic spikes:
+- concurrency caps on chat turns and planning jobs, globally and per user,
+  rejected immediately with a retry-after hint instead of piling up
+- a token bucket per model, shared by every caller of that model
+- priority waiting on those buckets: chat turns are served before planning
+  crews, which are served before batch runs
+
+Counters for all three are exposed for dashboards and autoscaling.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Condition, Lock
+from typing import Iterator, Optional
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Lower values are served first
+PRIORITY_CHAT = 0
+PRIORITY_PLANNING = 10
+PRIORITY_BATCH = 20
+# Speculative work nobody is waiting for yet (research prefetch)
+PRIORITY_PREFETCH = 30
+
+# Chat turns handled at the same time, in total and per user
+MAX_CONCURRENT_CHAT_TURNS = int(os.getenv("MAX_CONCURRENT_CHAT_TURNS", "256"))
+MAX_CONCURRENT_TURNS_PER_USER = int(os.getenv("MAX_CONCURRENT_TURNS_PER_USER", "4"))
+# Planning jobs queued or running, in total and per user
+PLANNING_QUEUE_LIMIT = int(os.getenv("PLANNING_QUEUE_LIMIT", "50"))
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("MAX_ACTIVE_JOBS_PER_USER", "2"))
+# Requests per minute and burst size of each model; override per model with
+# LLM_RATE_LIMITS="gemini-2.0-flash-001=1000:20,other-model=60:5"
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "1000"))
+LLM_DEFAULT_BURST = int(os.getenv("LLM_DEFAULT_BURST", "20"))
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+# How long a chat turn may wait for an LLM token before it is rejected
+CHAT_LLM_MAX_WAIT_SECONDS = float(os.getenv("CHAT_LLM_MAX_WAIT_SECONDS", "2.0"))
+# Seconds a rejected planning request is told to wait, per job ahead of it in the queue
+PLANNING_RETRY_SECONDS_PER_JOB = float(os.getenv("PLANNING_RETRY_SECONDS_PER_JOB", "5"))
+
+
+class Overloaded(Exception):
+    """Raised when a request is rejected by admission control; maps to HTTP 429."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class ConcurrencyLimiter:
+    """Non-blocking global and per-key caps on work in progress."""
+
+    def __init__(self, name: str, limit: int, per_key_limit: int):
+        self.name = name
+        self.limit = limit
+        self.per_key_limit = per_key_limit
+        self.rejected = 0
+        self._active: dict[str, int] = {}
+        self._total = 0
+        self._lock = Lock()
+
+    def try_acquire(self, key: str, force: bool = False) -> Optional[str]:
+        """
+        Takes one slot for `key`. `force` skips both the global and the per-key cap
+        (work already accepted, e.g. resumed jobs) but still counts the slot.
+
+        Returns:
+            None on success, otherwise the reason for rejecting the request
+        """
+        with self._lock:
+            if force:
+                pass
+            elif self._total >= self.limit:
+                self.rejected += 1
+                return f"{self.name} is at capacity ({self.limit})"
+            elif self._active.get(key, 0) >= self.per_key_limit:
+                self.rejected += 1
+                return f"Too many {self.name} requests in progress for this user ({self.per_key_limit})"
+            self._active[key] = self._active.get(key, 0) + 1
+            self._total += 1
+            return None
+
+    def release(self, key: str):
+        with self._lock:
+            count = self._active.get(key, 0)
+            if count <= 1:
+                self._active.pop(key, None)
+            else:
+                self._active[key] = count - 1
+            if count:
+                self._total -= 1
+
+    @contextmanager
+    def slot(self, key: str, retry_after: float = 1.0, force: bool = False) -> Iterator[None]:
+        """Holds one slot for the duration of the block; raises Overloaded if none is free (never with `force`)."""
+        reason = self.try_acquire(key, force=force)
+        if reason is not None:
+            raise Overloaded(reason, retry_after)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def in_use(self) -> int:
+        with self._lock:
+            return self._total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self._total,
+                "limit": self.limit,
+                "users": len(self._active),
+                "per_user_limit": self.per_key_limit,
+                "rejected": self.rejected
+            }
+
+
+class TokenBucket:
+    """
+    Request-rate limiter for one model. Waiters are served in priority order
+    (then arrival order), so a chat turn never queues behind a planning crew.
+    """
+
+    def __init__(self, name: str, rate_per_second: float, burst: int):
+        self.name = name
+        self.rate = rate_per_second
+        self.burst = burst
+        self.granted = 0
+        self.timeouts = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int]] = []  # heap of (priority, arrival)
+        self._arrivals = itertools.count()
+        self._condition = Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _seconds_until_token(self) -> float:
+        return max(0.0, (1 - self._tokens) / self.rate) if self.rate > 0 else 60.0
+
+    def _try_take(self, ticket: tuple[int, int]) -> bool:
+        self._refill()
+        if self._tokens >= 1 and self._waiters and self._waiters[0] == ticket:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self.granted += 1
+            self._condition.notify_all()
+            return True
+        return False
+
+    def _give_up(self, ticket: tuple[int, int]):
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self.timeouts += 1
+        self._condition.notify_all()
+
+    def acquire(self, priority: int = PRIORITY_PLANNING, timeout: Optional[float] = None) -> bool:
+        """Blocks the calling thread until a token is granted; False if `timeout` passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiters, ticket)
+            while not self._try_take(ticket):
+                wait = self._seconds_until_token() or 0.05
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._give_up(ticket)
+                        return False
+                    wait = min(wait, remaining)
+                self._condition.wait(wait)
+            return True
+
+    async def acquire_async(self, priority: int = PRIORITY_CHAT, timeout: Optional[float] = None) -> bool:
+        """Waits on the event loop (never blocking it) until a token is granted; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiters, ticket)
+        while True:
+            with self._condition:
+                if self._try_take(ticket):
+                    return True
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._give_up(ticket)
+                    return False
+                wait = self._seconds_until_token() if self._waiters[0] == ticket else 0.01
+            await asyncio.sleep(max(wait, 0.005))
+
+    def retry_after(self) -> float:
+        """Seconds until the queue ahead of a new caller would drain."""
+        with self._condition:
+            self._refill()
+            backlog = len(self._waiters) + 1 - self._tokens
+            return max(0.0, backlog / self.rate) if self.rate > 0 else 60.0
+
+    def stats(self) -> dict:
+        with self._condition:
+            self._refill()
+            return {
+                "tokens": round(self._tokens, 2),
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "waiting": len(self._waiters),
+                "granted": self.granted,
+                "timeouts": self.timeouts
+            }
+
+
+def _parse_rate_limits(spec: str) -> dict[str, tuple[float, int]]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, values = item.split("=", 1)
+            rpm, _, burst = values.partition(":")
+            limits[model.strip()] = (float(rpm), int(burst or LLM_DEFAULT_BURST))
+        except ValueError:
+            logger.warning(f"Ignoring malformed LLM_RATE_LIMITS entry: {item}")
+    return limits
+
+
+_rate_limits = _parse_rate_limits(LLM_RATE_LIMITS)
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = Lock()
+
+
+def model_key(model) -> str:
+    """Bucket name of a model: "gemini/gemini-2.0-flash-001" and "gemini-2.0-flash-001" share one."""
+    name = getattr(model, "model", None) or str(model)
+    return name.split("/", 1)[-1]
+
+
+def get_bucket(model) -> TokenBucket:
+    """Returns the token bucket of a model, creating it on first use."""
+    key = model_key(model)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            rpm, burst = _rate_limits.get(key, (LLM_DEFAULT_RPM, LLM_DEFAULT_BURST))
+            bucket = _buckets[key] = TokenBucket(key, rpm / 60.0, burst)
+        return bucket
+
+
+class Priority:
+    """A priority that can be raised while its work runs, e.g. once a job waits on a prefetch."""
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def raise_to(self, value: int):
+        """Serves the remaining LLM calls of the work at `value` if that comes first."""
+        self.value = min(self.value, value)
+
+
+# Priority of LLM calls made by the current request, job or batch record
+_current_priority: ContextVar["int | Priority"] = ContextVar("llm_priority", default=PRIORITY_PLANNING)
+
+
+@contextmanager
+def priority_scope(priority: "int | Priority") -> Iterator[None]:
+    """Sets the LLM priority of work done in this block (propagates via contextvars)."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    priority = _current_priority.get()
+    return priority.value if isinstance(priority, Priority) else priority
+
+
+def acquire_llm_token(model, timeout: Optional[float] = None):
+    """
+    Takes one request token for `model` at the current priority, blocking the calling
+    worker thread until one is free.
+
+    Raises:
+        Overloaded: If `timeout` passes first
+    """
+    bucket = get_bucket(model)
+    if not bucket.acquire(current_priority(), timeout=timeout):
+        raise Overloaded(f"Rate limit of {bucket.name} reached", bucket.retry_after())
+
+
+async def acquire_llm_token_async(model, timeout: Optional[float] = CHAT_LLM_MAX_WAIT_SECONDS):
+    """
+    Takes one request token for `model` at chat priority without blocking the event loop.
+
+    Raises:
+        Overloaded: If no token is granted within `timeout`
+    """
+    bucket = get_bucket(model)
+    if not await bucket.acquire_async(PRIORITY_CHAT, timeout=timeout):
+        raise Overloaded(f"Rate limit of {bucket.name} reached", bucket.retry_after())
+
+
+chat_turns = ConcurrencyLimiter("chat", MAX_CONCURRENT_CHAT_TURNS, MAX_CONCURRENT_TURNS_PER_USER)
+planning_jobs = ConcurrencyLimiter("planning", PLANNING_QUEUE_LIMIT, MAX_ACTIVE_JOBS_PER_USER)
+
+
+def planning_retry_after() -> float:
+    """Retry hint for a rejected planning request, from the current queue depth."""
+    return PLANNING_RETRY_SECONDS_PER_JOB * max(1, planning_jobs.in_use())
+
+
+def _bucket_stats() -> dict[str, dict]:
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {name: bucket.stats() for name, bucket in buckets.items()}
+
+
+def admission_stats() -> dict:
+    """Queue depth, caps and rejections of every admission layer."""
+    return {
+        "chat": chat_turns.stats(),
+        "planning": planning_jobs.stats(),
+        "models": _bucket_stats()
+    }
+
+
+def rate_limit_stats() -> dict:
+    """Per-model bucket counters flattened to "<model>.<stat>", for the metrics registry."""
+    return {
+        f"{name}.{stat}": value
+        for name, stats in _bucket_stats().items()
+        for stat, value in stats.items()
+    }
@@ -1,13 +1,42 @@
 """
 Agent definitions for the Travel Companion system.
+
+Building an Agent validates its configuration and creates an LLM client, which
+costs far more than the rest of a crew. Each process builds every agent once as
+a template; requests get cheap copies that share the template's LLM settings and
+tool bindings but none of its run state.
 """
+import os
+from threading import Lock
+from typing import Callable
 from crewai import Agent
-from .tools import google_search
+from dotenv import load_dotenv
+from .tools import get_google_search_tool
+from .logger import get_logger, CREW_VERBOSE
 
+logger = get_logger(__name__)
 
-def create_research_agent():
+_templates: dict[str, Agent] = {}
+_templates_lock = Lock()
+
+
+def configure_llm_environment():
     """
-    Creates the Research Agent responsible for finding verified, real-time travel data.
+    Validates the LLM credentials before the first agent is built.
+
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set
+    """
+    load_dotenv()
+    if not os.getenv("GEMINI_API_KEY"):
+        raise ValueError("ERROR: GEMINI_API_KEY not found in .env file!")
+    # Disable OpenAI check (we're using Gemini)
+    os.environ["OPENAI_API_KEY"] = "NA"
+
+
+def build_research_agent():
+    """
+    Builds the Research Agent responsible for finding verified, real-time travel data.
     """
     return Agent(
         role='Senior Travel Data Analyst',
@@ -18,16 +47,16 @@ def create_research_agent():
         drives the financial planning of the entire system; therefore, an outdated price is not just an error, 
         it is a system failure. You prioritize official domain sources (.gov, .org, official business sites) 
         over aggregators or blogs.""",
-        verbose=True,
+        verbose=CREW_VERBOSE,
         allow_delegation=False,
         llm="gemini/gemini-2.0-flash-001",
-        tools=[google_search]
+        tools=[get_google_search_tool()]
     )
 
 
-def create_planner_agent():
+def build_planner_agent():
     """
-    Creates the Planner Agent responsible for building logical itineraries.
+    Builds the Planner Agent responsible for building logical itineraries.
     """
     return Agent(
         role='Senior Travel Planner',
@@ -37,7 +66,43 @@ def create_planner_agent():
         You NEVER schedule a museum when it is closed. You ensure the user has time for lunch.
         You operate using Retrieval-Augmented Generation (RAG) principles: you only use the data provided to you,
         you do not invent facts.""",
-        verbose=True,
+        verbose=CREW_VERBOSE,
         allow_delegation=False,
         llm="gemini/gemini-2.0-flash-001"
     )
+
+
+_BUILDERS: dict[str, Callable[[], Agent]] = {
+    "research": build_research_agent,
+    "planner": build_planner_agent
+}
+
+
+def get_agent_template(kind: str) -> Agent:
+    """Returns the process-wide template of an agent ("research" or "planner"), building it on first use."""
+    template = _templates.get(kind)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(kind)
+            if template is None:
+                if not _templates:
+                    configure_llm_environment()
+                template = _templates[kind] = _BUILDERS[kind]()
+                logger.debug(f"Built {kind} agent template")
+    return template
+
+
+def create_research_agent():
+    """Returns a fresh copy of the Research Agent template for one crew."""
+    return get_agent_template("research").copy()
+
+
+def create_planner_agent():
+    """Returns a fresh copy of the Planner Agent template for one crew."""
+    return get_agent_template("planner").copy()
+
+
+def warm_up_agents():
+    """Builds every agent template now instead of on the first planning request."""
+    for kind in _BUILDERS:
+        get_agent_template(kind)
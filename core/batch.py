@@ -0,0 +1,184 @@
+"""
+Batch itinerary planning.
+
+Plans many JSONL preference records at once. Records are grouped by
+destination so research runs once per destination, planning crews run with
+bounded concurrency, and one result line is produced per record as soon as it
+finishes, so a failing record never sinks the batch.
+
+Every running research or planning crew holds a slot of the planning limiter,
+keyed by the batch owner. The slots are forced (a batch is never rejected
+halfway), but they count against the planning queue, so chat-triggered
+planning sees the batch load and the owner's own jobs share one cap with it.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, Optional, Union
+from pydantic import BaseModel, ValidationError
+from .itinerary_cache import get_cached_itinerary, store_itinerary
+from .research_cache import normalize_destination, is_invalid_destination
+from .admission import planning_jobs, priority_scope, PRIORITY_BATCH
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Default and maximum number of records planned at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+# Admission key of batches submitted without an owner
+BATCH_DEFAULT_OWNER = "batch"
+
+
+class BatchRecord(BaseModel):
+    """One preference record of a batch input file."""
+    id: Optional[str] = None
+    destination: str
+    duration: str = "3"
+    interests: str = "general"
+    budget: str = "medium"
+
+
+def parse_records(lines: Iterable[Union[str, bytes]]) -> Iterator[Union[BatchRecord, dict]]:
+    """
+    Parses JSONL preference records. Records without an id get their line number.
+
+    Yields:
+        BatchRecord for every valid line, or an "invalid" result dict for a malformed one
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            payload = json.loads(line)
+            if isinstance(payload, dict) and payload.get("id") is not None:
+                payload["id"] = str(payload["id"])
+            record = BatchRecord.model_validate(payload)
+        except json.JSONDecodeError as e:
+            yield {"id": str(line_number), "status": "invalid", "error": f"Invalid JSON: {e}"}
+            continue
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            yield {"id": str(line_number), "status": "invalid", "error": problems}
+            continue
+        if record.id is None:
+            record.id = str(line_number)
+        yield record
+
+
+def group_by_destination(records: Iterable[BatchRecord]) -> dict[str, list[BatchRecord]]:
+    """Groups records by normalized destination ("Roma" and "rome" share one group)."""
+    groups: dict[str, list[BatchRecord]] = {}
+    for record in records:
+        groups.setdefault(normalize_destination(record.destination), []).append(record)
+    return groups
+
+
+def _result(record: BatchRecord, status: str, started: float, **fields) -> dict:
+    return {
+        "id": record.id,
+        "status": status,
+        "destination": record.destination,
+        "seconds": round(time.perf_counter() - started, 3),
+        **fields
+    }
+
+
+def _plan_record(record: BatchRecord, research, owner: str) -> dict:
+    """Plans one record with research shared by its destination group."""
+    # Imported here so parsing and grouping do not pull in CrewAI
+    from .crew import run_travel_planning
+    from .models import Itinerary
+
+    started = time.perf_counter()
+    preferences = record.model_dump(exclude={"id"})
+
+    itinerary = get_cached_itinerary(preferences)
+    if itinerary is not None:
+        return _result(record, "completed", started, cached=True, itinerary=itinerary)
+
+    try:
+        with planning_jobs.slot(owner, force=True), priority_scope(PRIORITY_BATCH):
+            result = run_travel_planning(research=research, **preferences)
+        if not isinstance(result.pydantic, Itinerary):
+            raise ValueError(f"Unexpected crew output type: {type(result.pydantic)}")
+    except Exception as e:
+        logger.error(f"Batch record {record.id} failed", error=str(e))
+        return _result(record, "failed", started, error=str(e))
+
+    itinerary = result.pydantic.model_dump()
+    store_itinerary(preferences, itinerary)
+    return _result(record, "completed", started, cached=False, itinerary=itinerary)
+
+
+def _research_group(destination: str, owner: str):
+    from .crew import resolve_research
+    with planning_jobs.slot(owner, force=True), priority_scope(PRIORITY_BATCH):
+        return resolve_research(destination, lambda event, payload: None)
+
+
+def run_batch(lines: Iterable[Union[str, bytes]], concurrency: int = BATCH_CONCURRENCY,
+              owner: Optional[str] = None) -> Iterator[dict]:
+    """
+    Plans every record of a JSONL batch.
+
+    Research is resolved once per destination group (concurrently across groups);
+    each group's records are submitted as soon as its research is ready. Batch LLM
+    calls wait behind chat turns and planning jobs on the model rate limits.
+
+    Args:
+        lines: JSONL preference records (destination, duration, interests, budget, optional id)
+        concurrency: Crews running at the same time, capped at BATCH_MAX_CONCURRENCY
+        owner: User or partner the batch is counted against by planning admission
+
+    Yields:
+        dict: One result per record, in completion order, with status completed,
+        failed, invalid_destination or invalid
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    owner = owner or BATCH_DEFAULT_OWNER
+    records = []
+    for parsed in parse_records(lines):
+        if isinstance(parsed, dict):
+            yield parsed
+        else:
+            records.append(parsed)
+
+    groups = group_by_destination(records)
+    logger.info(f"Batch of {len(records)} records: {len(groups)} destinations, concurrency {concurrency}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        pending = {
+            pool.submit(_research_group, group[0].destination, owner): ("research", group)
+            for group in groups.values()
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, item = pending.pop(future)
+                if kind == "plan":
+                    yield future.result()
+                    continue
+
+                try:
+                    research = future.result()
+                except Exception as e:
+                    logger.error(f"Batch research for {item[0].destination} failed", error=str(e))
+                    for record in item:
+                        yield _result(record, "failed", started, error=f"Research failed: {e}")
+                    continue
+
+                if is_invalid_destination(research):
+                    for record in item:
+                        yield _result(record, "invalid_destination", started,
+                                      error=f"No verifiable travel data found for {record.destination}")
+                    continue
+
+                for record in item:
+                    pending[pool.submit(_plan_record, record, research, owner)] = ("plan", record)
+
+    logger.info(f"Batch finished in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,218 @@
+"""
+Planner context budgeting.
+
+The research agent returns facts with titles, descriptions, source URLs and
+verification dates. Planner tasks only need the names, prices and hours, so
+facts are projected to title + description, de-duplicated, ranked by relevance
+to the traveler's interests and cut to a token budget. Facts carrying prices or
+opening hours are ranked first and trimmed to their hard-data sentences rather
+than dropped.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from .extractor import INTEREST_SYNONYMS
+from .metrics import CONTEXT_FACTS
+from .models import ResearchOutput
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Maximum estimated tokens of research data injected into one planner prompt
+PLANNER_CONTEXT_TOKENS = int(os.getenv("PLANNER_CONTEXT_TOKENS", "1200"))
+# Longer fact descriptions are trimmed to their first and hard-data sentences
+MAX_FACT_TOKENS = int(os.getenv("MAX_FACT_TOKENS", "90"))
+
+# Rough size of one token for Gemini/GPT-style tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+# Prices, opening hours and days: the data the planner must not lose
+_HARD_DATA_PATTERN = re.compile(
+    r"[€$£¥]|\b\d+(?:[.,]\d+)?\s*(?:eur|euros?|usd|dollars?|gbp|chf|czk|kč|yen|jpy)\b|\bfree\b"
+    r"|\b\d{1,2}[:.]\d{2}\b|\b\d{1,2}\s*(?:am|pm)\b|\bopen(?:s|ing)?\b|\bclosed?\b|\bdaily\b"
+    r"|\b(?:mon|tues|wednes|thurs|fri|satur|sun)days?\b|\b(?:mon|tue|wed|thu|fri|sat|sun)\b",
+    re.IGNORECASE
+)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words too common to signal relevance or near-duplication
+_STOP_WORDS = {
+    "the", "a", "an", "and", "or", "of", "in", "on", "at", "to", "for", "is", "are", "with", "by", "from",
+    "this", "that", "its", "it", "as", "be", "was", "has", "have", "you", "your"
+}
+
+INVALID_FACT_TITLES = ("invalid destination",)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt fragment (no tokenizer dependency)."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+@dataclass
+class PlannerFact:
+    """A research fact reduced to what the planner reads."""
+    title: str
+    description: str
+    hard_data: bool
+    score: float = 0.0
+
+    def render(self) -> str:
+        return f"- {self.title}: {self.description}"
+
+
+@dataclass
+class PlannerContext:
+    """Budgeted research block plus its size, for logging and metrics."""
+    text: str
+    facts_total: int
+    facts_kept: int
+    tokens: int
+    tokens_unbudgeted: int
+
+
+def _words(text: str) -> set[str]:
+    return {word for word in _WORD_PATTERN.findall(text.lower()) if word not in _STOP_WORDS}
+
+
+def interest_keywords(interests: Optional[str]) -> set[str]:
+    """Words of the interests plus every synonym of a recognized interest ("food" -> cuisine, restaurants...)."""
+    words = _words(interests or "")
+    labels = {INTEREST_SYNONYMS[word] for word in words if word in INTEREST_SYNONYMS}
+    synonyms = {word for word, label in INTEREST_SYNONYMS.items() if label in labels}
+    return words | synonyms | {label.lower() for label in labels}
+
+
+def compact_description(description: str, max_tokens: int = MAX_FACT_TOKENS) -> str:
+    """Collapses whitespace; long descriptions keep the first sentence and every sentence with a price or hours."""
+    text = re.sub(r"\s+", " ", description or "").strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = _SENTENCE_SPLIT.split(text)
+    kept = [sentences[0]] + [sentence for sentence in sentences[1:] if _HARD_DATA_PATTERN.search(sentence)]
+    compacted = " ".join(kept)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(compacted) > max_chars:
+        compacted = compacted[:max_chars].rsplit(" ", 1)[0] + "..."
+    return compacted
+
+
+def hard_data_only(description: str) -> str:
+    """The sentences of a description that carry a price, opening hours or days."""
+    sentences = _SENTENCE_SPLIT.split(description)
+    return " ".join(sentence for sentence in sentences if _HARD_DATA_PATTERN.search(sentence)) or description
+
+
+def project_facts(research: ResearchOutput) -> list[PlannerFact]:
+    """Drops source URLs and verification dates and removes duplicate facts."""
+    projected: list[PlannerFact] = []
+    seen_titles: set[str] = set()
+    seen_words: list[set[str]] = []
+
+    for fact in research.facts:
+        title = re.sub(r"\s+", " ", fact.title or "").strip()
+        description = compact_description(fact.description)
+        title_key = " ".join(sorted(_words(title)))
+        words = _words(f"{title} {description}")
+
+        # Same title, or nearly the same words, as a fact already kept
+        is_duplicate = title_key in seen_titles or any(
+            words and len(words & other) / len(words | other) >= 0.8 for other in seen_words
+        )
+        if is_duplicate:
+            CONTEXT_FACTS.inc(outcome="duplicate")
+            continue
+
+        seen_titles.add(title_key)
+        seen_words.append(words)
+        projected.append(PlannerFact(
+            title=title,
+            description=description,
+            hard_data=bool(_HARD_DATA_PATTERN.search(description))
+        ))
+    return projected
+
+
+def rank_facts(facts: list[PlannerFact], interests: Optional[str], focus: Iterable[str] = ()) -> list[PlannerFact]:
+    """
+    Orders facts by usefulness: invalid-destination markers, then hard data, then
+    overlap with the interests and the focus landmarks. Ties keep research order.
+    """
+    keywords = interest_keywords(interests)
+    focus_words = _words(" ".join(focus))
+
+    for fact in facts:
+        words = _words(f"{fact.title} {fact.description}")
+        fact.score = (
+            (100 if fact.title.lower() in INVALID_FACT_TITLES else 0)
+            + (10 if fact.hard_data else 0)
+            + 3 * len(words & focus_words)
+            + 2 * len(words & keywords)
+        )
+    return sorted(facts, key=lambda fact: -fact.score)
+
+
+def _legacy_size(research: ResearchOutput) -> int:
+    """Tokens of the full research rendering the planner used to receive."""
+    return sum(
+        estimate_tokens(f"- {fact.title}: {fact.description} (Source: {fact.source_url}, verified: {fact.verification_date})\n")
+        for fact in research.facts
+    )
+
+
+def build_planner_context(research: ResearchOutput, interests: Optional[str] = None, focus: Iterable[str] = (),
+                          max_tokens: int = PLANNER_CONTEXT_TOKENS) -> PlannerContext:
+    """
+    Projects, de-duplicates, ranks and budgets research facts for one planner prompt.
+
+    Args:
+        research: Verified research for the destination
+        interests: Traveler's interests, used for ranking
+        focus: Extra ranking keywords, e.g. the landmarks of the day being planned
+        max_tokens: Token budget of the rendered block
+
+    Returns:
+        PlannerContext: The rendered block (in original research order) and its size
+    """
+    facts = project_facts(research)
+    ranked = rank_facts(facts, interests, focus)
+
+    kept: list[PlannerFact] = []
+    used = 0
+    for fact in ranked:
+        cost = estimate_tokens(fact.render()) + 1
+        if used + cost > max_tokens and fact.hard_data:
+            # Keep the prices and hours even when the prose does not fit
+            fact.description = hard_data_only(fact.description)
+            cost = estimate_tokens(fact.render()) + 1
+            outcome = "trimmed"
+        else:
+            outcome = "kept"
+        if used + cost > max_tokens:
+            CONTEXT_FACTS.inc(outcome="over_budget")
+            continue
+        kept.append(fact)
+        used += cost
+        CONTEXT_FACTS.inc(outcome=outcome)
+
+    # Research order reads more naturally than score order
+    order = {id(fact): index for index, fact in enumerate(facts)}
+    kept.sort(key=lambda fact: order[id(fact)])
+    text = "\n".join(fact.render() for fact in kept)
+
+    context = PlannerContext(
+        text=text,
+        facts_total=len(research.facts),
+        facts_kept=len(kept),
+        tokens=estimate_tokens(text),
+        tokens_unbudgeted=_legacy_size(research)
+    )
+    logger.debug(
+        "Planner context for {}: {}/{} facts, {} tokens (was {})",
+        research.destination, context.facts_kept, context.facts_total, context.tokens, context.tokens_unbudgeted
+    )
+    return context
@@ -1,27 +1,107 @@
 """
 Main Crew orchestration for the Travel Companion system.
 """
+import contextvars
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Optional
 from crewai import Crew, Process
 from dotenv import load_dotenv
-from .agents import create_research_agent, create_planner_agent
-from .tasks import create_research_task, create_planning_task
-from .logger import get_logger
+from .agents import create_research_agent, create_planner_agent, warm_up_agents
+from .tasks import (
+    create_research_task, create_planning_task, create_skeleton_task, create_day_task, create_day_repair_task,
+    get_research_task_template
+)
+from .models import ResearchOutput, Itinerary, TripSkeleton, DaySkeleton, DayPlan
+from .preferences import normalize_duration
+from .validator import Violation, validate_itinerary, sort_by_time
+from .routing import optimize_routes, optimize_day, regroup_skeleton, regroup_days
+from .research_cache import get_cached_research, store_research, is_invalid_destination
+from .context_budget import estimate_tokens
+from .metrics import span, record_token_usage, CREW_RUNS, LLM_CALLS, PROMPT_TOKENS, VALIDATION_VIOLATIONS, ITINERARY_REPAIRS
+from .admission import acquire_llm_token
+from .logger import get_logger, CREW_VERBOSE
 
 logger = get_logger(__name__)
 
-# Load environment variables
+# Load environment variables (credentials are validated when the first agent is built)
 load_dotenv()
 
-# Validate API key
-if not os.getenv("GEMINI_API_KEY"):
-    raise ValueError("ERROR: GEMINI_API_KEY not found in .env file!")
+# Trips at least this long are planned day-by-day in parallel
+PARALLEL_PLANNING_MIN_DAYS = int(os.getenv("PARALLEL_PLANNING_MIN_DAYS", "4"))
+# Maximum number of days planned at the same time for one trip
+DAY_PLANNING_CONCURRENCY = int(os.getenv("DAY_PLANNING_CONCURRENCY", "4"))
+# Rounds of targeted per-day repair after local validation; 0 only reports violations
+VALIDATION_REPAIR_ROUNDS = int(os.getenv("VALIDATION_REPAIR_ROUNDS", "2"))
 
-# Disable OpenAI check (we're using Gemini)
-os.environ["OPENAI_API_KEY"] = "NA"
+# Activities that legitimately repeat across days and are not landmarks
+NON_LANDMARK_WORDS = ("breakfast", "lunch", "dinner", "brunch", "coffee", "hotel", "check-in", "check-out", "free time", "rest")
 
 
-def create_travel_crew(destination: str, duration: str, interests: str, budget: str):
+@dataclass
+class PlanningResult:
+    """Result of parallel planning, shaped like CrewOutput for callers that read `.pydantic`."""
+    pydantic: Itinerary
+    tasks_output: list = field(default_factory=list)
+
+    @property
+    def raw(self) -> str:
+        return self.pydantic.model_dump_json()
+
+
+def warm_up() -> float:
+    """
+    Validates the LLM environment and builds the agent and task templates, so the
+    first planning request only pays for copying them.
+
+    Returns:
+        float: Seconds spent
+    """
+    started = time.perf_counter()
+    warm_up_agents()
+    get_research_task_template(create_research_agent())
+    elapsed = time.perf_counter() - started
+    logger.info(f"Crew templates ready in {elapsed:.2f}s")
+    return elapsed
+
+
+def kickoff_crew(crew: Crew, inputs: dict, kind: str):
+    """
+    Runs a crew inside a timing span and records its prompt sizes, outcome, LLM calls and token usage.
+
+    One rate-limit token per task is taken from the agent model's bucket first, at the
+    priority of the caller (planning or batch); tool-calling turns are not counted.
+    """
+    with span("rate_limit_wait"):
+        for task in crew.tasks:
+            acquire_llm_token(task.agent.llm)
+
+    for task in crew.tasks:
+        task_name = task.output_pydantic.__name__ if task.output_pydantic else "task"
+        prompt_tokens = estimate_tokens(task.description) + estimate_tokens(task.expected_output)
+        PROMPT_TOKENS.observe(prompt_tokens, task=task_name)
+        logger.debug("{} prompt: ~{} tokens before context and tool output", task_name, prompt_tokens)
+
+    try:
+        with span(kind):
+            result = crew.kickoff(inputs=inputs)
+    except Exception:
+        CREW_RUNS.inc(kind=kind, outcome="failure")
+        raise
+
+    CREW_RUNS.inc(kind=kind, outcome="success")
+    usage = getattr(result, "token_usage", None)
+    if usage is not None and usage.successful_requests:
+        LLM_CALLS.inc(usage.successful_requests, component="crew")
+        record_token_usage("crew", usage.prompt_tokens, usage.completion_tokens)
+    return result
+
+
+def create_travel_crew(destination: str, duration: str, interests: str, budget: str,
+                       research: Optional[ResearchOutput] = None, task_callback: Optional[Callable] = None):
     """
     Creates and returns the configured Travel Companion crew.
     
@@ -30,10 +110,29 @@ def create_travel_crew(destination: str, duration: str, interests: str, budget:
         duration: Number of days for the trip
         interests: User's travel interests
         budget: Budget level (Low/Medium/High)
+        research: Fresh research to plan from; looked up in the research cache when None
+        task_callback: Called with each TaskOutput as soon as its task finishes
     
     Returns:
-        Crew: Configured crew with research and planning agents
+        Crew: Configured crew with research and planning agents, or a planner-only
+        crew when fresh research for the destination is cached
     """
+    if research is None:
+        research = get_cached_research(destination)
+    if research is not None:
+        logger.info(f"Research cache hit for {destination}, building planner-only crew")
+        planner = create_planner_agent()
+        planning_task = create_planning_task(
+            planner, None, destination, duration, interests, budget, research=research
+        )
+        return Crew(
+            agents=[planner],
+            tasks=[planning_task],
+            verbose=CREW_VERBOSE,
+            process=Process.sequential,
+            task_callback=task_callback
+        )
+
     # Create agents
     researcher = create_research_agent()
     planner = create_planner_agent()
@@ -46,13 +145,16 @@ def create_travel_crew(destination: str, duration: str, interests: str, budget:
     return Crew(
         agents=[researcher, planner],
         tasks=[research_task, planning_task],
-        verbose=True,
-        process=Process.sequential
+        verbose=CREW_VERBOSE,
+        process=Process.sequential,
+        task_callback=task_callback
     )
 
 
-def run_travel_planning(destination: str, duration: str = "3", interests: str = "general", budget: str = "medium"):
-    logger.info(f"Creating crew for {destination} with duration {duration}, interests {interests}, and budget {budget}")
+def run_travel_planning(destination: str, duration: str = "3", interests: str = "general", budget: str = "medium",
+                        on_event: Optional[Callable[[str, dict], None]] = None,
+                        research: Optional[ResearchOutput] = None):
+    logger.info("Creating crew for {} with duration {}, interests {}, and budget {}", destination, duration, interests, budget)
     """
     Executes the travel planning workflow for a given destination.
     
@@ -61,19 +163,349 @@ def run_travel_planning(destination: str, duration: str = "3", interests: str =
         duration: Number of days for the trip (default: "3")
         interests: User's travel interests (default: "general")
         budget: Budget level - Low/Medium/High (default: "medium")
+        on_event: Optional progress callback, called as on_event(event_name, payload) with
+            research_started, research_done and day_plan events. Trips planned by one crew
+            get every day_plan at once when the planner finishes (its single task returns
+            all days); trips of PARALLEL_PLANNING_MIN_DAYS or more get each day as it is planned
+        research: Research already resolved by the caller (e.g. shared by a batch); looked up when None
     
     Returns:
-        CrewOutput: Result containing the Itinerary object
+        CrewOutput or PlanningResult: Result containing the Itinerary object
     """
-    crew = create_travel_crew(destination, duration, interests, budget)
+    def emit(event: str, payload: dict):
+        if on_event is not None:
+            on_event(event, payload)
+
+    days = normalize_duration(duration)
+    if days is not None and days >= PARALLEL_PLANNING_MIN_DAYS:
+        return run_parallel_planning(destination, duration, interests, budget, on_event=on_event, research=research)
+
+    # Research runs as its own crew so the planner gets a budgeted copy of the facts
+    # (see core.context_budget) instead of the raw research task output
+    if research is None:
+        research = resolve_research(destination, emit)
+    if is_invalid_destination(research):
+        return PlanningResult(pydantic=Itinerary(
+            trip_title="Error: Invalid Destination",
+            summary=f"No verifiable travel data found for {destination}",
+            days=[]
+        ))
+
+    with span("crew_setup"):
+        crew = create_travel_crew(destination, duration, interests, budget, research=research)
     logger.debug("Crew created, starting kickoff")
 
-    result = crew.kickoff(inputs={
+    result = kickoff_crew(crew, {
         'destination': destination,
         'duration': duration,
         'interests': interests,
         'budget': budget
-    })
+    }, kind="planning")
+
+    if isinstance(result.pydantic, Itinerary):
+        # Short trips have no outline to regroup, so their planned days are regrouped instead
+        regroup_days(destination, result.pydantic)
+        # Days are streamed once routed locally, without waiting for repair crews
+        validate_and_repair(result.pydantic, {'destination': destination, 'duration': duration,
+                                              'interests': interests, 'budget': budget}, research,
+                            emit, streamed={})
 
     logger.info("Crew execution completed", destination=destination)
-    return result
\ No newline at end of file
+    return result
+
+
+
+def create_research_crew(destination: str):
+    """Creates a crew that only runs the research agent."""
+    researcher = create_research_agent()
+    return Crew(
+        agents=[researcher],
+        tasks=[create_research_task(researcher, destination)],
+        verbose=CREW_VERBOSE,
+        process=Process.sequential
+    )
+
+
+def resolve_research(destination: str, emit: Callable[[str, dict], None]) -> ResearchOutput:
+    """Returns cached research for the destination, running and caching the research agent on a miss."""
+    research = get_cached_research(destination)
+    if research is not None:
+        emit("research_done", {"cached": True, **research.model_dump()})
+        return research
+
+    emit("research_started", {"destination": destination})
+    with span("crew_setup"):
+        crew = create_research_crew(destination)
+    result = kickoff_crew(crew, {'destination': destination}, kind="research")
+    research = result.pydantic
+    if not isinstance(research, ResearchOutput):
+        raise ValueError(f"Unexpected research output type: {type(research)}")
+
+    store_research(destination, research)
+    emit("research_done", {"cached": False, **research.model_dump()})
+    return research
+
+
+def plan_day(inputs: dict, skeleton: TripSkeleton, day: DaySkeleton, research: ResearchOutput) -> DayPlan:
+    """Runs one planner sub-task for a single outlined day."""
+    with span("crew_setup"):
+        planner = create_planner_agent()
+        day_task = create_day_task(planner, skeleton, day, research, interests=inputs.get("interests"))
+        crew = Crew(agents=[planner], tasks=[day_task], verbose=CREW_VERBOSE, process=Process.sequential)
+
+    plan = kickoff_crew(crew, inputs, kind="day_plan").pydantic
+    if not isinstance(plan, DayPlan):
+        raise ValueError(f"Unexpected output type for day {day.day_number}: {type(plan)}")
+    plan.day_number = day.day_number
+    # Routed here already, so the streamed day_plan event shows the final order
+    sort_by_time(plan)
+    optimize_day(inputs.get("destination"), plan)
+    return plan
+
+
+def run_day_tasks(function: Callable, arguments: list) -> list[DayPlan]:
+    """Runs one day task per argument tuple concurrently, keeping the caller's LLM priority."""
+    with ThreadPoolExecutor(max_workers=DAY_PLANNING_CONCURRENCY, thread_name_prefix="day-planner") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, function, *args) for args in arguments]
+        return [future.result() for future in futures]
+
+
+def repair_day(inputs: dict, plan: DayPlan, research: ResearchOutput, problems: list[str]) -> DayPlan:
+    """Runs one planner sub-task that fixes the listed violations of a single day."""
+    with span("crew_setup"):
+        planner = create_planner_agent()
+        task = create_day_repair_task(planner, plan, research, problems, interests=inputs.get("interests"))
+        crew = Crew(agents=[planner], tasks=[task], verbose=CREW_VERBOSE, process=Process.sequential)
+
+    repaired = kickoff_crew(crew, inputs, kind="day_repair").pydantic
+    if not isinstance(repaired, DayPlan):
+        raise ValueError(f"Unexpected output type for repaired day {plan.day_number}: {type(repaired)}")
+    repaired.day_number = plan.day_number
+    return repaired
+
+
+def validate_and_repair(itinerary: Itinerary, inputs: dict, research: Optional[ResearchOutput],
+                        emit: Optional[Callable[[str, dict], None]] = None,
+                        streamed: Optional[dict[int, dict]] = None) -> list[Violation]:
+    """
+    Checks a planned itinerary with the local validator and fixes it in place.
+
+    Day numbering, surplus days, time order and walking routes (`core.routing`) are
+    fixed locally. Missing days are planned with the extension tasks of incremental
+    re-planning, and days that break the cost, paid-attraction or walking rules go
+    back to the planner one day each. Repairs are repeated at most
+    VALIDATION_REPAIR_ROUNDS times.
+
+    Args:
+        itinerary: Planned itinerary, modified in place
+        inputs: Crew inputs (destination, duration, interests, budget)
+        research: Research the plan was made from; without it only local fixes are made
+        emit: Optional progress callback, called with `day_plan` for every repaired day
+        streamed: `day_plan` payloads already emitted, by day number. When given, every
+            day that differs from what was streamed (or was never streamed) is emitted
+            as soon as the local fixes are done, before any repair crew runs
+
+    Returns:
+        list[Violation]: Violations left after the last round
+    """
+    if not itinerary.days or itinerary.trip_title.startswith("Error"):
+        return []
+    days = normalize_duration(inputs.get("duration"))
+    budget = inputs.get("budget")
+
+    with span("validation"):
+        itinerary.days.sort(key=lambda plan: plan.day_number)
+        if days is not None:
+            itinerary.days = itinerary.days[:days]
+        for number, plan in enumerate(itinerary.days, start=1):
+            plan.day_number = number
+            sort_by_time(plan)
+        optimize_routes(itinerary, inputs.get("destination"))
+        violations = validate_itinerary(itinerary, days, budget)
+    if emit is not None and streamed is not None:
+        for plan in itinerary.days:
+            payload = plan.model_dump()
+            if streamed.get(plan.day_number) != payload:
+                emit("day_plan", payload)
+    for violation in violations:
+        VALIDATION_VIOLATIONS.inc(rule=violation.rule)
+    if not violations:
+        ITINERARY_REPAIRS.inc(outcome="valid")
+        return []
+
+    repaired_days = 0
+    for attempt in range(VALIDATION_REPAIR_ROUNDS):
+        if research is None:
+            break
+        logger.info("Repairing itinerary for {} (round {}): {}", inputs.get("destination"), attempt + 1,
+                    "; ".join(violation.message for violation in violations))
+        with span("itinerary_repair"):
+            changed: list[DayPlan] = []
+            if days is not None and len(itinerary.days) < days:
+                # Imported here: incremental re-planning builds on this module
+                from .replanning import extend_itinerary
+                _, added = extend_itinerary(inputs, itinerary, days, research)
+                itinerary.days.extend(added)
+                changed.extend(added)
+
+            problems: dict[int, list[str]] = {}
+            for violation in violations:
+                if violation.day_number is not None:
+                    problems.setdefault(violation.day_number, []).append(violation.message)
+            plans = {plan.day_number: plan for plan in itinerary.days}
+            repaired = run_day_tasks(repair_day, [
+                (inputs, plans[number], research, messages) for number, messages in sorted(problems.items())
+            ])
+            for plan in changed + repaired:
+                sort_by_time(plan)
+                optimize_day(inputs.get("destination"), plan)
+            for plan in repaired:
+                plans[plan.day_number] = plan
+            itinerary.days = [plans[number] for number in sorted(plans)]
+            changed.extend(repaired)
+
+        repaired_days += len(changed)
+        if emit is not None:
+            for plan in sorted(changed, key=lambda plan: plan.day_number):
+                emit("day_plan", plan.model_dump())
+        violations = validate_itinerary(itinerary, days, budget)
+        if not violations:
+            break
+
+    if violations:
+        ITINERARY_REPAIRS.inc(outcome="unresolved")
+        for violation in violations:
+            logger.warning(f"Itinerary check ({inputs.get('destination')}): {violation.message}")
+    else:
+        ITINERARY_REPAIRS.inc(outcome="repaired" if repaired_days else "fixed_locally")
+    return violations
+
+
+def _landmark_key(name: str) -> str:
+    """Normalized activity name used to spot the same landmark on two days."""
+    key = re.sub(r"[^\w\s]", " ", name.lower())
+    key = re.sub(r"^\s*(visit|explore|tour of|the)\s+", "", key)
+    return re.sub(r"\s+", " ", key).strip()
+
+
+def _mentions(text: str, phrase: str) -> bool:
+    """True if most significant words of `phrase` appear in `text`."""
+    words = [word for word in re.findall(r"\w+", phrase.lower()) if len(word) > 3]
+    if not words:
+        return phrase.lower() in text.lower()
+    found = sum(1 for word in words if word in text.lower())
+    return found * 2 >= len(words)
+
+
+def enforce_cross_day_constraints(itinerary: Itinerary, skeleton: TripSkeleton) -> list[str]:
+    """
+    Checks the merged itinerary for constraints no single day task can see.
+
+    Landmarks repeated on a later day are removed; the signature "wow" experience
+    must appear on exactly one day.
+
+    Returns:
+        list[str]: Human-readable description of every problem found
+    """
+    problems = []
+    first_seen: dict[str, int] = {}
+    for day in itinerary.days:
+        kept = []
+        for activity in day.activities:
+            key = _landmark_key(activity.name)
+            is_landmark = not any(word in key for word in NON_LANDMARK_WORDS)
+            if is_landmark and key in first_seen and first_seen[key] != day.day_number:
+                problems.append(f"'{activity.name}' on day {day.day_number} repeats day {first_seen[key]}; removed")
+                continue
+            first_seen.setdefault(key, day.day_number)
+            kept.append(activity)
+        day.activities = kept
+
+    wow_days = [
+        day.day_number for day in itinerary.days
+        if any(_mentions(f"{activity.name} {activity.description}", skeleton.wow_experience) for activity in day.activities)
+    ]
+    if not wow_days:
+        problems.append(f"Signature experience '{skeleton.wow_experience}' is missing")
+    elif len(wow_days) > 1:
+        problems.append(f"Signature experience '{skeleton.wow_experience}' appears on days {wow_days}")
+
+    return problems
+
+
+def run_parallel_planning(destination: str, duration: str, interests: str, budget: str,
+                          on_event: Optional[Callable[[str, dict], None]] = None,
+                          research: Optional[ResearchOutput] = None) -> PlanningResult:
+    """
+    Plans a trip as an outline followed by one concurrent planner sub-task per day.
+
+    Wall-clock time follows the slowest day instead of the sum of all days.
+    
+    Args:
+        destination: City or destination name
+        duration: Number of days for the trip
+        interests: User's travel interests
+        budget: Budget level (Low/Medium/High)
+        on_event: Optional progress callback (same events as run_travel_planning)
+        research: Research already resolved by the caller; looked up when None
+    
+    Returns:
+        PlanningResult: Result containing the merged Itinerary object
+    """
+    def emit(event: str, payload: dict):
+        if on_event is not None:
+            on_event(event, payload)
+
+    inputs = {
+        'destination': destination,
+        'duration': duration,
+        'interests': interests,
+        'budget': budget
+    }
+
+    if research is None:
+        research = resolve_research(destination, emit)
+    if is_invalid_destination(research):
+        return PlanningResult(pydantic=Itinerary(
+            trip_title="Error: Invalid Destination",
+            summary=f"No verifiable travel data found for {destination}",
+            days=[]
+        ))
+
+    with span("crew_setup"):
+        planner = create_planner_agent()
+        skeleton_task = create_skeleton_task(planner, destination, duration, interests, budget, research)
+        skeleton_crew = Crew(agents=[planner], tasks=[skeleton_task], verbose=CREW_VERBOSE, process=Process.sequential)
+    skeleton = kickoff_crew(skeleton_crew, inputs, kind="skeleton").pydantic
+    if not isinstance(skeleton, TripSkeleton):
+        raise ValueError(f"Unexpected skeleton output type: {type(skeleton)}")
+    # Landmarks are regrouped by area before the days are planned around them
+    regroup_skeleton(destination, skeleton, pinned=lambda landmark: _mentions(landmark, skeleton.wow_experience))
+    logger.info(f"Skeleton ready for {destination}: {len(skeleton.days)} days, planning them in parallel")
+
+    day_plans = []
+    streamed: dict[int, dict] = {}
+    with ThreadPoolExecutor(max_workers=DAY_PLANNING_CONCURRENCY, thread_name_prefix="day-planner") as pool:
+        # Each day thread runs in a copy of this context, keeping the caller's LLM priority
+        futures = [
+            pool.submit(contextvars.copy_context().run, plan_day, inputs, skeleton, day, research)
+            for day in skeleton.days
+        ]
+        for future in as_completed(futures):
+            plan = future.result()
+            day_plans.append(plan)
+            streamed[plan.day_number] = plan.model_dump()
+            emit("day_plan", streamed[plan.day_number])
+
+    itinerary = Itinerary(
+        trip_title=skeleton.trip_title,
+        summary=skeleton.summary,
+        days=sorted(day_plans, key=lambda plan: plan.day_number)
+    )
+    for problem in enforce_cross_day_constraints(itinerary, skeleton):
+        logger.warning(f"Cross-day check ({destination}): {problem}")
+    # Days the cross-day check or the local fixes changed are streamed again
+    validate_and_repair(itinerary, inputs, research, emit, streamed=streamed)
+
+    logger.info("Parallel planning completed", destination=destination)
+    return PlanningResult(pydantic=itinerary)
@@ -0,0 +1,177 @@
+"""
+Deterministic preference extractor.
+
+Parses short, unambiguous chat turns ("5 days", "cheap", "Rome, food and art")
+locally so they do not need a conversation-manager LLM call.
+"""
+import re
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Optional
+from . import gazetteer
+from .preferences import WORD_NUMBERS, BUDGET_SYNONYMS
+
+# Canonical interest labels and the words that map to them
+INTEREST_SYNONYMS = {
+    "art": "Art", "arts": "Art", "museum": "Art", "museums": "Art", "gallery": "Art",
+    "galleries": "Art", "painting": "Art", "paintings": "Art",
+    "history": "History", "historic": "History", "historical": "History", "ancient": "History",
+    "castles": "History", "ruins": "History",
+    "food": "Food", "foodie": "Food", "cuisine": "Food", "eating": "Food", "restaurants": "Food",
+    "gastronomy": "Food", "culinary": "Food",
+    "wine": "Wine", "wines": "Wine", "vineyards": "Wine",
+    "nature": "Nature", "hiking": "Nature", "hike": "Nature", "outdoors": "Nature",
+    "parks": "Nature", "mountains": "Nature",
+    "beach": "Beaches", "beaches": "Beaches", "sea": "Beaches", "swimming": "Beaches",
+    "nightlife": "Nightlife", "bars": "Nightlife", "clubs": "Nightlife", "party": "Nightlife",
+    "partying": "Nightlife",
+    "shopping": "Shopping", "markets": "Shopping",
+    "architecture": "Architecture", "buildings": "Architecture",
+    "music": "Music", "concerts": "Music", "opera": "Music",
+    "culture": "Culture", "cultural": "Culture",
+    "adventure": "Adventure", "sports": "Sports",
+    "relaxation": "Relaxation", "relax": "Relaxation", "relaxing": "Relaxation", "spa": "Relaxation",
+    "wellness": "Relaxation",
+    "photography": "Photography", "photos": "Photography"
+}
+
+# Place names that are also everyday words ("nice trip", "with us") are left to the LLM
+AMBIGUOUS_PLACE_WORDS = {"nice", "split", "bath", "bled", "us", "la", "dc", "ny", "sf", "kl", "hk", "rio", "turkey", "chile", "jordan", "georgia"}
+
+# Words that carry no preference but may surround one ("I want to go to Rome for 5 days")
+FILLER_WORDS = {
+    "i", "im", "i'm", "we", "were", "we're", "me", "my", "our", "us", "want", "wanna", "would", "like",
+    "love", "to", "go", "going", "visit", "visiting", "see", "travel", "traveling", "travelling",
+    "trip", "a", "an", "the", "for", "about", "around", "maybe", "please", "and", "with", "in", "on",
+    "of", "is", "it", "be", "thinking", "plan", "planning", "stay", "staying", "interested", "into",
+    "mostly", "mainly", "also", "some", "ok", "okay", "yes", "yeah", "sure", "lets", "let's", "just",
+    "really", "very", "level", "budget", "stuff", "things", "something", "there", "then", "so",
+    "days", "day", "nights", "night", "week", "weeks", "weekend", "fortnight", "total", "roughly",
+    "price", "prices", "range", "spend", "spending", "prefer", "keep", "do", "enjoy", "fan", "big"
+}
+
+# Vague amounts ("a few days") are left to the LLM
+_EXACT_WORD_NUMBERS = {word: number for word, number in WORD_NUMBERS.items() if word not in ("couple", "few", "several")}
+
+_DURATION_PATTERN = re.compile(
+    r"\b(\d{1,2}|" + "|".join(sorted(_EXACT_WORD_NUMBERS, key=len, reverse=True)) + r")\s*-?\s*(days?|nights?|weeks?)\b"
+)
+_SINGLE_UNIT_PATTERN = re.compile(r"\b(?:a|one)?\s*(week|weekend|fortnight)\b")
+_UNIT_DAYS = {"day": 1, "days": 1, "night": 1, "nights": 1, "week": 7, "weeks": 7, "weekend": 2, "fortnight": 14}
+
+MAX_FAST_PATH_DAYS = 30
+
+_stats_lock = Lock()
+_stats = {"fast_path_hits": 0, "llm_fallbacks": 0}
+
+
+@dataclass
+class Extraction:
+    """Preferences found in one message, plus whether every word was understood."""
+    values: dict = field(default_factory=dict)
+    fully_parsed: bool = False
+
+
+def _tokens(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def extract_duration(text: str, allow_bare_number: bool = False) -> tuple[Optional[int], str]:
+    """
+    Finds an explicit trip length in days.
+
+    Returns:
+        tuple: (days or None, text with the matched span removed)
+    """
+    lowered = text.lower()
+    match = _DURATION_PATTERN.search(lowered)
+    if match:
+        amount, unit = match.groups()
+        count = int(amount) if amount.isdigit() else _EXACT_WORD_NUMBERS[amount]
+        days = count * _UNIT_DAYS[unit]
+        return days, lowered[:match.start()] + " " + lowered[match.end():]
+
+    match = _SINGLE_UNIT_PATTERN.search(lowered)
+    if match:
+        return _UNIT_DAYS[match.group(1)], lowered[:match.start()] + " " + lowered[match.end():]
+
+    stripped = lowered.strip(" .!")
+    if allow_bare_number and stripped.isdigit():
+        return int(stripped), ""
+
+    return None, lowered
+
+
+def extract_destination(text: str) -> tuple[Optional[str], str]:
+    """Finds a gazetteer destination by exact name (longest match first)."""
+    tokens = _tokens(text)
+    for size in (4, 3, 2, 1):
+        for start in range(len(tokens) - size + 1):
+            candidate = " ".join(tokens[start:start + size])
+            if candidate in AMBIGUOUS_PLACE_WORDS or candidate in FILLER_WORDS:
+                continue
+            place = gazetteer.lookup(candidate)
+            if place is not None:
+                remaining = tokens[:start] + tokens[start + size:]
+                return place.name, " ".join(remaining)
+    return None, text
+
+
+def extract_preferences(message: str, current_data: dict) -> Extraction:
+    """
+    Extracts destination, duration, interests and budget from one message.
+
+    A bare number counts as a duration only while the duration is still missing.
+    `fully_parsed` is True when every word is either a recognized value or filler.
+    """
+    values = {}
+
+    days, rest = extract_duration(message, allow_bare_number=not current_data.get("duration"))
+    if days is not None and 0 < days <= MAX_FAST_PATH_DAYS:
+        values["duration"] = f"{days} day" if days == 1 else f"{days} days"
+    elif days is not None:
+        return Extraction()
+
+    destination, rest = extract_destination(rest)
+    if destination:
+        values["destination"] = destination
+
+    leftover = []
+    budgets = set()
+    interests = []
+    for token in _tokens(rest):
+        if token in INTEREST_SYNONYMS:
+            label = INTEREST_SYNONYMS[token]
+            if label not in interests:
+                interests.append(label)
+        elif token in BUDGET_SYNONYMS and token != "budget":
+            budgets.add(BUDGET_SYNONYMS[token])
+        elif token not in FILLER_WORDS:
+            leftover.append(token)
+
+    # "on a budget" with no other budget word means a low budget
+    if not budgets and re.search(r"\bon an? (tight )?budget\b", rest):
+        budgets.add("low")
+
+    if len(budgets) > 1:
+        # "cheap but luxury" is ambiguous; let the LLM sort it out
+        return Extraction(values=values)
+    if budgets:
+        values["budget"] = budgets.pop().capitalize()
+    if interests:
+        values["interests"] = ", ".join(interests)
+
+    return Extraction(values=values, fully_parsed=bool(values) and not leftover)
+
+
+def record_fast_path(hit: bool):
+    """Counts a turn answered locally (hit) or sent to the LLM."""
+    with _stats_lock:
+        _stats["fast_path_hits" if hit else "llm_fallbacks"] += 1
+
+
+def fast_path_stats() -> dict:
+    """Fast-path hits, LLM fallbacks and the resulting hit rate."""
+    with _stats_lock:
+        total = _stats["fast_path_hits"] + _stats["llm_fallbacks"]
+        return {**_stats, "hit_rate": _stats["fast_path_hits"] / total if total else 0.0}
@@ -0,0 +1,188 @@
+"""
+Offline gazetteer of real travel destinations.
+
+Cities, regions and countries (with alternate names) are read lazily from
+`core/data/places.tsv` into a sorted key index that supports exact, prefix and
+typo-tolerant lookups without any network or LLM call.
+"""
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+from threading import Lock
+from typing import NamedTuple, Optional
+
+GAZETTEER_PATH = Path(os.getenv("GAZETTEER_PATH", Path(__file__).parent / "data" / "places.tsv"))
+
+# Keys shorter than this are matched exactly only ("LA", "UK")
+MIN_FUZZY_LENGTH = 4
+
+
+class Place(NamedTuple):
+    """A known destination."""
+    name: str
+    kind: str  # city | region | country
+    country: str
+
+
+class _Index:
+    """Sorted normalized keys, each pointing at an entry of `places`, plus keys bucketed by length for fuzzy search."""
+
+    def __init__(self, places: list[Place], keys: list[str], targets: list[int]):
+        self.places = places
+        self.keys = keys
+        self.targets = targets
+        self.by_length: dict[int, list[str]] = {}
+        for key in keys:
+            self.by_length.setdefault(len(key), []).append(key)
+
+
+_index: Optional[_Index] = None
+_index_lock = Lock()
+
+
+def normalize_place_name(name: str) -> str:
+    """Accent-, case- and punctuation-insensitive key ("Zürich" -> "zurich", "Xi'an" -> "xi an")."""
+    folded = unicodedata.normalize("NFKD", name or "")
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return re.sub(r"[^a-z0-9]+", " ", folded.lower()).strip()
+
+
+def _load_index() -> _Index:
+    places: list[Place] = []
+    entries: dict[str, int] = {}
+
+    with open(GAZETTEER_PATH, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, kind, country, alternates = (line.rstrip("\n").split("\t") + [""] * 4)[:4]
+            place_id = len(places)
+            places.append(Place(name=name, kind=kind, country=country))
+            for alias in [name, *alternates.split("|")]:
+                key = normalize_place_name(alias)
+                # First entry wins, so a city listed before a same-named region keeps the key
+                if key and key not in entries:
+                    entries[key] = place_id
+
+    keys = sorted(entries)
+    return _Index(places=places, keys=keys, targets=[entries[key] for key in keys])
+
+
+def get_index() -> _Index:
+    """Returns the gazetteer index, loading it from disk on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index()
+    return _index
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance with adjacent transpositions, giving up once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous_previous is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def lookup(name: str) -> Optional[Place]:
+    """Exact match on a name or alternate name."""
+    index = get_index()
+    key = normalize_place_name(name)
+    position = bisect_left(index.keys, key)
+    if position < len(index.keys) and index.keys[position] == key:
+        return index.places[index.targets[position]]
+    return None
+
+
+def search_prefix(prefix: str, limit: int = 10) -> list[Place]:
+    """Places whose name or alternate name starts with `prefix`, in key order."""
+    index = get_index()
+    key = normalize_place_name(prefix)
+    if not key:
+        return []
+
+    results: list[Place] = []
+    position = bisect_left(index.keys, key)
+    while position < len(index.keys) and index.keys[position].startswith(key) and len(results) < limit:
+        place = index.places[index.targets[position]]
+        if place not in results:
+            results.append(place)
+        position += 1
+    return results
+
+
+def fuzzy_lookup(name: str) -> Optional[Place]:
+    """
+    Closest place within a small edit distance ("Pariss" -> Paris, "Barcelna" -> Barcelona).
+
+    One edit is allowed for names up to 7 characters, two for longer ones.
+    """
+    key = normalize_place_name(name)
+    if len(key) < MIN_FUZZY_LENGTH:
+        return None
+
+    index = get_index()
+    limit = 1 if len(key) <= 7 else 2
+    letters = set(key)
+    best: Optional[tuple[int, str]] = None
+    for length in range(max(MIN_FUZZY_LENGTH, len(key) - limit), len(key) + limit + 1):
+        for candidate in index.by_length.get(length, ()):
+            # Each edit changes at most two letters of the letter set; skip hopeless candidates cheaply
+            if len(letters.symmetric_difference(candidate)) > 2 * limit:
+                continue
+            distance = _edit_distance(key, candidate, limit)
+            if distance <= limit and (best is None or distance < best[0]):
+                best = (distance, candidate)
+                if distance == 1:
+                    # Exact matches are handled by lookup(), so one edit is the best possible
+                    return lookup(best[1])
+
+    if best is None:
+        return None
+    return lookup(best[1])
+
+
+def resolve(name: str) -> Optional[Place]:
+    """
+    Exact match on a name or alternate name ("Roma" -> Rome).
+
+    "Paris, France" falls back to its first part when the full text is unknown.
+    Near misses are not resolved: "Parma" or "Paros" may be real places the
+    gazetteer lacks, so see `suggest` for typo corrections.
+    """
+    if not name or not name.strip():
+        return None
+    place = lookup(name)
+    if place is None and "," in name:
+        place = resolve(name.split(",", 1)[0])
+    return place
+
+
+def suggest(name: str) -> Optional[Place]:
+    """
+    Typo-tolerant match for an unknown name, to offer as "Did you mean ...?".
+
+    Never use the result without the user's confirmation.
+    """
+    if not name or not name.strip():
+        return None
+    place = fuzzy_lookup(name)
+    if place is None and "," in name:
+        place = suggest(name.split(",", 1)[0])
+    return place
@@ -0,0 +1,66 @@
+"""
+Result cache for finished itineraries.
+
+Plans are keyed by the canonical preference tuple, so "Paris / 3 days / Art / Medium"
+and "paris / three days / art / mid-range" return the same itinerary without a crew run.
+"""
+import os
+from typing import Optional
+from .cache import TTLCache
+from .preferences import preference_key
+from .research_cache import normalize_destination
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long a generated itinerary is served to identical requests
+ITINERARY_CACHE_TTL_SECONDS = float(os.getenv("ITINERARY_CACHE_TTL_SECONDS", "86400"))
+# Maximum number of itineraries kept; least recently used are evicted first
+ITINERARY_CACHE_SIZE = int(os.getenv("ITINERARY_CACHE_SIZE", "512"))
+
+_cache = TTLCache(maxsize=ITINERARY_CACHE_SIZE, ttl_seconds=ITINERARY_CACHE_TTL_SECONDS)
+
+
+def get_cached_itinerary(preferences: dict) -> Optional[dict]:
+    """Returns a cached itinerary dict for these preferences, or None."""
+    key = preference_key(preferences)
+    if not key[0]:
+        return None
+    return _cache.get(key)
+
+
+def store_itinerary(preferences: dict, itinerary: dict):
+    """Caches a generated itinerary. Error itineraries (e.g. invalid destination) are skipped."""
+    if not itinerary.get("days") or str(itinerary.get("trip_title", "")).startswith("Error"):
+        return
+    key = preference_key(preferences)
+    if not key[0]:
+        return
+    _cache.set(key, itinerary)
+    logger.debug(f"Cached itinerary for {key}")
+
+
+def invalidate_itineraries(destination: Optional[str] = None) -> int:
+    """
+    Drops cached itineraries.
+
+    Args:
+        destination: Only drop plans for this destination; all plans when None
+
+    Returns:
+        int: Number of removed entries
+    """
+    if destination is None:
+        return _cache.clear()
+
+    target = normalize_destination(destination)
+    removed = 0
+    for key in _cache.keys():
+        if key[0] == target and _cache.pop(key):
+            removed += 1
+    return removed
+
+
+def itinerary_cache_stats() -> dict:
+    """Hit/miss/eviction counters of the itinerary cache."""
+    return _cache.stats()
@@ -0,0 +1,312 @@
+"""
+Normalized itinerary history.
+
+Every generated itinerary is stored as one `itineraries` row plus its days and
+activities, so history queries ("all plans of user X", "all Rome itineraries
+this month") are index range scans instead of decoding JSON blobs. A plan is
+written with three INSERT statements regardless of its size (days and
+activities as one multi-row insert each) and read back with three SELECTs for
+a whole page, reassembled into exactly the `Itinerary.model_dump()` shape.
+
+`ChatSession.itinerary` still holds the session's current plan as before.
+"""
+import base64
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, insert, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .database import ItineraryRecord, ItineraryDayRecord, ActivityRecord
+from .research_cache import normalize_destination
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Page size of the history endpoints, default and maximum
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Columns of ItineraryRecord returned by history listings
+_SUMMARY_COLUMNS = (
+    ItineraryRecord.itinerary_id, ItineraryRecord.session_id, ItineraryRecord.user_id, ItineraryRecord.job_id,
+    ItineraryRecord.destination, ItineraryRecord.duration, ItineraryRecord.interests, ItineraryRecord.budget,
+    ItineraryRecord.trip_title, ItineraryRecord.summary, ItineraryRecord.created_at
+)
+
+
+def itinerary_statements(itinerary: dict, session_id: str, user_id: Optional[str], preferences: dict,
+                         job_id: Optional[str] = None) -> tuple[str, list]:
+    """
+    Builds the INSERTs that store one itinerary: the itinerary row, then all days
+    and all activities as one multi-row insert each.
+
+    Returns:
+        (itinerary_id, [(statement, parameters), ...]) to run in order, in one transaction
+    """
+    itinerary_id = str(uuid.uuid4())
+    destination = preferences.get("destination")
+    row = {
+        "itinerary_id": itinerary_id,
+        "session_id": session_id,
+        "user_id": user_id,
+        "job_id": job_id,
+        "destination": destination,
+        "destination_key": normalize_destination(destination) if destination else None,
+        "duration": preferences.get("duration"),
+        "interests": preferences.get("interests"),
+        "budget": preferences.get("budget"),
+        "trip_title": itinerary.get("trip_title"),
+        "summary": itinerary.get("summary"),
+        "created_at": datetime.utcnow()
+    }
+    days, activities = [], []
+    for day in itinerary.get("days", []):
+        days.append({
+            "itinerary_id": itinerary_id,
+            "day_number": day["day_number"],
+            "theme": day.get("theme"),
+            "walking_km": day.get("walking_km")
+        })
+        for position, activity in enumerate(day.get("activities", [])):
+            activities.append({
+                "itinerary_id": itinerary_id,
+                "day_number": day["day_number"],
+                "position": position,
+                "name": activity.get("name"),
+                "description": activity.get("description"),
+                "time_slot": activity.get("time_slot"),
+                "duration": activity.get("duration"),
+                "cost_estimate": activity.get("cost_estimate")
+            })
+
+    statements = [(insert(ItineraryRecord), [row])]
+    if days:
+        statements.append((insert(ItineraryDayRecord), days))
+    if activities:
+        statements.append((insert(ActivityRecord), activities))
+    return itinerary_id, statements
+
+
+def is_storable(itinerary: Optional[dict]) -> bool:
+    """Error itineraries (e.g. invalid destination) have no days and are not kept in the history."""
+    return bool(itinerary and itinerary.get("days"))
+
+
+def save_itinerary(db: Session, itinerary: dict, session_id: str, user_id: Optional[str], preferences: dict,
+                   job_id: Optional[str] = None) -> Optional[str]:
+    """
+    Adds an itinerary to the history on a sync session (planning workers). Does not commit.
+
+    Returns:
+        The new itinerary id, or None for an error itinerary
+    """
+    if not is_storable(itinerary):
+        return None
+    itinerary_id, statements = itinerary_statements(itinerary, session_id, user_id, preferences, job_id)
+    for statement, parameters in statements:
+        db.execute(statement, parameters)
+    return itinerary_id
+
+
+async def save_itinerary_async(db: AsyncSession, itinerary: dict, session_id: str, user_id: Optional[str],
+                               preferences: dict, job_id: Optional[str] = None) -> Optional[str]:
+    """Same as `save_itinerary`, on the async request-path session. Does not commit."""
+    if not is_storable(itinerary):
+        return None
+    itinerary_id, statements = itinerary_statements(itinerary, session_id, user_id, preferences, job_id)
+    for statement, parameters in statements:
+        await db.execute(statement, parameters)
+    return itinerary_id
+
+
+def latest_preferences(db: Session, session_id: str) -> Optional[dict]:
+    """Preferences of the session's most recent stored itinerary, or None."""
+    row = db.execute(
+        select(ItineraryRecord.destination, ItineraryRecord.duration, ItineraryRecord.interests, ItineraryRecord.budget)
+        .where(ItineraryRecord.session_id == session_id)
+        .order_by(ItineraryRecord.created_at.desc(), ItineraryRecord.itinerary_id.desc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    return {"destination": row.destination, "duration": row.duration, "interests": row.interests, "budget": row.budget}
+
+
+def encode_cursor(created_at: datetime, itinerary_id: str) -> str:
+    """Opaque keyset cursor: position of the last item of a page."""
+    raw = f"{created_at.isoformat()}|{itinerary_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by `encode_cursor`
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, itinerary_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), itinerary_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+@dataclass
+class HistoryPage:
+    """One page of itinerary history, newest first."""
+    items: list[dict]
+    next_cursor: Optional[str]
+
+
+async def assemble_itineraries(db: AsyncSession, rows: list) -> dict[str, dict]:
+    """
+    Rebuilds `Itinerary.model_dump()` dicts for itinerary rows with two queries
+    (all days, all activities of the page) and plain tuples instead of ORM objects.
+    """
+    ids = [row.itinerary_id for row in rows]
+    if not ids:
+        return {}
+
+    itineraries = {
+        row.itinerary_id: {"trip_title": row.trip_title, "summary": row.summary, "days": []} for row in rows
+    }
+    days_by_key = {}
+    day_rows = await db.execute(
+        select(
+            ItineraryDayRecord.itinerary_id, ItineraryDayRecord.day_number, ItineraryDayRecord.theme,
+            ItineraryDayRecord.walking_km
+        )
+        .where(ItineraryDayRecord.itinerary_id.in_(ids))
+        .order_by(ItineraryDayRecord.itinerary_id, ItineraryDayRecord.day_number)
+    )
+    for itinerary_id, day_number, theme, walking_km in day_rows:
+        day = {"day_number": day_number, "theme": theme, "activities": [], "walking_km": walking_km}
+        itineraries[itinerary_id]["days"].append(day)
+        days_by_key[(itinerary_id, day_number)] = day
+
+    activity_rows = await db.execute(
+        select(
+            ActivityRecord.itinerary_id, ActivityRecord.day_number, ActivityRecord.name, ActivityRecord.description,
+            ActivityRecord.time_slot, ActivityRecord.duration, ActivityRecord.cost_estimate
+        )
+        .where(ActivityRecord.itinerary_id.in_(ids))
+        .order_by(ActivityRecord.itinerary_id, ActivityRecord.day_number, ActivityRecord.position)
+    )
+    for itinerary_id, day_number, name, description, time_slot, duration, cost_estimate in activity_rows:
+        days_by_key[(itinerary_id, day_number)]["activities"].append({
+            "name": name,
+            "description": description,
+            "time_slot": time_slot,
+            "duration": duration,
+            "cost_estimate": cost_estimate
+        })
+    return itineraries
+
+
+def _summary(row) -> dict:
+    return {
+        "itinerary_id": row.itinerary_id,
+        "session_id": row.session_id,
+        "user_id": row.user_id,
+        "job_id": row.job_id,
+        "destination": row.destination,
+        "preferences": {
+            "destination": row.destination,
+            "duration": row.duration,
+            "interests": row.interests,
+            "budget": row.budget
+        },
+        "trip_title": row.trip_title,
+        "created_at": row.created_at
+    }
+
+
+async def list_itineraries(db: AsyncSession, user_id: Optional[str] = None, destination: Optional[str] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           cursor: Optional[str] = None, limit: int = HISTORY_PAGE_SIZE,
+                           include_itinerary: bool = True) -> HistoryPage:
+    """
+    One page of stored itineraries, newest first, filtered by owner, destination and
+    creation time. Pages continue from `cursor` (keyset pagination: the cost of a
+    page does not grow with its depth).
+
+    Args:
+        db: Async database session
+        user_id: Only this user's itineraries
+        destination: Only itineraries for this destination (normalized, "Roma" matches "Rome")
+        since: Created at or after (UTC)
+        until: Created before (UTC)
+        cursor: `next_cursor` of the previous page
+        limit: Page size, capped at HISTORY_MAX_PAGE_SIZE
+        include_itinerary: Reassemble the full itinerary of each item (two extra queries per page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = select(*_SUMMARY_COLUMNS)
+    if user_id is not None:
+        query = query.where(ItineraryRecord.user_id == user_id)
+    if destination is not None:
+        query = query.where(ItineraryRecord.destination_key == normalize_destination(destination))
+    if since is not None:
+        query = query.where(ItineraryRecord.created_at >= since)
+    if until is not None:
+        query = query.where(ItineraryRecord.created_at < until)
+    if cursor is not None:
+        created_at, itinerary_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ItineraryRecord.created_at < created_at,
+            and_(ItineraryRecord.created_at == created_at, ItineraryRecord.itinerary_id < itinerary_id)
+        ))
+    query = query.order_by(ItineraryRecord.created_at.desc(), ItineraryRecord.itinerary_id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [_summary(row) for row in rows]
+    if include_itinerary:
+        itineraries = await assemble_itineraries(db, rows)
+        for item in items:
+            item["itinerary"] = itineraries[item["itinerary_id"]]
+
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].itinerary_id) if has_more else None
+    return HistoryPage(items=items, next_cursor=next_cursor)
+
+
+async def load_itinerary(db: AsyncSession, itinerary_id: str) -> Optional[dict]:
+    """A single stored itinerary with its summary fields, or None."""
+    row = (await db.execute(select(*_SUMMARY_COLUMNS).where(ItineraryRecord.itinerary_id == itinerary_id))).first()
+    if row is None:
+        return None
+    item = _summary(row)
+    item["itinerary"] = (await assemble_itineraries(db, [row]))[itinerary_id]
+    return item
+
+
+def backfill_from_sessions(db: Session) -> int:
+    """
+    Copies itineraries stored only as chat_sessions JSON into the history tables
+    (sessions that have no history row yet). Commits.
+
+    Returns:
+        int: Number of itineraries copied
+    """
+    from .database import ChatSession
+
+    stored = select(ItineraryRecord.session_id)
+    sessions = db.query(ChatSession).filter(
+        ChatSession.itinerary.isnot(None), ChatSession.session_id.not_in(stored)
+    ).all()
+    copied = 0
+    for chat_session in sessions:
+        if save_itinerary(db, chat_session.itinerary, chat_session.session_id, chat_session.user_id,
+                          chat_session.data or {}) is not None:
+            copied += 1
+    db.commit()
+    if copied:
+        logger.info(f"Backfilled {copied} itineraries into the history tables")
+    return copied
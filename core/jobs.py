@@ -0,0 +1,380 @@
+"""
+Background job queue for itinerary planning.
+
+Crew runs take minutes, so they are executed on a bounded worker pool instead of
+inside the request handler. Job state is persisted in the `planning_jobs` table so
+queued or interrupted jobs are picked up again after a restart.
+
+Several processes may share the table. A worker claims a job with a conditional
+UPDATE (queued -> running, owner = this process) and only the claimant runs it.
+Running jobs carry a heartbeat refreshed every JOB_HEARTBEAT_SECONDS; a job whose
+heartbeat is older than JOB_LEASE_SECONDS belongs to a dead process and is
+queued again. Results are written only while the worker still owns the job.
+"""
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .database import SessionLocal, ChatSession, PlanningJob, store_session_itinerary
+from .cache import TTLCache
+from .itinerary_cache import store_itinerary
+from .itinerary_store import save_itinerary, latest_preferences
+from .prefetch import take_prefetched_research
+from .session_cache import session_cache
+from .metrics import span, PLANNING_JOBS
+from .admission import planning_jobs
+from .logger import get_logger, dump_session_logs
+
+logger = get_logger(__name__)
+
+# Maximum number of crews running at the same time
+MAX_WORKERS = int(os.getenv("PLANNING_WORKERS", "2"))
+# A running job whose owner has not sent a heartbeat for this long is taken over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+# Identifies this process as the owner of the jobs it runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+ACTIVE_STATES = ("queued", "running")
+TERMINAL_EVENTS = ("completed", "failed")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = Lock()
+_heartbeat: Optional[Thread] = None
+_heartbeat_stop = Event()
+
+# Admission slot owner of every queued or running job, released when the job ends
+_job_owners: dict[str, str] = {}
+_job_owners_lock = Lock()
+
+
+class JobEventLog:
+    """Append-only progress events of one job, written by a worker and read by any number of streams."""
+
+    def __init__(self):
+        self._events: list[tuple[str, dict]] = []
+        self._lock = Lock()
+
+    def publish(self, event: str, payload: dict):
+        with self._lock:
+            self._events.append((event, payload))
+
+    def since(self, cursor: int) -> list[tuple[str, dict]]:
+        """Returns the events published after the first `cursor` ones."""
+        with self._lock:
+            return self._events[cursor:]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+
+# Event logs are kept in memory for an hour so late subscribers can replay them
+_event_logs = TTLCache(maxsize=1024, ttl_seconds=3600)
+_event_logs_lock = Lock()
+
+
+def get_event_log(job_id: str) -> JobEventLog:
+    """Returns the event log of a job, creating an empty one if needed."""
+    with _event_logs_lock:
+        log = _event_logs.get(job_id)
+        if log is None:
+            log = JobEventLog()
+            _event_logs.set(job_id, log)
+        return log
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared planning worker pool, creating it on first use."""
+    global _executor, _heartbeat
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="planner")
+            _heartbeat_stop.clear()
+            _heartbeat = Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+            _heartbeat.start()
+        return _executor
+
+
+def claim_job(db: Session, job_id: str) -> bool:
+    """
+    Atomically moves a queued job to running, owned by this process. Commits.
+
+    Returns:
+        bool: False if another worker claimed it first (or it is no longer queued)
+    """
+    now = datetime.utcnow()
+    result = db.execute(
+        update(PlanningJob)
+        .where(PlanningJob.job_id == job_id, PlanningJob.status == "queued")
+        .values(status="running", owner=WORKER_ID, heartbeat_at=now, updated_at=now)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _finish_job(db: Session, job_id: str, **values) -> bool:
+    """Writes a job's final state if this process still owns it. Does not commit."""
+    result = db.execute(
+        update(PlanningJob)
+        .where(PlanningJob.job_id == job_id, PlanningJob.status == "running", PlanningJob.owner == WORKER_ID)
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+    return result.rowcount == 1
+
+
+def _heartbeat_loop():
+    """Keeps the leases of this process's running jobs fresh and takes over jobs of dead processes."""
+    while not _heartbeat_stop.wait(JOB_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(PlanningJob)
+                .where(PlanningJob.owner == WORKER_ID, PlanningJob.status == "running")
+                .values(heartbeat_at=datetime.utcnow())
+            )
+            db.commit()
+        except Exception as e:
+            logger.warning(f"Planning job heartbeat failed: {e}")
+        finally:
+            db.close()
+        try:
+            resume_pending_jobs(include_queued=False)
+        except Exception as e:
+            logger.warning(f"Recovering expired planning jobs failed: {e}")
+
+
+def get_job(db: Session, job_id: str) -> Optional[PlanningJob]:
+    """Loads a planning job by id."""
+    return db.query(PlanningJob).filter(PlanningJob.job_id == job_id).first()
+
+
+async def load_job(db: AsyncSession, job_id: str) -> Optional[PlanningJob]:
+    """Loads a planning job by id (async request path)."""
+    return await db.get(PlanningJob, job_id)
+
+
+async def load_active_job(db: AsyncSession, session_id: str) -> Optional[PlanningJob]:
+    """Returns the queued or running job for a session, if any (async request path)."""
+    result = await db.execute(
+        select(PlanningJob)
+        .where(PlanningJob.session_id == session_id, PlanningJob.status.in_(ACTIVE_STATES))
+        .order_by(PlanningJob.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+
+def new_planning_job(db, session_id: str, preferences: dict, admission_key: Optional[str] = None) -> PlanningJob:
+    """
+    Adds a queued planning job to the caller's (sync or async) session without committing.
+
+    Call `submit_planning_job` once the transaction has committed. `admission_key` is
+    the planning slot key the job counts against (defaults to the session).
+    """
+    job = PlanningJob(
+        job_id=str(uuid.uuid4()),
+        session_id=session_id,
+        status="queued",
+        preferences=dict(preferences),
+        admission_key=admission_key or session_id,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    db.add(job)
+    return job
+
+
+def submit_planning_job(job_id: str, owner: Optional[str] = None):
+    """
+    Hands a committed job to the worker pool.
+
+    Args:
+        job_id: The committed job
+        owner: Key of the admission slot the caller took for this job (see core.admission)
+    """
+    if owner is not None:
+        with _job_owners_lock:
+            _job_owners[job_id] = owner
+    get_event_log(job_id).publish("queued", {"job_id": job_id})
+    get_executor().submit(_run_job, job_id)
+    logger.info(f"Planning job {job_id} queued")
+
+
+def _run_job(job_id: str):
+    """Worker entry point: runs the crew for one job and stores the outcome."""
+    # Imported here so the worker module does not pull in CrewAI at import time
+    from .crew import run_travel_planning
+    from .replanning import run_incremental_planning
+    from .models import Itinerary
+
+    events = get_event_log(job_id)
+    db = SessionLocal()
+    try:
+        job = get_job(db, job_id)
+        if job is None or job.status not in ACTIVE_STATES:
+            return
+
+        preferences = job.preferences or {}
+        session_id = job.session_id
+        chat_session = db.query(ChatSession).filter(ChatSession.session_id == session_id).first()
+        user_id = chat_session.user_id if chat_session is not None else None
+        # A session that already has a plan is edited in place when only budget or duration changed
+        previous_itinerary = chat_session.itinerary if chat_session is not None else None
+        previous_preferences = latest_preferences(db, session_id) if previous_itinerary else None
+
+        # Commits, so no transaction stays open while the crew runs
+        if not claim_job(db, job_id):
+            logger.debug(f"Planning job {job_id} was claimed by another worker")
+            return
+        events.publish("running", {"job_id": job_id})
+
+        try:
+            with logger.contextualize(session_id=session_id, job_id=job_id), span("planning_job"):
+                result = None
+                if previous_preferences is not None:
+                    result = run_incremental_planning(
+                        previous_itinerary, previous_preferences, preferences, on_event=events.publish
+                    )
+                if result is None:
+                    # Research started speculatively while the chat was still collecting preferences
+                    research = take_prefetched_research(session_id, preferences.get("destination"))
+                    if research is not None:
+                        events.publish("research_done", {"cached": True, "prefetched": True, **research.model_dump()})
+                    result = run_travel_planning(
+                        destination=preferences.get("destination"),
+                        duration=preferences.get("duration"),
+                        interests=preferences.get("interests"),
+                        budget=preferences.get("budget"),
+                        on_event=events.publish,
+                        research=research
+                    )
+            if not isinstance(result.pydantic, Itinerary):
+                raise ValueError(f"Unexpected crew output type: {type(result.pydantic)}")
+        except Exception as e:
+            logger.error(f"Planning job {job_id} failed", error=str(e))
+            dump_session_logs(session_id, f"Planning job {job_id} failed")
+            if _finish_job(db, job_id, status="failed", error=str(e)):
+                db.commit()
+                PLANNING_JOBS.inc(status="failed")
+                events.publish("failed", {"job_id": job_id, "error": str(e)})
+            return
+
+        itinerary_dict = result.pydantic.model_dump()
+        store_itinerary(preferences, itinerary_dict)
+        if not _finish_job(db, job_id, status="completed", result=itinerary_dict):
+            # The lease expired and another worker took the job over; its result wins
+            logger.warning(f"Planning job {job_id} lost its lease; result discarded")
+            db.rollback()
+            return
+
+        session_version = store_session_itinerary(db, session_id, itinerary_dict) if chat_session else None
+        save_itinerary(db, itinerary_dict, session_id, user_id, preferences, job_id=job_id)
+
+        with span("db_commit", session_id=session_id):
+            db.commit()
+        PLANNING_JOBS.inc(status="completed")
+        session_cache.set_itinerary(session_id, itinerary_dict, session_version)
+        events.publish("completed", {"job_id": job_id, "itinerary": itinerary_dict})
+        logger.info(f"Planning job {job_id} completed")
+    finally:
+        db.close()
+        with _job_owners_lock:
+            owner = _job_owners.pop(job_id, None)
+        if owner is not None:
+            planning_jobs.release(owner)
+
+
+def warm_up_workers() -> float:
+    """
+    Imports CrewAI and builds the crew templates (see core.crew.warm_up) before the
+    first job arrives.
+
+    Returns:
+        float: Seconds spent
+    """
+    from .crew import warm_up
+    return warm_up()
+
+
+def resume_pending_jobs(include_queued: bool = True) -> int:
+    """
+    Submits queued jobs and takes over running jobs whose lease expired (their
+    worker died). Jobs other live workers are running are left alone; queued jobs
+    another worker also submits run once, on whichever claims them first.
+
+    Args:
+        include_queued: Also submit jobs that are merely queued (at startup)
+
+    Returns:
+        int: Number of resumed jobs
+    """
+    expired = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    stale = and_(
+        PlanningJob.status == "running",
+        or_(PlanningJob.heartbeat_at.is_(None), PlanningJob.heartbeat_at < expired)
+    )
+    db = SessionLocal()
+    try:
+        candidates = db.query(PlanningJob.job_id, PlanningJob.admission_key, PlanningJob.session_id, PlanningJob.status).filter(
+            or_(PlanningJob.status == "queued", stale) if include_queued else stale
+        ).all()
+        jobs = []
+        for job_id, admission_key, session_id, status in candidates:
+            if status == "running":
+                # Conditional, so two processes cannot both take the same job over
+                requeued = db.execute(
+                    update(PlanningJob).where(PlanningJob.job_id == job_id, stale)
+                    .values(status="queued", owner=None, updated_at=datetime.utcnow())
+                ).rowcount
+                if not requeued:
+                    continue
+            # Jobs created before admission keys were stored count against their session
+            jobs.append((job_id, admission_key or session_id))
+        db.commit()
+    finally:
+        db.close()
+
+    for job_id, admission_key in jobs:
+        with _job_owners_lock:
+            holds_slot = job_id in _job_owners
+            _job_owners[job_id] = admission_key
+        if not holds_slot:
+            # Already accepted before the restart: counted towards the owner's cap, never rejected
+            planning_jobs.try_acquire(admission_key, force=True)
+        get_executor().submit(_run_job, job_id)
+    job_ids = [job_id for job_id, _ in jobs]
+
+    if job_ids:
+        logger.info(f"Resumed {len(job_ids)} pending planning jobs")
+    return len(job_ids)
+
+
+def start_workers() -> int:
+    """
+    Starts the worker pool and its heartbeat at application startup, then resumes
+    pending jobs. Jobs a dead process still holds are taken over by the heartbeat
+    loop once their lease expires, whether or not new jobs arrive meanwhile.
+
+    Returns:
+        int: Number of jobs resumed right away
+    """
+    get_executor()
+    return resume_pending_jobs()
+
+
+def shutdown_workers():
+    """Stops accepting jobs; unfinished jobs stay queued in the database."""
+    global _executor
+    _heartbeat_stop.set()
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -1,36 +1,185 @@
 """
 Structured logging configuration for Travel Companion.
+
+Sinks are enqueued: the request thread hands each record to a background
+writer instead of blocking on stdout or the log file. Messages should use
+loguru's deferred formatting (`logger.debug("x={}", x)`, or `opt(lazy=True)`
+for expensive values) so nothing is rendered for records no sink accepts.
+
+Two profiles (LOG_PROFILE):
+- development: colored text on stdout, DEBUG file log, verbose crews
+- production: JSON lines on stdout, no file, sampled high-volume records,
+  crew verbosity off
+
+Independently of the sink levels, the last records of every session (from
+LOG_RING_LEVEL: DEBUG in development, the console level otherwise) are kept in
+memory and written out only when one of its requests fails (see
+`dump_session_logs`).
 """
-from loguru import logger
+import json
+import os
+import random
 import sys
+import traceback
+from collections import OrderedDict, deque
 from pathlib import Path
+from threading import Lock
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+LOG_PROFILE = os.getenv("LOG_PROFILE", "development").lower()
+PRODUCTION = LOG_PROFILE == "production"
+
+# Console sink level and format ("text" or "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if PRODUCTION else "text").lower()
+# Rotating file sink; an empty path disables it
+LOG_FILE = os.getenv("LOG_FILE", "" if PRODUCTION else "logs/travel_companion.log")
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG").upper()
+# Share of high-volume records kept per level, e.g. "DEBUG=0.01,INFO=0.1" (WARNING and above are never sampled)
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "DEBUG=0.01,INFO=0.1" if PRODUCTION else "")
+# Records kept per session for failure dumps, and sessions tracked; 0 disables the buffer
+LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", "100"))
+LOG_RING_SESSIONS = int(os.getenv("LOG_RING_SESSIONS", "1000"))
+# Lowest level buffered; DEBUG renders every debug message for the buffer, so it is only the development default
+LOG_RING_LEVEL = os.getenv("LOG_RING_LEVEL", "DEBUG" if LOG_PROFILE == "development" else LOG_LEVEL).upper()
+# CrewAI step-by-step console output of agents and crews
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "false" if PRODUCTION else "true").lower() == "true"
+
+TEXT_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+# Extra fields used by the pipeline itself, not written to JSON output
+_INTERNAL_EXTRA = ("module", "sampled", "ring_dump", "_json")
+
+
+def _parse_sample_rates(spec: str) -> dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        level, _, rate = item.partition("=")
+        try:
+            rates[level.strip().upper()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            print(f"Ignoring malformed LOG_SAMPLE_RATES entry: {item}", file=sys.stderr)
+    return rates
+
+
+_sample_rates = _parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def _sampling_filter(record) -> bool:
+    """Drops a share of records logged through a `sampled` logger, per level."""
+    if not record["extra"].get("sampled") or record["level"].no >= 30:
+        return True
+    rate = _sample_rates.get(record["level"].name, 1.0)
+    return rate >= 1.0 or random.random() < rate
+
+
+def _json_format(record) -> str:
+    """One JSON object per line: time, level, location, message and bound fields."""
+    payload = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"]
+    }
+    payload.update((key, value) for key, value in record["extra"].items() if key not in _INTERNAL_EXTRA)
+    if record["exception"] is not None:
+        payload["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = json.dumps(payload, default=str)
+    return "{extra[_json]}\n"
 
-# Remove default handler
-logger.remove()
-
-# Add console handler with custom format
-logger.add(
-    sys.stdout,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO",
-    colorize=True
-)
-
-# Add file handler for production logs
-log_file = Path("logs/travel_companion.log")
-log_file.parent.mkdir(exist_ok=True)
-
-logger.add(
-    log_file,
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="DEBUG",
-    rotation="10 MB",
-    retention="1 week"
-)
+
+class SessionLogBuffer:
+    """Last records of each session, in memory; written out only when a request of the session fails."""
+
+    def __init__(self, size: int, max_sessions: int):
+        self.size = size
+        self.max_sessions = max_sessions
+        self._buffers: OrderedDict[str, deque] = OrderedDict()
+        self._lock = Lock()
+
+    def accepts(self, record) -> bool:
+        return bool(record["extra"].get("session_id")) and not record["extra"].get("ring_dump")
+
+    def write(self, message):
+        session_id = str(message.record["extra"]["session_id"])
+        with self._lock:
+            buffer = self._buffers.get(session_id)
+            if buffer is None:
+                buffer = self._buffers[session_id] = deque(maxlen=self.size)
+                if len(self._buffers) > self.max_sessions:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(session_id)
+            buffer.append(str(message).rstrip("\n"))
+
+    def pop(self, session_id: str) -> list[str]:
+        with self._lock:
+            return list(self._buffers.pop(session_id, ()))
+
+
+session_logs = SessionLogBuffer(LOG_RING_SIZE, LOG_RING_SESSIONS)
+
+
+def configure_logging():
+    """(Re)installs the sinks of the current profile."""
+    logger.remove()
+
+    if LOG_FORMAT == "json":
+        logger.add(sys.stdout, format=_json_format, level=LOG_LEVEL, filter=_sampling_filter, enqueue=True)
+    else:
+        logger.add(sys.stdout, format=TEXT_FORMAT, level=LOG_LEVEL, colorize=True, filter=_sampling_filter, enqueue=True)
+
+    if LOG_FILE:
+        log_file = Path(LOG_FILE)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        logger.add(
+            log_file,
+            format=_json_format if LOG_FORMAT == "json" else FILE_FORMAT,
+            level=LOG_FILE_LEVEL,
+            filter=_sampling_filter,
+            rotation="10 MB",
+            retention="1 week",
+            enqueue=True
+        )
+
+    if LOG_RING_SIZE > 0:
+        # Formatted by the background writer like the other sinks; a dump drains the queue first
+        logger.add(
+            session_logs.write, format=FILE_FORMAT, level=LOG_RING_LEVEL, filter=session_logs.accepts, enqueue=True
+        )
+
+
+configure_logging()
 
 # Create logger instance for import
 travel_logger = logger
 
-def get_logger(name: str):
-    """Get logger instance for specific module."""
-    return logger.bind(module=name)
\ No newline at end of file
+def get_logger(name: str, sampled: bool = False):
+    """
+    Get logger instance for specific module.
+
+    Args:
+        name: Module name
+        sampled: Mark records as high-volume, subject to LOG_SAMPLE_RATES
+    """
+    if sampled:
+        return logger.bind(module=name, sampled=True)
+    return logger.bind(module=name)
+
+
+def dump_session_logs(session_id: str, reason: str):
+    """Writes the buffered records of a session as one ERROR record and forgets them."""
+    # Waits until the enqueued records logged before the failure have reached the buffer
+    logger.complete()
+    lines = session_logs.pop(session_id)
+    if not lines:
+        return
+    logger.bind(ring_dump=True, session_id=session_id).opt(depth=1).error(
+        "{} - last {} log records of session {}:\n{}", reason, len(lines), session_id, "\n".join(lines)
+    )
@@ -0,0 +1,273 @@
+"""
+In-process metrics: counters, latency histograms and per-stage timing spans.
+
+Everything is exposed in Prometheus text format on GET /metrics. Spans also
+collect into a per-request breakdown (see `collect_timings`) that the chat
+endpoints return when called with `?debug=true`.
+"""
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Iterator, Optional
+from .logger import get_logger
+
+logger = get_logger(__name__)
+# One record per span: sampled in production (see LOG_SAMPLE_RATES)
+span_logger = get_logger(__name__, sampled=True)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; stages range from sub-millisecond cache reads to multi-minute crews
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Upper bounds for prompt sizes in tokens
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        super().__init__(name, description, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        result = []
+        with self._lock:
+            for key, entry in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, entry):
+                    result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count))
+                result.append((f"{self.name}_sum", labels, entry[-2]))
+                result.append((f"{self.name}_count", labels, entry[-1]))
+        return result
+
+
+class Registry:
+    """All metrics of the process plus stats dictionaries exported as gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._stats_sources: dict[str, Callable[[], dict]] = {}
+        self._lock = Lock()
+
+    def counter(self, name: str, description: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, description, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, source: str, collect: Callable[[], dict]):
+        """Exports the numeric values of `collect()` as `travel_component_stat{source=..., stat=...}`."""
+        with self._lock:
+            self._stats_sources[source] = collect
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            sources = dict(self._stats_sources)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        lines.append("# HELP travel_component_stat Internal counters and sizes reported by caches and components")
+        lines.append("# TYPE travel_component_stat gauge")
+        for source, collect in sources.items():
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning(f"Metrics source {source} failed: {e}")
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"travel_component_stat{_format_labels({'source': source, 'stat': stat})} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "travel_stage_duration_seconds", "Time spent in each request or planning stage", ("stage",)
+)
+CHAT_TURN_SECONDS = REGISTRY.histogram(
+    "travel_chat_turn_duration_seconds", "End-to-end chat turn latency by resulting state", ("state",)
+)
+LLM_CALLS = REGISTRY.counter("travel_llm_calls_total", "LLM requests made", ("component",))
+LLM_TOKENS = REGISTRY.counter("travel_llm_tokens_total", "LLM tokens used", ("component", "kind"))
+SEARCH_REQUESTS = REGISTRY.counter(
+    "travel_search_requests_total", "Search tool requests by outcome (hit, miss, coalesced, error)", ("result",)
+)
+CACHE_REQUESTS = REGISTRY.counter("travel_cache_requests_total", "Cache lookups by outcome", ("cache", "result"))
+CREW_RUNS = REGISTRY.counter("travel_crew_runs_total", "Crew kickoffs by kind and outcome", ("kind", "outcome"))
+PLANNING_JOBS = REGISTRY.counter("travel_planning_jobs_total", "Finished planning jobs by status", ("status",))
+REPLANS = REGISTRY.counter(
+    "travel_replans_total", "Planning jobs answered from the session's previous itinerary (incremental, unchanged)", ("mode",)
+)
+PREFETCHES = REGISTRY.counter(
+    "travel_research_prefetches_total",
+    "Speculative research prefetches by outcome (started, hit, cached, discarded, cancelled, failed)", ("outcome",)
+)
+PREFETCH_WASTED_SECONDS = REGISTRY.counter(
+    "travel_research_prefetch_wasted_seconds_total", "Research time spent on prefetches nobody used"
+)
+VALIDATION_VIOLATIONS = REGISTRY.counter(
+    "travel_itinerary_violations_total", "Rule violations found by the local itinerary validator", ("rule",)
+)
+ITINERARY_REPAIRS = REGISTRY.counter(
+    "travel_itinerary_repairs_total", "Validated itineraries by outcome (valid, fixed_locally, repaired, unresolved)", ("outcome",)
+)
+ROUTE_OPTIMIZATIONS = REGISTRY.counter(
+    "travel_route_optimizations_total", "Itinerary days by route optimizer outcome (reordered, unchanged, unlocated)", ("outcome",)
+)
+SESSION_WRITES = REGISTRY.counter(
+    "travel_session_writes_total", "Versioned chat session writes by writer and outcome (written, merged, exhausted)",
+    ("writer", "outcome")
+)
+SESSION_WRITE_CONFLICTS = REGISTRY.counter(
+    "travel_session_write_conflicts_total", "Chat session writes that lost a version check and were merged", ("writer",)
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "travel_db_query_duration_seconds", "Database statement latency by operation", ("operation",)
+)
+DB_COMMITS = REGISTRY.counter("travel_db_commits_total", "Database transactions committed")
+PROMPT_TOKENS = REGISTRY.histogram(
+    "travel_prompt_tokens", "Estimated prompt tokens per crew task", ("task",), buckets=TOKEN_BUCKETS
+)
+CONTEXT_FACTS = REGISTRY.counter(
+    "travel_planner_context_facts_total", "Research facts offered to planners (kept, trimmed, duplicate, over_budget)", ("outcome",)
+)
+
+_request_timings: ContextVar[Optional[list]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str, session_id: Optional[str] = None) -> Iterator[None]:
+    """
+    Times one stage: records it in the stage histogram, the current request's
+    breakdown (if one is being collected) and the debug log.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+        # Without an explicit id the contextualized session id (if any) is kept
+        fields = {"session_id": session_id} if session_id else {}
+        span_logger.debug("Stage {stage} took {ms:.1f} ms", stage=stage, ms=elapsed * 1000, **fields)
+
+
+@contextmanager
+def collect_timings() -> Iterator[list]:
+    """Collects the spans of the current request into the yielded list of (stage, seconds)."""
+    timings: list = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def summarize_timings(timings: list) -> dict:
+    """Milliseconds per stage; repeated stages are summed."""
+    summary: dict[str, float] = {}
+    for stage, seconds in timings:
+        summary[stage] = summary.get(stage, 0.0) + seconds * 1000
+    return {stage: round(ms, 2) for stage, ms in summary.items()}
+
+
+def record_token_usage(component: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """Adds one response's token counts to the token counter (missing counts are skipped)."""
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, component=component, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, component=component, kind="completion")
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of the process-wide registry."""
+    return REGISTRY.render()
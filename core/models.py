@@ -32,9 +32,25 @@ class DayPlan(BaseModel):
     day_number: int = Field(description="Day sequence number (1, 2, 3...)")
     theme: str = Field(description="Theme of the day (e.g., 'Art & History')")
     activities: List[Activity] = Field(description="List of activities for this day")
+    walking_km: Optional[float] = Field(default=None, description="Leave empty; computed after planning")
 
 class Itinerary(BaseModel):
     """The complete travel itinerary."""
     trip_title: str = Field(description="Catchy title for the trip")
     summary: str = Field(description="Brief summary of the whole trip experience")
-    days: List[DayPlan] = Field(description="List of daily plans")
\ No newline at end of file
+    days: List[DayPlan] = Field(description="List of daily plans")
+
+class DaySkeleton(BaseModel):
+    """Outline of one day, produced before the detailed per-day planning."""
+    day_number: int = Field(description="Day sequence number (1, 2, 3...)")
+    theme: str = Field(description="Theme of the day (e.g., 'Art & History')")
+    area: str = Field(description="Neighborhood or area the day is centered on")
+    landmarks: List[str] = Field(description="Main landmarks or attractions reserved for this day")
+
+class TripSkeleton(BaseModel):
+    """Day-by-day outline of the whole trip."""
+    trip_title: str = Field(description="Catchy title for the trip")
+    summary: str = Field(description="Brief summary of the whole trip experience")
+    wow_experience: str = Field(description="The one signature 'wow' experience of the trip")
+    wow_day: int = Field(description="Day number on which the wow experience happens")
+    days: List[DaySkeleton] = Field(description="Outline of each day")
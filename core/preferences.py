@@ -0,0 +1,117 @@
+"""
+Canonical forms of travel preferences.
+
+Free-text answers ("one week", "cheap", "Food, art") are folded into stable
+values so equivalent requests share cache entries. Concurrent edits of one
+session are merged field by field (see `merge_preferences`).
+"""
+import re
+from typing import Optional
+from .research_cache import normalize_destination
+
+WORD_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "twenty": 20,
+    "thirty": 30, "couple": 2, "few": 3, "several": 4
+}
+
+DURATION_UNITS = {
+    "day": 1, "days": 1, "night": 1, "nights": 1,
+    "week": 7, "weeks": 7, "fortnight": 14, "fortnights": 14,
+    "weekend": 2, "weekends": 2
+}
+
+BUDGET_SYNONYMS = {
+    "low": "low", "cheap": "low", "budget": "low", "inexpensive": "low", "affordable": "low",
+    "backpacker": "low", "backpacking": "low", "shoestring": "low", "economy": "low", "tight": "low",
+    "medium": "medium", "mid": "medium", "moderate": "medium", "average": "medium",
+    "normal": "medium", "standard": "medium", "reasonable": "medium", "mid-range": "medium",
+    "midrange": "medium",
+    "high": "high", "luxury": "high", "luxurious": "high", "expensive": "high", "premium": "high",
+    "splurge": "high", "lavish": "high", "upscale": "high", "unlimited": "high", "deluxe": "high"
+}
+
+
+def normalize_duration(duration) -> Optional[int]:
+    """
+    Parses a duration answer into a number of days.
+
+    "3", "3 days", "one week", "a weekend" and "2 weeks" map to 3, 3, 7, 2 and 14.
+    Returns None when no duration can be read.
+    """
+    if duration is None:
+        return None
+    if isinstance(duration, int):
+        return duration if duration > 0 else None
+
+    tokens = re.findall(r"\d+|[a-z]+", str(duration).lower())
+    count = None
+    for index, token in enumerate(tokens):
+        if token.isdigit():
+            count = int(token)
+        elif token in WORD_NUMBERS and index + 1 < len(tokens) and (
+            tokens[index + 1] in DURATION_UNITS or tokens[index + 1] == "of"
+        ):
+            count = WORD_NUMBERS[token]
+        elif token in DURATION_UNITS:
+            days = (count or 1) * DURATION_UNITS[token]
+            return days if days > 0 else None
+
+    return count if count and count > 0 else None
+
+
+def normalize_budget(budget) -> Optional[str]:
+    """Folds budget synonyms into 'low', 'medium' or 'high'."""
+    if not budget:
+        return None
+    text = str(budget).strip().lower()
+    if text in BUDGET_SYNONYMS:
+        return BUDGET_SYNONYMS[text]
+    for token in re.findall(r"[a-z-]+", text):
+        if token in BUDGET_SYNONYMS:
+            return BUDGET_SYNONYMS[token]
+    return text
+
+
+def normalize_interests(interests) -> tuple[str, ...]:
+    """Splits interests into a sorted, de-duplicated tuple ("Food & Art" -> ("art", "food"))."""
+    if not interests:
+        return ()
+    parts = re.split(r",|/|&|\+|;|\band\b", str(interests).lower())
+    return tuple(sorted({re.sub(r"\s+", " ", part).strip() for part in parts if part.strip()}))
+
+
+def preference_key(preferences: dict) -> tuple:
+    """
+    Canonical, hashable form of (destination, duration, interests, budget).
+
+    Args:
+        preferences: Session preference dict as stored in `ChatSession.data`
+    """
+    return (
+        normalize_destination(preferences.get("destination") or ""),
+        normalize_duration(preferences.get("duration")),
+        normalize_interests(preferences.get("interests")),
+        normalize_budget(preferences.get("budget"))
+    )
+
+
+def merge_preferences(base: dict, ours: dict, theirs: dict) -> dict:
+    """
+    Three-way merge of two concurrent edits of one session's preferences.
+
+    Fields `ours` changed since `base` (the version both edits started from) win;
+    all others take the stored `theirs` value, so answers given on another worker
+    are kept. A field both sides changed keeps ours, the later write.
+
+    Args:
+        base: Preferences as last read from the database
+        ours: Preferences this writer wants to store
+        theirs: Preferences currently stored
+    """
+    merged = dict(theirs)
+    for key, value in ours.items():
+        if value != base.get(key):
+            merged[key] = value
+    return merged
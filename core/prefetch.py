@@ -0,0 +1,237 @@
+"""
+Speculative destination research.
+
+Research only needs the destination, which is usually known several chat turns
+before duration, interests and budget. As soon as a session names a valid
+destination, the research agent starts on a small background pool at the
+lowest LLM priority; when planning starts, the job picks the result up and only
+the planner runs. A job waits for a prefetch that is already running (raising
+its priority to the job's own) but researches itself instead of waiting for one
+that has not started.
+
+Sessions asking for the same destination share one prefetch. A prefetch whose
+sessions all moved on to another destination is cancelled if it has not
+started yet, or its result is discarded (not cached) when it finishes.
+"""
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Optional
+from .cache import TTLCache
+from .research_cache import normalize_destination, get_cached_research, store_research
+from .admission import Priority, current_priority, priority_scope, PRIORITY_PREFETCH
+from .metrics import span, PREFETCHES, PREFETCH_WASTED_SECONDS
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Set to false to research only when planning starts
+RESEARCH_PREFETCH_ENABLED = os.getenv("RESEARCH_PREFETCH_ENABLED", "true").lower() == "true"
+# Research crews run speculatively at the same time
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+# How long a planning job waits for a running prefetch before researching itself
+PREFETCH_WAIT_SECONDS = float(os.getenv("PREFETCH_WAIT_SECONDS", "120"))
+# Sessions tracked, and how long a session's prefetch is kept for it
+PREFETCH_SESSIONS = int(os.getenv("PREFETCH_SESSIONS", "1024"))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "3600"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = Lock()
+
+
+class Prefetch:
+    """One speculative research run, shared by every session waiting on its destination."""
+
+    def __init__(self, destination: str, key: str):
+        self.destination = destination
+        self.key = key
+        self.sessions: set[str] = set()
+        self.future: Optional[Future] = None
+        self.discarded = False
+        self.used = False
+        self.seconds = 0.0
+        # Raised once a planning job waits for the result
+        self.priority = Priority(PRIORITY_PREFETCH)
+
+
+# Running or finished prefetch of each session, and running ones by destination key
+_by_session = TTLCache(maxsize=PREFETCH_SESSIONS, ttl_seconds=PREFETCH_TTL_SECONDS)
+_running: dict[str, Prefetch] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+
+def _run(prefetch: Prefetch):
+    """Worker: serves the research from the cache, or runs the research crew and caches it unless discarded."""
+    # Imported here so the chat path does not pull in CrewAI
+    from .crew import create_research_crew, kickoff_crew
+    from .models import ResearchOutput
+
+    try:
+        research = get_cached_research(prefetch.destination)
+        if research is not None:
+            PREFETCHES.inc(outcome="cached")
+            return research
+
+        started = time.perf_counter()
+        with priority_scope(prefetch.priority), span("research_prefetch"):
+            result = kickoff_crew(create_research_crew(prefetch.destination), {'destination': prefetch.destination},
+                                  kind="research")
+        prefetch.seconds = time.perf_counter() - started
+        research = result.pydantic
+        if not isinstance(research, ResearchOutput):
+            raise ValueError(f"Unexpected research output type: {type(research)}")
+
+        with _lock:
+            discarded = prefetch.discarded
+        if discarded:
+            PREFETCHES.inc(outcome="discarded")
+            PREFETCH_WASTED_SECONDS.inc(prefetch.seconds)
+            logger.info("Discarded prefetched research for {} after {:.1f}s", prefetch.destination, prefetch.seconds)
+            return None
+
+        store_research(prefetch.destination, research)
+        logger.info("Prefetched research for {} in {:.1f}s", prefetch.destination, prefetch.seconds)
+        return research
+    except Exception as e:
+        PREFETCHES.inc(outcome="failed")
+        logger.warning(f"Research prefetch for {prefetch.destination} failed: {e}")
+        raise
+    finally:
+        with _lock:
+            if _running.get(prefetch.key) is prefetch:
+                del _running[prefetch.key]
+
+
+def _release(session_id: str, prefetch: Prefetch):
+    """Detaches a session from its prefetch; the last session to leave an unused one discards it."""
+    with _lock:
+        prefetch.sessions.discard(session_id)
+        if prefetch.sessions or prefetch.used or prefetch.discarded:
+            return
+        prefetch.discarded = True
+        if _running.get(prefetch.key) is prefetch:
+            del _running[prefetch.key]
+        finished = prefetch.future.done()
+
+    if prefetch.future.cancel():
+        PREFETCHES.inc(outcome="cancelled")
+        logger.debug("Cancelled research prefetch for {} before it started", prefetch.destination)
+    elif finished and prefetch.seconds:
+        # Finished and cached, but the session moved on before planning
+        PREFETCHES.inc(outcome="discarded")
+        PREFETCH_WASTED_SECONDS.inc(prefetch.seconds)
+
+
+def prefetch_research(session_id: str, destination: str):
+    """
+    Starts researching a session's destination in the background, if not already underway.
+
+    A different destination than the session's previous one releases the old prefetch.
+    Never blocks: the research cache is checked on the prefetch worker.
+    """
+    if not RESEARCH_PREFETCH_ENABLED or not destination:
+        return
+    key = normalize_destination(destination)
+
+    previous = _by_session.get(session_id)
+    if previous is not None:
+        if previous.key == key:
+            return
+        _release(session_id, previous)
+
+    executor = _get_executor()
+    with _lock:
+        prefetch = _running.get(key)
+        if prefetch is None:
+            prefetch = _running[key] = Prefetch(destination, key)
+            prefetch.future = executor.submit(_run, prefetch)
+            PREFETCHES.inc(outcome="started")
+            logger.debug("Prefetching research for {} (session {})", destination, session_id)
+        prefetch.sessions.add(session_id)
+    _by_session.set(session_id, prefetch)
+
+
+def cancel_prefetch(session_id: str):
+    """Releases the session's prefetch, e.g. after its destination was rejected."""
+    prefetch = _by_session.get(session_id)
+    if prefetch is not None:
+        _by_session.pop(session_id)
+        _release(session_id, prefetch)
+
+
+def take_prefetched_research(session_id: str, destination: str):
+    """
+    Hands the session's prefetched research to its planning job.
+
+    Waits up to PREFETCH_WAIT_SECONDS for a prefetch that is still running, at the
+    caller's LLM priority; one still queued on the prefetch pool is not waited for.
+
+    Returns:
+        ResearchOutput, or None when there was no usable prefetch (plan as usual)
+    """
+    prefetch = _by_session.get(session_id)
+    if prefetch is None:
+        return None
+    _by_session.pop(session_id)
+    if prefetch.key != normalize_destination(destination or ""):
+        _release(session_id, prefetch)
+        return None
+    if not prefetch.future.running() and not prefetch.future.done():
+        # Still queued behind other prefetches: researching now beats waiting for a free worker
+        logger.debug("Research prefetch for {} has not started; researching in the job", destination)
+        _release(session_id, prefetch)
+        return None
+
+    with _lock:
+        first_use, prefetch.used = not prefetch.used, True
+    prefetch.priority.raise_to(current_priority())
+    try:
+        with span("prefetch_wait"):
+            research = prefetch.future.result(timeout=PREFETCH_WAIT_SECONDS)
+    except FutureTimeoutError:
+        logger.warning(f"Research prefetch for {destination} still running after {PREFETCH_WAIT_SECONDS}s")
+        return None
+    except Exception:
+        return None
+    finally:
+        with _lock:
+            prefetch.sessions.discard(session_id)
+
+    if research is not None and first_use:
+        # Counted once per prefetch, like "started", however many sessions share it
+        PREFETCHES.inc(outcome="hit")
+    return research
+
+
+def shutdown_prefetch():
+    """Drops prefetches that have not started; running ones finish in the background."""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def prefetch_stats() -> dict:
+    """Prefetch outcomes so far, hit rate and research seconds wasted on unused prefetches."""
+    outcomes = {
+        outcome: int(PREFETCHES.value(outcome=outcome))
+        for outcome in ("started", "hit", "cached", "discarded", "cancelled", "failed")
+    }
+    with _lock:
+        running = len(_running)
+    return {
+        **outcomes,
+        "running": running,
+        "sessions": len(_by_session),
+        "hit_rate": round(outcomes["hit"] / outcomes["started"], 3) if outcomes["started"] else 0.0,
+        "wasted_seconds": round(PREFETCH_WASTED_SECONDS.value(), 2)
+    }
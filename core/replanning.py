@@ -0,0 +1,212 @@
+"""
+Incremental re-planning of a finished itinerary.
+
+When a user edits one preference of a completed plan ("make it cheaper", "add a
+day"), the old and new preferences are diffed and only the affected part is
+regenerated from the stored research:
+- budget: days with paid activities are re-costed by one small task per day,
+  which swaps items that no longer fit; free days are kept
+- duration: surplus days are dropped, or the new days are outlined by one task
+  and planned with the regular per-day tasks
+- nothing relevant: the stored itinerary is returned without any LLM call
+
+Days that are not affected are kept exactly as they were. Destination or
+interest changes still go through a full `run_travel_planning`.
+"""
+import re
+from typing import Callable, Optional
+from crewai import Crew, Process
+from .agents import create_planner_agent
+from .tasks import create_day_revision_task, create_extension_task
+from .models import ResearchOutput, Itinerary, TripSkeleton, DaySkeleton, DayPlan
+from .preferences import preference_key, normalize_duration, normalize_budget
+from .research_cache import is_invalid_destination
+from .validator import parse_cost
+from .crew import (
+    PlanningResult, NON_LANDMARK_WORDS, kickoff_crew, resolve_research, plan_day, run_day_tasks,
+    enforce_cross_day_constraints, validate_and_repair, _landmark_key
+)
+from .metrics import span, REPLANS
+from .logger import get_logger, CREW_VERBOSE
+
+logger = get_logger(__name__)
+
+PREFERENCE_FIELDS = ("destination", "duration", "interests", "budget")
+# Preferences whose change can be applied to an existing itinerary
+INCREMENTAL_FIELDS = {"duration", "budget"}
+
+BUDGET_RANKS = {"low": 0, "medium": 1, "high": 2}
+
+
+def diff_preferences(previous: dict, current: dict) -> set[str]:
+    """Names of the preferences whose canonical value differs ("cheap" and "low" are equal)."""
+    return {
+        field for field, old, new in zip(PREFERENCE_FIELDS, preference_key(previous), preference_key(current))
+        if old != new
+    }
+
+
+def is_free(cost_estimate: str) -> bool:
+    """True for costs like "Free", "€0" or "Included"; unreadable costs ("Varies") count as paid."""
+    cost = parse_cost(cost_estimate)
+    return cost is not None and cost.is_free
+
+
+def days_to_recost(days: list[DayPlan], previous_budget: Optional[str], budget: Optional[str]) -> list[DayPlan]:
+    """
+    Days affected by a budget change: all of them when the budget goes up (or either
+    level is not a known one), only days with paid activities when it goes down.
+    """
+    old_rank, new_rank = BUDGET_RANKS.get(previous_budget), BUDGET_RANKS.get(budget)
+    if old_rank is None or new_rank is None or new_rank > old_rank:
+        return list(days)
+    return [day for day in days if not all(is_free(activity.cost_estimate) for activity in day.activities)]
+
+
+def _retitle(text: str, previous_days: int, days: int) -> str:
+    """Replaces the day count in "3-day trip" / "3 days in Rome" style titles."""
+    return re.sub(rf"\b{previous_days}(?=[\s-]*days?\b)", str(days), text, flags=re.IGNORECASE)
+
+
+def _day_outline(plan: DayPlan) -> DaySkeleton:
+    """Outline of an already planned day, so new days can be told which landmarks are taken."""
+    landmarks = [
+        activity.name for activity in plan.activities
+        if not any(word in _landmark_key(activity.name) for word in NON_LANDMARK_WORDS)
+    ]
+    return DaySkeleton(day_number=plan.day_number, theme=plan.theme, area="", landmarks=landmarks)
+
+
+def recost_day(inputs: dict, plan: DayPlan, research: ResearchOutput, previous_budget: str) -> DayPlan:
+    """Runs one revision task that adapts a planned day to the new budget."""
+    with span("crew_setup"):
+        planner = create_planner_agent()
+        task = create_day_revision_task(planner, plan, research, previous_budget, interests=inputs.get("interests"))
+        crew = Crew(agents=[planner], tasks=[task], verbose=CREW_VERBOSE, process=Process.sequential)
+
+    revised = kickoff_crew(crew, inputs, kind="day_revision").pydantic
+    if not isinstance(revised, DayPlan):
+        raise ValueError(f"Unexpected output type for revised day {plan.day_number}: {type(revised)}")
+    revised.day_number = plan.day_number
+    return revised
+
+
+def extend_itinerary(inputs: dict, itinerary: Itinerary, days: int, research: ResearchOutput) -> tuple[TripSkeleton, list[DayPlan]]:
+    """
+    Outlines the days after the existing ones and plans them with the regular day tasks.
+
+    Returns:
+        (skeleton of the whole trip, plans of the new days)
+    """
+    existing = len(itinerary.days)
+    with span("crew_setup"):
+        planner = create_planner_agent()
+        task = create_extension_task(planner, itinerary, research, interests=inputs.get("interests"))
+        crew = Crew(agents=[planner], tasks=[task], verbose=CREW_VERBOSE, process=Process.sequential)
+    outline = kickoff_crew(crew, inputs, kind="skeleton").pydantic
+    if not isinstance(outline, TripSkeleton):
+        raise ValueError(f"Unexpected extension outline type: {type(outline)}")
+
+    # The model may repeat the existing days or restart numbering; keep the last outlined days
+    new_days = [day for day in outline.days if day.day_number > existing] or outline.days
+    new_days = new_days[-(days - existing):]
+    for number, day in enumerate(new_days, start=existing + 1):
+        day.day_number = number
+    if len(new_days) < days - existing:
+        raise ValueError(f"Extension outline has {len(new_days)} of {days - existing} new days")
+
+    skeleton = TripSkeleton(
+        trip_title=outline.trip_title or itinerary.trip_title,
+        summary=outline.summary or itinerary.summary,
+        wow_experience=outline.wow_experience,
+        wow_day=outline.wow_day if 1 <= outline.wow_day <= existing else 1,
+        days=[_day_outline(plan) for plan in itinerary.days] + new_days
+    )
+    plans = run_day_tasks(plan_day, [(inputs, skeleton, day, research) for day in new_days])
+    return skeleton, plans
+
+
+def run_incremental_planning(previous_itinerary: dict, previous_preferences: dict, preferences: dict,
+                             on_event: Optional[Callable[[str, dict], None]] = None) -> Optional[PlanningResult]:
+    """
+    Applies a preference edit to an existing itinerary instead of planning from scratch.
+
+    Args:
+        previous_itinerary: Stored itinerary (Itinerary.model_dump() shape)
+        previous_preferences: Preferences it was planned for
+        preferences: Updated preferences
+        on_event: Optional progress callback (same events as run_travel_planning, plus `replanning`)
+
+    Returns:
+        PlanningResult with the updated Itinerary, or None when the edit needs a full re-plan
+    """
+    def emit(event: str, payload: dict):
+        if on_event is not None:
+            on_event(event, payload)
+
+    changed = diff_preferences(previous_preferences, preferences)
+    days = normalize_duration(preferences.get("duration"))
+    if not changed <= INCREMENTAL_FIELDS or not previous_itinerary.get("days") or days is None:
+        return None
+
+    itinerary = Itinerary.model_validate(previous_itinerary)
+    itinerary.days.sort(key=lambda plan: plan.day_number)
+    previous_days = len(itinerary.days)
+    destination = preferences.get("destination")
+    inputs = {
+        'destination': destination,
+        'duration': str(days),
+        'interests': preferences.get("interests"),
+        'budget': preferences.get("budget")
+    }
+    logger.info("Incremental re-planning for {}: {} changed", destination, sorted(changed) or "nothing")
+    emit("replanning", {"changed": sorted(changed), "previous_days": previous_days, "days": days})
+
+    if not changed:
+        REPLANS.inc(mode="unchanged")
+        return PlanningResult(pydantic=itinerary)
+
+    with span("incremental_planning"):
+        research = resolve_research(destination, emit)
+        if is_invalid_destination(research):
+            return None
+
+        added: list[DayPlan] = []
+        revised: list[DayPlan] = []
+        skeleton = None
+        if days < previous_days:
+            dropped = [plan.day_number for plan in itinerary.days[days:]]
+            itinerary.days = itinerary.days[:days]
+            itinerary.trip_title = _retitle(itinerary.trip_title, previous_days, days)
+            itinerary.summary = _retitle(itinerary.summary, previous_days, days)
+            logger.info("Dropped days {} of {}", dropped, destination)
+        elif days > previous_days:
+            skeleton, added = extend_itinerary(inputs, itinerary, days, research)
+            itinerary.trip_title, itinerary.summary = skeleton.trip_title, skeleton.summary
+
+        # New days are already planned for the new budget; only kept days are re-costed
+        if "budget" in changed:
+            previous_budget = normalize_budget(previous_preferences.get("budget"))
+            affected = days_to_recost(itinerary.days, previous_budget, normalize_budget(preferences.get("budget")))
+            revised = run_day_tasks(recost_day, [(inputs, plan, research, previous_budget) for plan in affected])
+
+        regenerated = sorted(added + revised, key=lambda plan: plan.day_number)
+        replaced = {plan.day_number for plan in regenerated}
+        itinerary.days = sorted(
+            [plan for plan in itinerary.days if plan.day_number not in replaced] + regenerated,
+            key=lambda plan: plan.day_number
+        )
+        for plan in regenerated:
+            emit("day_plan", plan.model_dump())
+
+    if skeleton is not None:
+        for problem in enforce_cross_day_constraints(itinerary, skeleton):
+            logger.warning(f"Cross-day check ({destination}): {problem}")
+    validate_and_repair(itinerary, inputs, research, emit)
+
+    REPLANS.inc(mode="incremental")
+    logger.info(
+        "Incremental re-planning completed for {}: {} of {} days regenerated",
+        destination, len(regenerated), len(itinerary.days)
+    )
+    return PlanningResult(pydantic=itinerary)
@@ -0,0 +1,173 @@
+"""
+Destination research cache.
+
+Verified research facts are stored in the `research_cache` table with an
+in-process LRU in front of it, so repeat destinations skip the research agent.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from . import gazetteer
+from .cache import TTLCache
+from .database import SessionLocal, ResearchCacheEntry
+from .models import Fact, ResearchOutput
+from .metrics import CACHE_REQUESTS
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long researched facts stay fresh
+RESEARCH_CACHE_TTL_HOURS = float(os.getenv("RESEARCH_CACHE_TTL_HOURS", "72"))
+# Number of destinations kept in process memory
+RESEARCH_CACHE_SIZE = int(os.getenv("RESEARCH_CACHE_SIZE", "256"))
+
+INVALID_DESTINATION_TITLE = "Invalid Destination"
+
+_memory_cache = TTLCache(maxsize=RESEARCH_CACHE_SIZE, ttl_seconds=RESEARCH_CACHE_TTL_HOURS * 3600)
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%B %d, %Y", "%d %B %Y", "%B %Y")
+
+
+def normalize_destination(destination: str) -> str:
+    """
+    Builds the cache key for a destination.
+
+    Known places use their canonical gazetteer name, so "Roma" and "rome" share
+    one key; unknown ones are lower-cased with whitespace collapsed.
+    """
+    place = gazetteer.lookup(destination or "")
+    if place is not None:
+        return place.name.lower()
+    return re.sub(r"\s+", " ", destination or "").strip().lower()
+
+
+def parse_verification_date(value: str, fetched_at: datetime) -> datetime:
+    """
+    Parses `Fact.verification_date` into a datetime.
+
+    Relative or unparseable values ("Today", "Data Unavailable") count as verified at fetch time.
+    """
+    text = (value or "").strip()
+    if text.lower() == "yesterday":
+        return fetched_at - timedelta(days=1)
+
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return fetched_at
+
+
+def compute_expiry(facts: list[Fact], fetched_at: datetime) -> datetime:
+    """The entry expires one TTL after its oldest verified fact."""
+    ttl = timedelta(hours=RESEARCH_CACHE_TTL_HOURS)
+    verified = [parse_verification_date(fact.verification_date, fetched_at) for fact in facts]
+    # Future dates are typos or "valid until" notes; never let them extend freshness
+    oldest = min([min(date, fetched_at) for date in verified], default=fetched_at)
+    return oldest + ttl
+
+
+def is_invalid_destination(research: ResearchOutput) -> bool:
+    """True if the research agent flagged the destination as not a real place."""
+    return any(fact.title.strip().lower() == INVALID_DESTINATION_TITLE.lower() for fact in research.facts)
+
+
+def is_cacheable(research: ResearchOutput) -> bool:
+    """Invalid-destination results and empty research are not cached."""
+    return bool(research.facts) and not is_invalid_destination(research)
+
+
+def get_cached_research(destination: str) -> Optional[ResearchOutput]:
+    """
+    Returns fresh cached research for a destination, or None.
+
+    Args:
+        destination: Destination as entered by the user
+
+    Returns:
+        ResearchOutput or None if there is no fresh entry
+    """
+    key = normalize_destination(destination)
+    if not key:
+        return None
+
+    research = _memory_cache.get(key)
+    if research is not None:
+        CACHE_REQUESTS.inc(cache="research", result="memory_hit")
+        return research
+
+    db = SessionLocal()
+    try:
+        entry = db.query(ResearchCacheEntry).filter(ResearchCacheEntry.destination_key == key).first()
+        if entry is None:
+            CACHE_REQUESTS.inc(cache="research", result="miss")
+            return None
+
+        now = datetime.utcnow()
+        if entry.expires_at is None or entry.expires_at <= now:
+            logger.debug(f"Research cache entry for {key} expired at {entry.expires_at}")
+            CACHE_REQUESTS.inc(cache="research", result="expired")
+            return None
+
+        research = ResearchOutput(destination=entry.destination, facts=entry.facts or [])
+        _memory_cache.set(key, research, ttl_seconds=(entry.expires_at - now).total_seconds())
+        CACHE_REQUESTS.inc(cache="research", result="db_hit")
+        return research
+    finally:
+        db.close()
+
+
+def store_research(destination: str, research: ResearchOutput):
+    """
+    Stores validated research for a destination in both cache tiers.
+
+    Args:
+        destination: Destination as entered by the user (used for the key)
+        research: Research agent output
+    """
+    if not is_cacheable(research):
+        logger.info(f"Not caching research for {destination}: invalid destination or no facts")
+        return
+
+    key = normalize_destination(destination)
+    fetched_at = datetime.utcnow()
+    expires_at = compute_expiry(research.facts, fetched_at)
+    if expires_at <= fetched_at:
+        return
+
+    db = SessionLocal()
+    try:
+        entry = db.query(ResearchCacheEntry).filter(ResearchCacheEntry.destination_key == key).first()
+        if entry is None:
+            entry = ResearchCacheEntry(destination_key=key)
+            db.add(entry)
+        entry.destination = research.destination
+        entry.facts = [fact.model_dump() for fact in research.facts]
+        entry.fetched_at = fetched_at
+        entry.expires_at = expires_at
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker cached the same destination concurrently; keep theirs
+            db.rollback()
+    finally:
+        db.close()
+
+    _memory_cache.set(key, research, ttl_seconds=(expires_at - fetched_at).total_seconds())
+    logger.info(f"Cached research for {key} until {expires_at}")
+
+
+def invalidate_research(destination: str):
+    """Drops a destination from both cache tiers."""
+    key = normalize_destination(destination)
+    _memory_cache.pop(key)
+
+    db = SessionLocal()
+    try:
+        db.query(ResearchCacheEntry).filter(ResearchCacheEntry.destination_key == key).delete()
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,388 @@
+"""
+Local geographic routing of planned days.
+
+Landmark coordinates and typical opening hours are read lazily from
+`core/data/pois.tsv`. With them, the planner only decides *what* to visit;
+this module decides *where on which day* and *in which order*:
+- `regroup_skeleton` moves outline landmarks between days so every day stays
+  in one area (balanced clustering on a haversine distance matrix);
+  `regroup_days` does the same for the finished plan of a short trip
+- `optimize_day` reorders a day's landmarks into the shortest walk that keeps
+  them inside their opening hours, and records the day's walking distance
+
+Activities that cannot be located (meals, unknown places, cities without POI
+data) keep their position, so the result is always a permutation of the
+planner's own choices. Everything runs with NumPy in a few milliseconds.
+"""
+import os
+from itertools import permutations
+from pathlib import Path
+from threading import Lock
+from typing import Callable, NamedTuple, Optional
+import numpy as np
+from .gazetteer import normalize_place_name
+from .models import Itinerary, DayPlan, TripSkeleton
+from .research_cache import normalize_destination
+from .validator import parse_time_slot, parse_duration, is_non_attraction
+from .metrics import span, ROUTE_OPTIMIZATIONS
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+POI_PATH = Path(os.getenv("POI_PATH", Path(__file__).parent / "data" / "pois.tsv"))
+
+EARTH_RADIUS_KM = 6371.0
+# City streets are longer than the straight line between two points
+WALKING_DETOUR_FACTOR = 1.3
+# Days with more movable landmarks than this keep the planner's order (8! = 40320 candidate tours)
+MAX_EXACT_STOPS = 8
+# Outline regrouping must shrink the total spread by at least this share to be applied
+MIN_REGROUP_GAIN = 0.1
+# Aliases shorter than this would match inside unrelated names
+MIN_ALIAS_LENGTH = 4
+
+
+class POI(NamedTuple):
+    """A landmark with coordinates and its usual opening hours (minutes after midnight)."""
+    name: str
+    lat: float
+    lon: float
+    opens: int
+    closes: int
+    visit_minutes: int
+
+
+class _Stop(NamedTuple):
+    """A located activity of a day: its position in the day and its POI."""
+    position: int
+    poi: POI
+
+
+# Per destination key: (alias key, POI) pairs, longest alias first
+_index: Optional[dict[str, list[tuple[str, POI]]]] = None
+_index_lock = Lock()
+# Per tour size: leg and placement indices of all tours (see `_tour_indices`)
+_tours: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _minutes(clock: str) -> int:
+    hours, minutes = clock.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _load_index() -> dict[str, list[tuple[str, POI]]]:
+    index: dict[str, list[tuple[str, POI]]] = {}
+    with open(POI_PATH, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip() or line.startswith("#"):
+                continue
+            city, name, lat, lon, opens, closes, visit, aliases = (line.rstrip("\n").split("\t") + [""] * 8)[:8]
+            poi = POI(name, float(lat), float(lon), _minutes(opens), _minutes(closes), int(visit))
+            entries = index.setdefault(normalize_destination(city), [])
+            for alias in [name, *aliases.split("|")]:
+                key = normalize_place_name(alias)
+                if len(key) >= MIN_ALIAS_LENGTH:
+                    entries.append((key, poi))
+    for entries in index.values():
+        entries.sort(key=lambda entry: -len(entry[0]))
+    return index
+
+
+def get_index() -> dict[str, list[tuple[str, POI]]]:
+    """Returns the POI index, loading it from disk on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index()
+    return _index
+
+
+def has_pois(destination: str) -> bool:
+    """True if coordinates are known for the destination."""
+    return normalize_destination(destination) in get_index()
+
+
+def locate(destination: str, name: str) -> Optional[POI]:
+    """
+    The POI an activity or landmark name refers to ("Morning at the Colosseo" -> Colosseum).
+
+    Meals, drinks, lodging and transport are never located, even when they name a
+    landmark ("Lunch near the Pantheon").
+    """
+    entries = get_index().get(normalize_destination(destination))
+    if not entries or is_non_attraction(name):
+        return None
+    text = f" {normalize_place_name(name)} "
+    for key, poi in entries:
+        if f" {key} " in text:
+            return poi
+    return None
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km between (arrays of) points in degrees; broadcasts like NumPy."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lat, lon) -> np.ndarray:
+    """Pairwise great-circle distances in km, as an (n, n) matrix."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    return haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def _walking_matrix(pois: list[POI]) -> np.ndarray:
+    return haversine_matrix([poi.lat for poi in pois], [poi.lon for poi in pois]) * WALKING_DETOUR_FACTOR
+
+
+def _tour_indices(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Flat indices into an (n, n) matrix for every permutation of n stops, identity first:
+    the legs (stop, next stop) and the placements (stop, slot) of each tour.
+    """
+    indices = _tours.get(n)
+    if indices is None:
+        tours = np.array(list(permutations(range(n))), dtype=np.intp).reshape(-1, n)
+        indices = _tours[n] = (tours[:, :-1] * n + tours[:, 1:], tours * n + np.arange(n))
+    return indices
+
+
+def _locate_stops(destination: str, day: DayPlan) -> list[_Stop]:
+    """Located activities of a day; a landmark listed twice is only moved once."""
+    stops, seen = [], set()
+    for position, activity in enumerate(day.activities):
+        poi = locate(destination, activity.name)
+        if poi is not None and poi.name not in seen:
+            seen.add(poi.name)
+            stops.append(_Stop(position, poi))
+    return stops
+
+
+def _window_violations(day: DayPlan, stops: list[_Stop]) -> np.ndarray:
+    """
+    (activity, slot) matrix: 1 where the located activity would start before its POI
+    opens, end after it closes, or overrun the next activity's start in that slot.
+    Slots without a readable time are never a violation.
+    """
+    starts = [parse_time_slot(activity.time_slot) for activity in day.activities]
+    violations = np.zeros((len(stops), len(stops)), dtype=np.int64)
+    for row, stop in enumerate(stops):
+        activity = day.activities[stop.position]
+        visit = parse_duration(activity.duration) or stop.poi.visit_minutes
+        for column, slot in enumerate(stops):
+            start = starts[slot.position]
+            if start is None:
+                continue
+            following = next((value for value in starts[slot.position + 1:] if value is not None), None)
+            overruns = following is not None and start + visit > following
+            if start < stop.poi.opens or start + visit > stop.poi.closes or overruns:
+                violations[row, column] = 1
+    return violations
+
+
+def optimize_day(destination: str, day: DayPlan) -> bool:
+    """
+    Reorders a day's located landmarks into the shortest walk that respects opening
+    hours, and sets `day.walking_km`.
+
+    Landmarks trade places and take over the time slot of the place they replace;
+    meals and unknown activities stay where the planner put them. Every ordering is
+    scored at once (tours up to MAX_EXACT_STOPS landmarks): fewest opening-hour
+    conflicts first, then the shortest walk. The planner's order wins ties.
+
+    Returns:
+        bool: True if the order changed
+    """
+    stops = _locate_stops(destination, day)
+    if not stops:
+        day.walking_km = None
+        return False
+    distances = _walking_matrix([stop.poi for stop in stops])
+    count = len(stops)
+
+    order = np.arange(count)
+    reordered = False
+    if 2 <= count <= MAX_EXACT_STOPS:
+        legs, placements = _tour_indices(count)
+        lengths = np.take(distances, legs).sum(axis=1)
+        conflicts = np.take(_window_violations(day, stops), placements).sum(axis=1)
+        candidates = np.flatnonzero(conflicts == conflicts.min())
+        # The identity tour is row 0 and argmin keeps the first; a real gain is required so float noise never shuffles a day
+        best = int(candidates[np.argmin(lengths[candidates])])
+        if conflicts[best] < conflicts[0] or lengths[best] < lengths[0] - 0.05:
+            # Placements are stop * count + slot
+            order = placements[best] // count
+            activities = list(day.activities)
+            for slot, stop_index in enumerate(order):
+                target = stops[slot].position
+                moved = day.activities[stops[stop_index].position]
+                activities[target] = moved.model_copy(update={"time_slot": day.activities[target].time_slot})
+            day.activities = activities
+            reordered = True
+            logger.debug(
+                "Day {} of {}: walk {:.1f} -> {:.1f} km, opening-hour conflicts {} -> {}",
+                day.day_number, destination, lengths[0], lengths[best], conflicts[0], conflicts[best]
+            )
+    day.walking_km = round(float(distances[order[:-1], order[1:]].sum()), 1)
+    return reordered
+
+
+def optimize_routes(itinerary: Itinerary, destination: str) -> int:
+    """
+    Runs `optimize_day` on every day of an itinerary.
+
+    Returns:
+        int: Number of days whose order changed
+    """
+    if not destination or not has_pois(destination):
+        for day in itinerary.days:
+            day.walking_km = None
+        ROUTE_OPTIMIZATIONS.inc(len(itinerary.days), outcome="unlocated")
+        return 0
+    changed = 0
+    with span("route_optimization"):
+        for day in itinerary.days:
+            if optimize_day(destination, day):
+                changed += 1
+                ROUTE_OPTIMIZATIONS.inc(outcome="reordered")
+            else:
+                ROUTE_OPTIMIZATIONS.inc(outcome="unchanged" if day.walking_km is not None else "unlocated")
+    return changed
+
+
+def _spread(lat: np.ndarray, lon: np.ndarray, labels: np.ndarray, groups: int) -> tuple[float, np.ndarray, np.ndarray]:
+    """Sum of distances to the group centers, and the centers (mean coordinates) themselves."""
+    center_lat = np.array([lat[labels == group].mean() if (labels == group).any() else 0.0 for group in range(groups)])
+    center_lon = np.array([lon[labels == group].mean() if (labels == group).any() else 0.0 for group in range(groups)])
+    return float(haversine(lat, lon, center_lat[labels], center_lon[labels]).sum()), center_lat, center_lon
+
+
+def _balanced_assignment(to_center: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    """Greedy assignment of points to centers, closest pairs first, without exceeding any center's capacity."""
+    labels = np.full(to_center.shape[0], -1)
+    remaining = capacities.copy()
+    for flat in np.argsort(to_center, axis=None, kind="stable"):
+        point, group = divmod(int(flat), to_center.shape[1])
+        if labels[point] < 0 and remaining[group] > 0:
+            labels[point] = group
+            remaining[group] -= 1
+    return labels
+
+
+def _regroup_by_area(destination: str, days: list[list[str]], pinned: Optional[Callable[[str], bool]],
+                     rounds: int) -> Optional[list[list[tuple[int, int]]]]:
+    """
+    Balanced k-means of the located items of each day (landmarks or activity names),
+    seeded with the days themselves so every day keeps its number of items.
+
+    Returns:
+        For every day, the (day, position) each of its items comes from; None when
+        the regrouping would not cut the spread by MIN_REGROUP_GAIN
+    """
+    if len(days) < 2 or not has_pois(destination):
+        return None
+
+    points: list[tuple[int, int, POI]] = []
+    for group, names in enumerate(days):
+        for position, name in enumerate(names):
+            if pinned is not None and pinned(name):
+                continue
+            poi = locate(destination, name)
+            if poi is not None:
+                points.append((group, position, poi))
+    if len(points) < 3:
+        return None
+
+    groups = len(days)
+    lat = np.array([poi.lat for _, _, poi in points])
+    lon = np.array([poi.lon for _, _, poi in points])
+    original = np.array([group for group, _, _ in points])
+    capacities = np.bincount(original, minlength=groups)
+
+    with span("route_clustering"):
+        before, center_lat, center_lon = _spread(lat, lon, original, groups)
+        labels = original
+        for _ in range(rounds):
+            to_center = haversine(lat[:, None], lon[:, None], center_lat[None, :], center_lon[None, :])
+            to_center[:, capacities == 0] = np.inf
+            updated = _balanced_assignment(to_center, capacities)
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+            _, center_lat, center_lon = _spread(lat, lon, labels, groups)
+        after, _, _ = _spread(lat, lon, labels, groups)
+
+    if before <= 0 or after > before * (1 - MIN_REGROUP_GAIN):
+        return None
+
+    # Each day keeps the positions of its moved-out items, filled with its new ones
+    incoming: dict[int, list[tuple[int, int]]] = {}
+    for (group, position, _), label in zip(points, labels):
+        incoming.setdefault(int(label), []).append((group, position))
+    sources = [[(group, position) for position in range(len(names))] for group, names in enumerate(days)]
+    slots: dict[int, list[int]] = {}
+    for (group, position, _) in points:
+        slots.setdefault(group, []).append(position)
+    for group, positions in slots.items():
+        for position, source in zip(positions, incoming.get(group, [])):
+            sources[group][position] = source
+
+    logger.info("Regrouped {} days by area: spread {:.1f} -> {:.1f} km", destination, before, after)
+    return sources
+
+
+def regroup_skeleton(destination: str, skeleton: TripSkeleton,
+                     pinned: Optional[Callable[[str], bool]] = None, rounds: int = 10) -> bool:
+    """
+    Moves outline landmarks between days so each day covers one area.
+
+    Located landmarks are clustered around the current days (balanced k-means
+    seeded with each day's own landmarks, so every day keeps its number of
+    landmarks and stays recognisable). The result is applied only if it cuts the
+    total distance to the day centers by MIN_REGROUP_GAIN.
+
+    Args:
+        destination: Trip destination
+        skeleton: Outline to regroup, modified in place
+        pinned: Landmarks for which this returns True stay on their day (e.g. the wow experience)
+        rounds: Maximum refinement rounds
+
+    Returns:
+        bool: True if landmarks were moved
+    """
+    landmarks = [list(day.landmarks) for day in skeleton.days]
+    sources = _regroup_by_area(destination, landmarks, pinned, rounds)
+    if sources is None:
+        return False
+    for day, day_sources in zip(skeleton.days, sources):
+        day.landmarks = [landmarks[group][position] for group, position in day_sources]
+    return True
+
+
+def regroup_days(destination: str, itinerary: Itinerary,
+                 pinned: Optional[Callable[[str], bool]] = None, rounds: int = 10) -> bool:
+    """
+    Moves planned landmarks between the days of a finished itinerary so each day
+    covers one area; the single-crew counterpart of `regroup_skeleton`.
+
+    A moved landmark takes over the time slot of the activity it replaces; meals and
+    unknown places stay where the planner put them. Run `optimize_day` afterwards.
+
+    Returns:
+        bool: True if activities were moved
+    """
+    activities = [list(day.activities) for day in itinerary.days]
+    sources = _regroup_by_area(
+        destination, [[activity.name for activity in day] for day in activities], pinned, rounds
+    )
+    if sources is None:
+        return False
+    for index, (day, day_sources) in enumerate(zip(itinerary.days, sources)):
+        day.activities = [
+            activities[group][position] if (group, position) == (index, slot)
+            else activities[group][position].model_copy(update={"time_slot": activities[index][slot].time_slot})
+            for slot, (group, position) in enumerate(day_sources)
+        ]
+    return True
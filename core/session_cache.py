@@ -0,0 +1,368 @@
+"""
+Write-behind cache of hot chat sessions.
+
+Sessions are kept in a bounded LRU in front of the `chat_sessions` table. Turns
+read and update the cached copy; changed sessions are marked dirty and written
+in batches every SESSION_FLUSH_INTERVAL_SECONDS and on shutdown. A crash can
+lose at most one flush interval of preference updates; itineraries and planning
+jobs are always committed immediately by their writers.
+
+Several workers or hosts may cache the same session, so every write is
+conditional on the row `version` the cached copy was read at (optimistic
+concurrency, no locks held across a turn). A write that loses the race re-reads
+the row, merges the preferences field by field (`merge_preferences`) and
+retries. With SESSION_REVALIDATE (on by default when WEB_CONCURRENCY > 1, and
+required for any multi-worker or multi-host deployment) each turn also compares
+the cached version with the row's (one primary-key lookup) and starts from the
+newer state.
+"""
+import asyncio
+import copy
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal, ChatSession, update_chat_session
+from .preferences import merge_preferences
+from .metrics import SESSION_WRITES, SESSION_WRITE_CONFLICTS
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# Number of sessions kept in memory
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# How often dirty sessions are written to the database
+SESSION_FLUSH_INTERVAL_SECONDS = float(os.getenv("SESSION_FLUSH_INTERVAL_SECONDS", "1.0"))
+# Merge-and-retry rounds of a session write that keeps losing the version check
+SESSION_WRITE_RETRIES = int(os.getenv("SESSION_WRITE_RETRIES", "3"))
+# Required when several workers or hosts serve the same sessions: without it a worker keeps
+# answering from its cached copy until a write conflicts. On by default with WEB_CONCURRENCY > 1
+# (uvicorn/gunicorn workers); single-worker processes on several hosts must set it explicitly
+SESSION_REVALIDATE = os.getenv(
+    "SESSION_REVALIDATE", str(int(os.getenv("WEB_CONCURRENCY", "1")) > 1)
+).lower() == "true"
+
+WRITERS = ("chat", "flush")
+
+
+class SessionConflict(Exception):
+    """Raised when a session write still conflicts after SESSION_WRITE_RETRIES merges; maps to HTTP 409."""
+
+
+@dataclass
+class CachedSession:
+    """In-memory copy of a `chat_sessions` row."""
+    session_id: str
+    user_id: Optional[str]
+    data: dict
+    itinerary: Optional[dict] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    revision: int = 0  # Bumped on every change
+    flushed_revision: int = 0  # Last revision written to the database
+    version: Optional[int] = None  # Row version the copy is based on; None until first stored
+    base: dict = field(default_factory=dict)  # Preferences as stored at `version`, for merges
+
+    @property
+    def dirty(self) -> bool:
+        return self.revision != self.flushed_revision
+
+
+@dataclass
+class SessionWrite:
+    """A versioned session write, applied to the cache once its transaction has committed."""
+    session: CachedSession
+    revision: int
+    data: dict  # Preferences the cached copy held
+    stored: dict  # Preferences written, merged with concurrent edits
+    version: int
+    itinerary: Optional[dict] = None  # Written, or read from a newer row
+
+
+class SessionCache:
+    """Bounded LRU of chat sessions with dirty tracking and batched write-back."""
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.writes_skipped = 0
+        self.flushed = 0
+        self.stale_reloads = 0
+        self._sessions: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._evicted_dirty: dict[str, CachedSession] = {}
+        # Planning workers update itineraries from their own threads
+        self._lock = Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _remember(self, session: CachedSession):
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.maxsize:
+                _, evicted = self._sessions.popitem(last=False)
+                if evicted.dirty:
+                    # Keep unwritten changes until the next flush
+                    self._evicted_dirty[evicted.session_id] = evicted
+
+    def _find(self, session_id: str) -> Optional[CachedSession]:
+        with self._lock:
+            return self._sessions.get(session_id) or self._evicted_dirty.get(session_id)
+
+    async def get(self, db: AsyncSession, session_id: str) -> Optional[CachedSession]:
+        """
+        Returns the session from memory, loading it from the database on a miss.
+        With SESSION_REVALIDATE a cached copy older than the row is brought up to date.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id) or self._evicted_dirty.get(session_id)
+            if session is not None:
+                if session_id in self._sessions:
+                    self._sessions.move_to_end(session_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if session is not None:
+            if SESSION_REVALIDATE and session.version is not None:
+                await self._revalidate(db, session)
+            return session
+
+        row = await db.get(ChatSession, session_id)
+        if row is None:
+            return None
+
+        session = CachedSession(
+            session_id=row.session_id,
+            user_id=row.user_id,
+            data=dict(row.data or {}),
+            itinerary=row.itinerary,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+            version=row.version,
+            base=dict(row.data or {})
+        )
+        self._remember(session)
+        return session
+
+    async def _revalidate(self, db: AsyncSession, session: CachedSession):
+        """Merges the row into a cached copy when another worker wrote it since."""
+        row = (await db.execute(
+            select(ChatSession.data, ChatSession.itinerary, ChatSession.user_id, ChatSession.version)
+            .where(ChatSession.session_id == session.session_id)
+        )).first()
+        if row is None or row.version == session.version:
+            return
+        with self._lock:
+            theirs = dict(row.data or {})
+            # Unwritten local changes survive and stay dirty; a clean copy simply becomes the row
+            session.data = merge_preferences(session.base, session.data, theirs)
+            session.base, session.version = theirs, row.version
+            session.itinerary = row.itinerary
+            session.user_id = session.user_id or row.user_id
+            self.stale_reloads += 1
+
+    def put(self, session_id: str, user_id: Optional[str], data: dict, base: Optional[dict] = None) -> CachedSession:
+        """
+        Stores the preferences of a session. The session only becomes dirty if they changed.
+
+        `base` is the preferences the turn started from. When given, only the fields the
+        turn changed are applied (`merge_preferences`), so an overlapping turn of the
+        same session on this worker keeps its answers; without it `data` replaces them.
+
+        Returns:
+            CachedSession: The cached entry
+        """
+        session = self._find(session_id)
+        if session is None:
+            session = CachedSession(session_id=session_id, user_id=user_id, data=copy.deepcopy(data), revision=1)
+            self._remember(session)
+            return session
+
+        with self._lock:
+            if base is not None:
+                data = merge_preferences(base, data, session.data)
+            changed = session.data != data or (user_id is not None and user_id != session.user_id)
+            if changed:
+                session.data = copy.deepcopy(data)
+                session.user_id = user_id or session.user_id
+                session.updated_at = datetime.utcnow()
+                session.revision += 1
+            else:
+                self.writes_skipped += 1
+        self._remember(session)
+        return session
+
+    async def _write(self, db: AsyncSession, session: CachedSession, writer: str,
+                     itinerary: Optional[dict] = None) -> Optional[SessionWrite]:
+        """
+        Writes the session's current preferences if the row is still at the cached
+        version; otherwise re-reads it, merges and retries. Does not commit.
+
+        Returns:
+            SessionWrite for `stored`, or None if every attempt conflicted
+        """
+        with self._lock:
+            revision, data, user_id = session.revision, copy.deepcopy(session.data), session.user_id
+            version, base = session.version, session.base
+        requested, seen_itinerary = data, None
+
+        for attempt in range(SESSION_WRITE_RETRIES + 1):
+            new_version = await update_chat_session(db, session.session_id, user_id, data, version, itinerary)
+            if new_version is not None:
+                SESSION_WRITES.inc(writer=writer, outcome="merged" if attempt else "written")
+                return SessionWrite(session, revision, requested, data, new_version,
+                                    itinerary if itinerary is not None else seen_itinerary)
+
+            SESSION_WRITE_CONFLICTS.inc(writer=writer)
+            row = (await db.execute(
+                select(ChatSession.data, ChatSession.itinerary, ChatSession.version)
+                .where(ChatSession.session_id == session.session_id)
+            )).first()
+            if row is None:
+                # Deleted since it was read: store it again
+                version, base = None, {}
+                continue
+            theirs = dict(row.data or {})
+            data = merge_preferences(base, data, theirs)
+            base, version, seen_itinerary = theirs, row.version, row.itinerary
+            logger.debug("Session {} was written concurrently (version {}); merged", session.session_id, version)
+
+        SESSION_WRITES.inc(writer=writer, outcome="exhausted")
+        logger.warning(f"Session {session.session_id} still conflicts after {SESSION_WRITE_RETRIES} merges")
+        return None
+
+    async def store(self, db: AsyncSession, session_id: str, itinerary: Optional[dict] = None) -> SessionWrite:
+        """
+        Writes a cached session now, in the caller's transaction (itineraries and new
+        jobs are committed together with their session). Call `stored` after the commit.
+
+        Raises:
+            KeyError: If the session is not cached (`put` it first)
+            SessionConflict: If the write kept conflicting with other workers
+        """
+        session = self._find(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        write = await self._write(db, session, "chat", itinerary)
+        if write is None:
+            raise SessionConflict(f"Session {session_id} is being updated concurrently, please retry")
+        return write
+
+    def stored(self, write: SessionWrite):
+        """Records a committed write: the session is clean unless it changed meanwhile."""
+        session = write.session
+        with self._lock:
+            session.flushed_revision = max(session.flushed_revision, write.revision)
+            if session.version is None or write.version > session.version:
+                session.version, session.base = write.version, write.stored
+                if write.stored != write.data:
+                    # Answers from another worker, merged under any local change made since the write started
+                    session.data = merge_preferences(write.data, session.data, write.stored)
+                if write.itinerary is not None:
+                    session.itinerary = write.itinerary
+            if not session.dirty:
+                self._evicted_dirty.pop(session.session_id, None)
+
+    def set_itinerary(self, session_id: str, itinerary: Optional[dict], version: Optional[int] = None):
+        """
+        Updates the cached itinerary after its writer has committed it (thread-safe).
+
+        `version` is the row version that write produced; a copy exactly one version
+        behind stays current, since itinerary writes leave the preferences alone.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id) or self._evicted_dirty.get(session_id)
+            if session is not None:
+                session.itinerary = itinerary
+                if version is not None and session.version == version - 1:
+                    session.version = version
+
+    async def flush(self) -> int:
+        """
+        Writes every dirty session in one transaction.
+
+        Returns:
+            int: Number of sessions written
+        """
+        async with self._flush_lock:
+            with self._lock:
+                pending = [session for session in self._sessions.values() if session.dirty]
+                pending += [session for session in self._evicted_dirty.values() if session.dirty]
+
+            if not pending:
+                return 0
+
+            writes = []
+            async with AsyncSessionLocal() as db:
+                for session in pending:
+                    write = await self._write(db, session, "flush")
+                    # Sessions that kept conflicting stay dirty and are retried on the next flush
+                    if write is not None:
+                        writes.append(write)
+                await db.commit()
+
+            for write in writes:
+                self.stored(write)
+            with self._lock:
+                self.flushed += len(writes)
+
+            logger.debug(f"Flushed {len(writes)} chat sessions")
+            return len(writes)
+
+    async def _flush_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Entries stay dirty and are retried on the next tick
+                logger.error("Session flush failed", error=str(e))
+
+    def start(self, interval: float = SESSION_FLUSH_INTERVAL_SECONDS):
+        """Starts the background flusher on the running event loop."""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically(interval))
+
+    async def close(self):
+        """Stops the background flusher and writes everything still dirty."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        """Hit/miss counters, skipped writes, sessions written and version conflicts."""
+        with self._lock:
+            stats = {
+                "size": len(self._sessions),
+                "dirty": sum(1 for session in self._sessions.values() if session.dirty) + len(self._evicted_dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes_skipped": self.writes_skipped,
+                "flushed": self.flushed,
+                "stale_reloads": self.stale_reloads
+            }
+        writes = sum(
+            SESSION_WRITES.value(writer=writer, outcome=outcome)
+            for writer in WRITERS for outcome in ("written", "merged", "exhausted")
+        )
+        conflicts = sum(SESSION_WRITE_CONFLICTS.value(writer=writer) for writer in WRITERS)
+        stats.update(
+            conflicts=int(conflicts),
+            merged=int(sum(SESSION_WRITES.value(writer=writer, outcome="merged") for writer in WRITERS)),
+            exhausted=int(sum(SESSION_WRITES.value(writer=writer, outcome="exhausted") for writer in WRITERS)),
+            conflict_rate=round(conflicts / writes, 4) if writes else 0.0
+        )
+        return stats
+
+
+session_cache = SessionCache()
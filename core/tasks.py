@@ -1,8 +1,32 @@
 """
 Task definitions for the Travel Companion agents.
 """
+import re
+from threading import Lock
+from typing import Iterable, Optional
 from crewai import Task
-from .models import ResearchOutput, Itinerary
+from .context_budget import build_planner_context
+from .models import ResearchOutput, Itinerary, TripSkeleton, DayPlan
+
+# The research task has no per-request text ({destination} is filled in at kickoff),
+# so it is built once per process and copied onto each request's agent
+_research_task_template: Optional[Task] = None
+_research_task_lock = Lock()
+
+
+def plain_text(text) -> str:
+    """Replaces braces so generated text survives CrewAI's input interpolation."""
+    return str(text).replace("{", "(").replace("}", ")")
+
+
+def compact_prompt(text: str) -> str:
+    """Strips the source-code indentation from every prompt line; it is sent, and billed, on every run."""
+    return re.sub(r"\n[ \t]+", "\n", text.strip())
+
+
+def format_research_context(research: ResearchOutput, interests: Optional[str] = None, focus: Iterable[str] = ()) -> str:
+    """Renders the budgeted research facts (see core.context_budget) as plain text for a planner prompt."""
+    return plain_text(build_planner_context(research, interests, focus).text)
 
 
 def create_research_task(agent, destination):
@@ -11,10 +35,24 @@ def create_research_task(agent, destination):
     
     Args:
         agent: The research agent to assign this task to
-        destination: The destination to research
+        destination: The destination to research (interpolated at kickoff)
     """
+    return get_research_task_template(agent).copy([agent], {})
+
+
+def get_research_task_template(agent) -> Task:
+    """Returns the process-wide research task template, building it for `agent`'s role on first use."""
+    global _research_task_template
+    if _research_task_template is None:
+        with _research_task_lock:
+            if _research_task_template is None:
+                _research_task_template = _build_research_task(agent)
+    return _research_task_template
+
+
+def _build_research_task(agent) -> Task:
     return Task(
-        description=f"""Conduct a rigorous data extraction for: {{destination}}.
+        description=compact_prompt(f"""Conduct a rigorous data extraction for: {{destination}}.
         
         CRITICAL RULE - DESTINATION VALIDATION:
         First, verify that "{{destination}}" is a REAL, RECOGNIZED travel destination.
@@ -33,27 +71,36 @@ def create_research_task(agent, destination):
         - If exact data is unavailable, state "Data Unavailable". DO NOT GUESS.
         - Provide the exact Source URL for every fact.
         - Do not include marketing fluff. Only hard facts.
-        - If destination is not recognized (gibberish, made-up place), FAIL EXPLICITLY.""",
+        - If destination is not recognized (gibberish, made-up place), FAIL EXPLICITLY."""),
         expected_output='A structured list with verified live data, dates, and source URLs. If destination is invalid, return error fact.',
         agent=agent,
         output_pydantic=ResearchOutput
     )
 
 
-def create_planning_task(agent, research_task, destination, duration, interests, budget):
+def create_planning_task(agent, research_task, destination, duration, interests, budget, research=None):
     """
     Creates the planning task that generates itineraries.
     
     Args:
         agent: The planner agent to assign this task to
-        research_task: The research task to use as context (RAG)
+        research_task: The research task to use as context (RAG), or None when `research` is given
         destination: The destination city
         duration: Number of days for the trip
         interests: User's travel interests
         budget: User's budget level
+        research: Previously verified ResearchOutput injected instead of a live research task
     """
+    research_block = ""
+    if research is not None:
+        research_block = f"""
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests)}
+"""
+
     return Task(
-        description=f"""Create a beautiful, realistic {{duration}}-day itinerary for: {{destination}}.
+        description=compact_prompt(f"""Create a beautiful, realistic {{duration}}-day itinerary for: {{destination}}.
 
         USER PREFERENCES (MUST FOLLOW):
         - Destination: {{destination}}
@@ -66,6 +113,7 @@ def create_planning_task(agent, research_task, destination, duration, interests,
         you MUST STOP and return an error itinerary with trip_title="Error: Invalid Destination" and empty days array.
         DO NOT CREATE A GENERIC ITINERARY FOR INVALID DESTINATIONS.
 
+{research_block}
         Use the verified research data as priority for prices, opening hours and official names.
 
         You are allowed (and expected) to include all classic, must-see landmarks and experiences that every visitor wants, even if the researcher didn't explicitly return them.
@@ -84,10 +132,223 @@ def create_planning_task(agent, research_task, destination, duration, interests,
         (Musee d'Orsay, Orangerie, Marmottan, etc.) unless the destination genuinely has none.
         11. Never schedule more than 4 paid attractions per day and keep total transport time under 45 min/day.
 
-        Output must be perfect JSON matching the Itinerary schema.""",
+        Output must be perfect JSON matching the Itinerary schema."""),
         expected_output=f"A complete, beautiful {duration}-day JSON itinerary tailored to user preferences",
         agent=agent,
-        context=[research_task],
+        context=[research_task] if research_task is not None else [],
         output_pydantic=Itinerary
     )
 
+
+
+def create_skeleton_task(agent, destination, duration, interests, budget, research):
+    """
+    Creates the cheap outline task used by parallel per-day planning.
+    
+    Args:
+        agent: The planner agent to assign this task to
+        destination: The destination city
+        duration: Number of days for the trip
+        interests: User's travel interests
+        budget: User's budget level
+        research: Verified ResearchOutput for the destination
+    """
+    return Task(
+        description=compact_prompt(f"""Outline a {{duration}}-day trip to {{destination}} for a traveler interested in "{{interests}}" with a "{{budget}}" budget.
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests)}
+
+        For EACH of the {{duration}} days give only: a theme, the area or neighborhood the day is centered on,
+        and the 2-4 main landmarks reserved for that day.
+
+        RULES:
+        1. Create exactly {{duration}} days.
+        2. Every landmark appears on exactly ONE day. No duplicates across days.
+        3. Group each day geographically so walking stays under 10 km.
+        4. Pick exactly one signature "wow" experience (boat cruise, viewpoint at night, cable car, etc.) and the day it happens.
+        5. Prioritize "{{interests}}" and include 1-2 less-touristy spots over the whole trip.
+
+        Keep it short: no schedules, times or prices yet."""),
+        expected_output=f"A {duration}-day outline with one theme, area and landmark list per day",
+        agent=agent,
+        output_pydantic=TripSkeleton
+    )
+
+
+def create_day_task(agent, skeleton, day, research, interests=None):
+    """
+    Creates the detailed planning task for a single day of an outlined trip.
+    
+    Args:
+        agent: The planner agent to assign this task to
+        skeleton: TripSkeleton of the whole trip
+        day: DaySkeleton of the day to plan
+        research: Verified ResearchOutput for the destination
+        interests: User's travel interests, used to pick the most relevant research facts
+    """
+    other_landmarks = sorted({
+        landmark for other in skeleton.days if other.day_number != day.day_number for landmark in other.landmarks
+    })
+    if skeleton.wow_day == day.day_number:
+        wow_rule = f'Include the trip\'s signature experience: "{plain_text(skeleton.wow_experience)}".'
+    else:
+        wow_rule = f'Do NOT include "{plain_text(skeleton.wow_experience)}" or any other signature "wow" experience; it happens on another day.'
+
+    outline = plain_text(f"""Day {day.day_number}: {day.theme}
+        Area: {day.area}
+        Reserved landmarks: {", ".join(day.landmarks)}
+        Landmarks planned on OTHER days (do NOT include): {", ".join(other_landmarks) or "none"}""")
+
+    return Task(
+        description=compact_prompt(f"""Plan Day {day.day_number} of a {{duration}}-day trip to {{destination}} ("{plain_text(skeleton.trip_title)}").
+
+        USER PREFERENCES (MUST FOLLOW):
+        - Interests: {{interests}}
+        - Budget: {{budget}}
+
+        DAY OUTLINE:
+        {outline}
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests, focus=day.landmarks)}
+
+        Use the verified research data as priority for prices, opening hours and official names.
+
+        RULES:
+        1. Build the day around the reserved landmarks, in the given area.
+        2. {wow_rule}
+        3. Order activities by time slot and respect opening hours; leave time for lunch.
+        4. For every popular attraction with queues, add "book skip-the-line / timed tickets in advance".
+        5. Adjust restaurant/activity cost to the "{{budget}}" level and choose an atmospheric neighborhood for dinner.
+        6. Keep walking under 10 km, transport under 45 min, and at most 4 paid attractions.
+
+        Output must be perfect JSON matching the DayPlan schema with day_number={day.day_number}."""),
+        expected_output=f"A JSON DayPlan for day {day.day_number}",
+        agent=agent,
+        output_pydantic=DayPlan
+    )
+
+
+def _format_day_plan(plan: DayPlan) -> str:
+    """One line per activity: time slot, name, duration and cost."""
+    return plain_text("\n".join(
+        f"- {activity.time_slot}: {activity.name} ({activity.duration}, {activity.cost_estimate}) - {activity.description}"
+        for activity in plan.activities
+    ))
+
+
+def create_day_revision_task(agent, plan, research, previous_budget, interests=None):
+    """
+    Creates the task that re-costs one already planned day for a changed budget.
+    
+    Args:
+        agent: The planner agent to assign this task to
+        plan: DayPlan to revise
+        research: Verified ResearchOutput for the destination
+        previous_budget: Budget level the day was planned for
+        interests: User's travel interests, used to pick the most relevant research facts
+    """
+    focus = [activity.name for activity in plan.activities]
+    return Task(
+        description=compact_prompt(f"""Revise Day {plan.day_number} of a {{duration}}-day trip to {{destination}}.
+        The traveler changed the budget from "{plain_text(previous_budget)}" to "{{budget}}".
+
+        CURRENT DAY PLAN (theme: {plain_text(plan.theme)}):
+{_format_day_plan(plan)}
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests, focus=focus)}
+
+        RULES:
+        1. Keep the theme, the area, the order and the time slots of the day.
+        2. Keep every activity that fits the "{{budget}}" level; update its cost_estimate for that level.
+        3. Replace only what does not fit (restaurants, tours, paid experiences) with a nearby alternative
+        in the same time slot and of the same kind.
+        4. Use the verified research data as priority for prices and official names.
+        5. At most 4 paid attractions.
+
+        Output must be perfect JSON matching the DayPlan schema with day_number={plan.day_number}."""),
+        expected_output=f"The revised JSON DayPlan for day {plan.day_number}",
+        agent=agent,
+        output_pydantic=DayPlan
+    )
+
+
+def create_extension_task(agent, itinerary, research, interests=None):
+    """
+    Creates the outline task for days appended to an existing itinerary.
+    
+    Args:
+        agent: The planner agent to assign this task to
+        itinerary: Itinerary whose days are kept as they are
+        research: Verified ResearchOutput for the destination
+        interests: User's travel interests, used to pick the most relevant research facts
+    """
+    existing = len(itinerary.days)
+    planned = plain_text("\n".join(
+        f"Day {day.day_number}: {day.theme} - {', '.join(activity.name for activity in day.activities)}"
+        for day in itinerary.days
+    ))
+    return Task(
+        description=compact_prompt(f"""The traveler extended a {existing}-day trip to {{destination}} ("{plain_text(itinerary.trip_title)}")
+        to {{duration}} days. Interests: "{{interests}}". Budget: "{{budget}}".
+
+        EXISTING DAYS (already planned, do NOT change them):
+{planned}
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests)}
+
+        Outline ONLY the new days, numbered from {existing + 1} to {{duration}}. For each give a theme, the area
+        or neighborhood it is centered on, and the 2-4 main landmarks reserved for it.
+
+        RULES:
+        1. No landmark of the existing days may appear again.
+        2. Group each new day geographically so walking stays under 10 km.
+        3. Name the trip's signature "wow" experience as it appears in the existing days, and the day it happens on.
+        4. Update the trip title and summary to the new length.
+
+        Keep it short: no schedules, times or prices."""),
+        expected_output="An outline of only the new days, with the existing signature experience and its day",
+        agent=agent,
+        output_pydantic=TripSkeleton
+    )
+
+
+def create_day_repair_task(agent, plan, research, problems, interests=None):
+    """
+    Creates the task that fixes the rule violations found in one planned day.
+    
+    Args:
+        agent: The planner agent to assign this task to
+        plan: DayPlan that failed validation
+        research: Verified ResearchOutput for the destination
+        problems: Human-readable violations of this day (see core.validator)
+        interests: User's travel interests, used to pick the most relevant research facts
+    """
+    focus = [activity.name for activity in plan.activities]
+    listed = plain_text("\n".join(f"- {problem}" for problem in problems))
+    return Task(
+        description=compact_prompt(f"""Fix Day {plan.day_number} of a {{duration}}-day trip to {{destination}} (budget: "{{budget}}").
+
+        CURRENT DAY PLAN (theme: {plain_text(plan.theme)}):
+{_format_day_plan(plan)}
+
+        PROBLEMS FOUND:
+{listed}
+
+        VERIFIED RESEARCH DATA (Research Agent output):
+{format_research_context(research, interests, focus=focus)}
+
+        RULES:
+        1. Fix every problem above and change nothing else: keep the theme, the area and the activities that are fine.
+        2. At most 4 paid attractions; activities in time order, each with a clock time or time of day in time_slot.
+        3. cost_estimate is a single amount with currency (e.g. "€18") or "Free"; keep it within the "{{budget}}" level.
+        4. Use the verified research data as priority for prices and official names.
+
+        Output must be perfect JSON matching the DayPlan schema with day_number={plan.day_number}."""),
+        expected_output=f"The corrected JSON DayPlan for day {plan.day_number}",
+        agent=agent,
+        output_pydantic=DayPlan
+    )
@@ -1,34 +1,193 @@
+
+"""
+Grounded Google search for the research agent.
+
+CrewAI and the Gemini SDK are imported on first use, so the API can import the
+cache statistics without loading either.
+"""
 import os
-from crewai.tools import tool
-from google import genai
+import re
+from threading import Event, Lock
+from typing import TYPE_CHECKING, Optional
+from .cache import TTLCache
+from .metrics import span, LLM_CALLS, SEARCH_REQUESTS
+from .admission import acquire_llm_token
+
+if TYPE_CHECKING:
+    from google import genai
+
+# How long a search result is reused for the same normalized query
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "21600"))
+# Maximum number of cached queries held in memory
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+
+_client: Optional["genai.Client"] = None
+_client_lock = Lock()
+
+_search_tool = None
+_search_tool_lock = Lock()
+
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+
+
+class _InFlightSearch:
+    """A search currently executing; followers wait on `done` instead of searching again."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
 
+_inflight: dict[str, _InFlightSearch] = {}
+_inflight_lock = Lock()
 
-@tool("Google Search Tool")
-def google_search(query: str) -> str:
+_stats_lock = Lock()
+_stats = {"calls": 0, "coalesced": 0, "errors": 0}
+
+
+def get_search_client() -> "genai.Client":
+    """Returns the process-wide Gemini client used for grounded search."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
+            _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+        return _client
+
+
+# Words whose presence never changes what a query asks for
+QUERY_FILLER_WORDS = frozenset(("a", "an", "the", "please"))
+
+
+def normalize_query(query: str) -> str:
     """
-    Search Google for current information using Gemini's grounding feature.
-    
-    Use this tool when you need real-time data such as:
-    - Current prices
-    - Opening hours
-    - Recent events
-    - Any information that changes frequently
-    
-    Args:
-        query: Search query (e.g., "Louvre Museum ticket price 2025")
-    
-    Returns:
-        Search results as formatted text
+    Canonical cache key for a search query.
+
+    Case, punctuation, spacing, articles and a word repeated back to back are
+    ignored, so "Louvre ticket price 2025" and "the louvre  ticket price, 2025?"
+    share one entry. Word order is kept: "train from Florence to Rome" and
+    "train from Rome to Florence" are different searches.
     """
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-    
+    tokens = []
+    for token in re.findall(r"[\w€$£]+", (query or "").lower()):
+        if token not in QUERY_FILLER_WORDS and (not tokens or tokens[-1] != token):
+            tokens.append(token)
+    return " ".join(tokens)
+
+
+SEARCH_MODEL = 'gemini-2.0-flash-001'
+
+
+def _run_search(query: str) -> str:
+    """Performs one grounded-generation round-trip."""
+    with _stats_lock:
+        _stats["calls"] += 1
+
     # Use Gemini with Google Search grounding
-    response = client.models.generate_content(
-        model='gemini-2.0-flash-001',
+    response = get_search_client().models.generate_content(
+        model=SEARCH_MODEL,
         contents=query,
         config={
             'tools': [{'google_search': {}}]
         }
     )
-    
-    return response.text
\ No newline at end of file
+    return response.text
+
+
+def cached_search(query: str) -> str:
+    """
+    Grounded search with result caching and single-flight coalescing.
+
+    Concurrent callers asking the same normalized query wait for one in-flight
+    call. Failed searches are not cached.
+    """
+    key = normalize_query(query)
+
+    result = _search_cache.get(key)
+    if result is not None:
+        SEARCH_REQUESTS.inc(result="hit")
+        return result
+
+    with _inflight_lock:
+        call = _inflight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _InFlightSearch()
+            _inflight[key] = call
+
+    if not is_leader:
+        SEARCH_REQUESTS.inc(result="coalesced")
+        with _stats_lock:
+            _stats["coalesced"] += 1
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        SEARCH_REQUESTS.inc(result="miss")
+        with span("rate_limit_wait"):
+            acquire_llm_token(SEARCH_MODEL)
+        LLM_CALLS.inc(component="search")
+        with span("search"):
+            call.result = _run_search(query)
+        _search_cache.set(key, call.result)
+        return call.result
+    except BaseException as e:
+        SEARCH_REQUESTS.inc(result="error")
+        call.error = e
+        with _stats_lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+
+def search_stats() -> dict:
+    """Cache hit/miss counters, API calls made and requests coalesced onto in-flight calls."""
+    cache_stats = _search_cache.stats()
+    with _stats_lock:
+        return {
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "cached_queries": cache_stats["size"],
+            "evictions": cache_stats["evictions"],
+            **_stats
+        }
+
+
+def get_google_search_tool():
+    """Returns the CrewAI tool wrapping `cached_search`, built on first use."""
+    global _search_tool
+    with _search_tool_lock:
+        if _search_tool is None:
+            _search_tool = _build_google_search_tool()
+        return _search_tool
+
+
+def _build_google_search_tool():
+    from crewai.tools import tool
+
+    @tool("Google Search Tool")
+    def google_search(query: str) -> str:
+        """
+        Search Google for current information using Gemini's grounding feature.
+
+        Use this tool when you need real-time data such as:
+        - Current prices
+        - Opening hours
+        - Recent events
+        - Any information that changes frequently
+
+        Args:
+            query: Search query (e.g., "Louvre Museum ticket price 2025")
+
+        Returns:
+            Search results as formatted text
+        """
+        return cached_search(query)
+
+    return google_search
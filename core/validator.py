@@ -0,0 +1,270 @@
+"""
+Deterministic checks of generated itineraries.
+
+The planner prompts ask for exactly N days, at most 4 paid attractions a day,
+activities in time order, prices that fit the budget level and under 10 km of
+walking a day; this module
+verifies those rules locally, without an LLM, by parsing the free-text
+`time_slot`, `duration` and `cost_estimate` fields of each activity. Walking
+distance is only known for days the route optimizer could locate.
+
+Violations are reported per day so only the offending days need to go back to
+the planner (see `core.crew.validate_and_repair`). The budget limits are in
+euros: amounts in another recognised currency are converted with the rough
+rates of EUR_RATES, and amounts without a currency are taken as euros.
+"""
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+from .models import Itinerary, DayPlan
+from .preferences import normalize_budget
+
+MAX_PAID_ATTRACTIONS_PER_DAY = 4
+# Daily walking between located landmarks (see core.routing) above this is a violation
+MAX_WALKING_KM = float(os.getenv("MAX_WALKING_KM", "10"))
+
+# Most expensive single activity and day total per budget level, in euros (None: no limit)
+ACTIVITY_COST_LIMITS = {"low": 40.0, "medium": 120.0, "high": None}
+DAILY_COST_LIMITS = {"low": 100.0, "medium": 300.0, "high": None}
+# Approximate euros per unit of each currency; close enough for budget levels
+EUR_RATES = {
+    "EUR": 1.0, "USD": 0.92, "GBP": 1.17, "CHF": 1.05, "DKK": 0.134, "SEK": 0.088, "NOK": 0.086,
+    "CZK": 0.04, "HUF": 0.0025, "PLN": 0.23, "JPY": 0.0061, "KRW": 0.00068
+}
+# Currency symbols and words as written in cost estimates
+CURRENCY_CODES = {"€": "EUR", "$": "USD", "£": "GBP", "¥": "JPY", "₩": "KRW", "EURO": "EUR", "EUROS": "EUR", "YEN": "JPY", "WON": "KRW"}
+
+# Time-of-day words, longest phrases first, as minutes after midnight
+TIME_WORDS = (
+    ("early morning", 7 * 60), ("late morning", 10 * 60 + 30), ("early afternoon", 13 * 60 + 30),
+    ("late afternoon", 16 * 60 + 30), ("late evening", 21 * 60), ("late night", 22 * 60 + 30),
+    ("breakfast", 8 * 60), ("morning", 9 * 60), ("midday", 12 * 60), ("noon", 12 * 60), ("lunch", 12 * 60 + 30),
+    ("afternoon", 14 * 60), ("sunset", 19 * 60), ("evening", 18 * 60 + 30), ("dinner", 19 * 60 + 30),
+    ("night", 21 * 60)
+)
+DURATION_WORDS = (("full day", 480), ("all day", 480), ("half day", 240), ("half an hour", 30), ("an hour", 60))
+
+# Costs that are not attraction tickets
+NON_ATTRACTION_WORDS = (
+    "breakfast", "lunch", "dinner", "brunch", "coffee", "cafe", "café", "restaurant", "trattoria", "bistro",
+    "snack", "gelato", "drinks", "aperitivo", "bar", "food", "hotel", "check-in", "check-out", "taxi", "metro",
+    "bus", "train", "transfer"
+)
+FREE_WORDS = ("free", "included", "no charge", "no cost")
+
+_CLOCK = re.compile(r"\b(\d{1,2})(?:[:.h](\d{2}))?\s*(a\.?m\.?|p\.?m\.?)?(?![\d%])", re.IGNORECASE)
+_DURATION = re.compile(
+    r"(\d+(?:[.,]\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:[.,]\d+)?))?\s*(hours?|hrs?|h|minutes?|mins?|m)\b", re.IGNORECASE
+)
+_AMOUNT = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:[.,]\d+)?")
+_NON_ATTRACTION = re.compile(r"\b(?:" + "|".join(re.escape(word) for word in NON_ATTRACTION_WORDS) + r")\b")
+_COMPACT_DURATION = re.compile(r"(\d+)\s*h\s*(\d{2})\b")
+_THOUSANDS = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+_CURRENCY = re.compile(r"[€$£¥₩]|\b(?:eur|euros?|usd|gbp|chf|czk|huf|dkk|sek|nok|pln|jpy|yen|krw|won)\b", re.IGNORECASE)
+
+
+@dataclass
+class Cost:
+    """A parsed cost estimate: the highest amount mentioned (0 for free) and its ISO currency code, if given."""
+    amount: float
+    currency: Optional[str] = None
+
+    @property
+    def is_free(self) -> bool:
+        return self.amount <= 0
+
+    @property
+    def in_eur(self) -> float:
+        """The amount in euros (see EUR_RATES); amounts without a currency are taken as euros."""
+        return self.amount * EUR_RATES.get(self.currency or "EUR", 1.0)
+
+
+@dataclass
+class Violation:
+    """One broken rule; `day_number` is None for trip-level problems."""
+    rule: str
+    message: str
+    day_number: Optional[int] = None
+
+
+def parse_time_slot(time_slot: str) -> Optional[int]:
+    """
+    Start of a time slot in minutes after midnight.
+
+    "09:00", "9am", "14:00-16:00", "2.30 pm" and "Morning" map to 540, 540, 840, 870
+    and 540. Returns None when no time can be read.
+    """
+    text = (time_slot or "").strip().lower()
+    for match in _CLOCK.finditer(text):
+        hours, minutes, meridiem = int(match.group(1)), match.group(2), match.group(3)
+        if minutes is None and meridiem is None:
+            continue
+        if meridiem:
+            if hours > 12:
+                continue
+            hours = hours % 12 + (12 if meridiem.startswith("p") else 0)
+        if hours < 24 and int(minutes or 0) < 60:
+            return hours * 60 + int(minutes or 0)
+    for word, minutes in TIME_WORDS:
+        if word in text:
+            return minutes
+    return None
+
+
+def parse_duration(duration: str) -> Optional[int]:
+    """
+    Duration in minutes: "2 hours", "1.5h", "90 minutes", "1h 30min", "2-3 hours" (the
+    midpoint) and "half day". Returns None when no duration can be read.
+    """
+    text = (duration or "").strip().lower()
+    total = 0.0
+    found = False
+    # "1h30" has no unit after the minutes
+    compact = _COMPACT_DURATION.search(text)
+    if compact:
+        total += int(compact.group(1)) * 60 + int(compact.group(2))
+        text = text.replace(compact.group(0), " ")
+        found = True
+    for match in _DURATION.finditer(text):
+        low = float(match.group(1).replace(",", "."))
+        high = float(match.group(2).replace(",", ".")) if match.group(2) else low
+        value = (low + high) / 2
+        total += value * (60 if match.group(3).startswith("h") else 1)
+        found = True
+    if found:
+        return int(round(total))
+    for word, minutes in DURATION_WORDS:
+        if word in text:
+            return minutes
+    return None
+
+
+def _to_number(value: str) -> float:
+    """"1,200" is a thousands separator, "12,50" a decimal comma."""
+    if "," in value and _THOUSANDS.fullmatch(value):
+        return float(value.replace(",", ""))
+    return float(value.replace(",", "."))
+
+
+def parse_cost(cost_estimate: str) -> Optional[Cost]:
+    """
+    Parses a cost estimate: "€20", "20 EUR per person", "$15-25" (the upper end),
+    "Free" and "€0" (amount 0). Returns None for "Varies", "Data Unavailable" and the like.
+    """
+    text = (cost_estimate or "").strip().lower()
+    currency_match = _CURRENCY.search(text)
+    currency = currency_match.group(0).upper() if currency_match else None
+    currency = CURRENCY_CODES.get(currency, currency)
+    amounts = [_to_number(value) for value in _AMOUNT.findall(text)]
+    if amounts:
+        return Cost(amount=max(amounts), currency=currency)
+    if any(word in text for word in FREE_WORDS):
+        return Cost(amount=0.0, currency=currency)
+    return None
+
+
+def is_non_attraction(name: str) -> bool:
+    """Meals, drinks, lodging and transport."""
+    return _NON_ATTRACTION.search(name.lower()) is not None
+
+
+def is_paid_attraction(name: str, cost: Optional[Cost]) -> bool:
+    """Activities with a non-zero cost that are not meals, drinks, lodging or transport."""
+    if cost is None or cost.is_free:
+        return False
+    return not is_non_attraction(name)
+
+
+def validate_day(day: DayPlan, budget: Optional[str] = None) -> list[Violation]:
+    """Checks one day: paid-attraction cap, time order, the budget limits and walking distance."""
+    violations = []
+    level = normalize_budget(budget)
+    activity_limit = ACTIVITY_COST_LIMITS.get(level)
+    daily_limit = DAILY_COST_LIMITS.get(level)
+
+    paid = 0
+    total = 0.0
+    previous_start, previous_name = None, None
+    for activity in day.activities:
+        cost = parse_cost(activity.cost_estimate)
+        if is_paid_attraction(activity.name, cost):
+            paid += 1
+        if cost is not None:
+            total += cost.in_eur
+            if activity_limit is not None and cost.in_eur > activity_limit:
+                violations.append(Violation(
+                    "activity_budget",
+                    f"'{activity.name}' costs {activity.cost_estimate}, above the {level} budget limit of €{activity_limit:g}",
+                    day.day_number
+                ))
+
+        start = parse_time_slot(activity.time_slot)
+        if start is not None:
+            if previous_start is not None and start < previous_start:
+                violations.append(Violation(
+                    "time_order",
+                    f"'{activity.name}' at {activity.time_slot} is scheduled before '{previous_name}'",
+                    day.day_number
+                ))
+            previous_start, previous_name = start, activity.name
+
+    if paid > MAX_PAID_ATTRACTIONS_PER_DAY:
+        violations.append(Violation(
+            "paid_attractions",
+            f"{paid} paid attractions, at most {MAX_PAID_ATTRACTIONS_PER_DAY} allowed",
+            day.day_number
+        ))
+    if daily_limit is not None and total > daily_limit:
+        violations.append(Violation(
+            "daily_budget",
+            f"activities total about €{total:.0f}, above the {level} daily limit of €{daily_limit:g}",
+            day.day_number
+        ))
+    if day.walking_km is not None and day.walking_km > MAX_WALKING_KM:
+        violations.append(Violation(
+            "walking_distance",
+            f"about {day.walking_km:g} km of walking, above the limit of {MAX_WALKING_KM:g} km",
+            day.day_number
+        ))
+    return violations
+
+
+def validate_itinerary(itinerary: Itinerary, days: Optional[int], budget: Optional[str] = None) -> list[Violation]:
+    """
+    Checks an itinerary against the planning rules.
+
+    Args:
+        itinerary: Generated itinerary
+        days: Requested number of days (None skips the day-count check)
+        budget: Requested budget level (unknown levels skip the cost limits)
+
+    Returns:
+        list[Violation]: Every problem found, trip-level first
+    """
+    violations = []
+    numbers = [day.day_number for day in itinerary.days]
+    if days is not None and len(itinerary.days) != days:
+        violations.append(Violation("day_count", f"{len(itinerary.days)} days planned, {days} requested"))
+    if numbers != list(range(1, len(numbers) + 1)):
+        violations.append(Violation("day_numbers", f"days are numbered {numbers}"))
+    for day in itinerary.days:
+        violations.extend(validate_day(day, budget))
+    return violations
+
+
+def sort_by_time(day: DayPlan) -> bool:
+    """
+    Puts a day's activities in time order when every slot can be read.
+
+    Returns:
+        bool: True if the order changed
+    """
+    starts = [parse_time_slot(activity.time_slot) for activity in day.activities]
+    if any(start is None for start in starts):
+        return False
+    ordered = [activity for _, _, activity in sorted(zip(starts, range(len(starts)), day.activities))]
+    if ordered == day.activities:
+        return False
+    day.activities = ordered
+    return True
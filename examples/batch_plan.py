@@ -0,0 +1,43 @@
+"""
+Batch planning CLI: plans every JSONL preference record of a file.
+
+Input, one record per line:
+    {"id": "c-1", "destination": "Rome", "duration": "3", "interests": "Food, Art", "budget": "Medium"}
+
+Usage:
+    python -m examples.batch_plan requests.jsonl -o plans.jsonl --concurrency 8
+    cat requests.jsonl | python -m examples.batch_plan - > plans.jsonl
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from core.batch import run_batch, BATCH_CONCURRENCY
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of preference records, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Crews running at the same time")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    statuses = Counter()
+    try:
+        for result in run_batch(source, concurrency=args.concurrency):
+            statuses[result["status"]] += 1
+            target.write(json.dumps(result, default=str) + "\n")
+            target.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+
+    print(f"Batch done: {dict(statuses)}", file=sys.stderr)
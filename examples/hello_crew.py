@@ -1,7 +1,6 @@
 """
 Simple CLI demo for the Travel Companion AI system.
 """
-from core.crew import run_travel_planning
 from core.models import Itinerary
 
 
@@ -48,6 +47,9 @@ if __name__ == "__main__":
         budget = "Medium"
     
     print(f"\nPlanning a {duration}-day trip to {destination}...\n")
+
+    # Imported after the prompts: loading CrewAI takes seconds
+    from core.crew import run_travel_planning
     
     # Run the crew with all preferences
     result = run_travel_planning(
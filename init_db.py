@@ -2,9 +2,15 @@
 Initialize database tables.
 Run this once to create tables: python init_db.py
 """
-from core.database import init_db
+from core.database import init_db, SessionLocal
+from core.itinerary_store import backfill_from_sessions
 
 if __name__ == "__main__":
     print("Creating database tables...")
     init_db()
+    db = SessionLocal()
+    try:
+        backfill_from_sessions(db)
+    finally:
+        db.close()
     print("✅ Done!")
\ No newline at end of file
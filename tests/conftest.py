@@ -0,0 +1,14 @@
+"""
+Shared test setup: the repository root on sys.path and a throwaway SQLite
+database, so core modules import without Postgres or API keys, and no log file.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/tests.db")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# No file sink: the suite must not write logs/ into the working tree
+os.environ["LOG_FILE"] = ""
@@ -0,0 +1,46 @@
+"""Admission control caps."""
+from core.admission import ConcurrencyLimiter
+
+
+def test_caps_reject_and_release():
+    limiter = ConcurrencyLimiter("planning", limit=2, per_key_limit=1)
+    assert limiter.try_acquire("alice") is None
+    assert limiter.try_acquire("alice") is not None
+    assert limiter.try_acquire("bob") is None
+    assert limiter.try_acquire("carol") is not None
+    limiter.release("alice")
+    assert limiter.try_acquire("carol") is None
+
+
+def test_forced_acquisition_skips_both_caps_and_is_counted():
+    limiter = ConcurrencyLimiter("planning", limit=1, per_key_limit=1)
+    assert limiter.try_acquire("alice") is None
+    assert limiter.try_acquire("alice", force=True) is None
+    assert limiter.try_acquire("bob", force=True) is None
+    assert limiter.stats()["active"] == 3
+    assert limiter.stats()["rejected"] == 0
+    # Forced slots still count against later, unforced requests
+    assert limiter.try_acquire("alice") is not None
+    for key in ("alice", "alice", "bob"):
+        limiter.release(key)
+    assert limiter.in_use() == 0
+
+
+def test_resumed_jobs_count_against_their_admission_key(monkeypatch):
+    from core import jobs
+    from core.database import Base, engine, SessionLocal
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(jobs, "get_executor", lambda: type("Executor", (), {"submit": lambda *args: None})())
+    limiter = ConcurrencyLimiter("planning", limit=10, per_key_limit=1)
+    monkeypatch.setattr(jobs, "planning_jobs", limiter)
+
+    db = SessionLocal()
+    jobs.new_planning_job(db, "session-1", {}, admission_key="user-1")
+    db.commit()
+    db.close()
+
+    assert jobs.resume_pending_jobs() == 1
+    assert limiter.try_acquire("user-1") is not None
+    assert limiter.try_acquire("session-1") is None
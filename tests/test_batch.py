@@ -0,0 +1,34 @@
+"""Batch planning admission."""
+import json
+from core import batch, crew
+from core.admission import planning_jobs
+from core.models import Itinerary, ResearchOutput
+
+
+class Planned:
+    def __init__(self, destination: str):
+        self.pydantic = Itinerary(trip_title=destination, summary="", days=[])
+
+
+def test_batch_crews_hold_planning_slots_of_their_owner(monkeypatch):
+    slots = []
+
+    def research(destination, emit):
+        slots.append(planning_jobs._active.get("partner-7", 0))
+        return ResearchOutput(destination=destination, facts=[])
+
+    def plan(research=None, **preferences):
+        slots.append(planning_jobs._active.get("partner-7", 0))
+        return Planned(preferences["destination"])
+
+    monkeypatch.setattr(crew, "resolve_research", research)
+    monkeypatch.setattr(crew, "run_travel_planning", plan)
+    monkeypatch.setattr(batch, "get_cached_itinerary", lambda preferences: None)
+    monkeypatch.setattr(batch, "store_itinerary", lambda preferences, itinerary: None)
+    lines = [json.dumps({"destination": "Lisbon", "budget": budget}) for budget in ("low", "high")]
+
+    results = list(batch.run_batch(lines, concurrency=1, owner="partner-7"))
+
+    assert [result["status"] for result in results] == ["completed", "completed"]
+    assert slots == [1, 1, 1]
+    assert planning_jobs._active.get("partner-7", 0) == 0
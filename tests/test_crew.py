@@ -0,0 +1,44 @@
+"""Progress events of single-crew planning."""
+from core import crew
+from core.models import Activity, DayPlan, Itinerary, ResearchOutput
+from core.validator import Violation
+
+
+def _day(number: int) -> DayPlan:
+    return DayPlan(day_number=number, theme="Sights", activities=[
+        Activity(name=f"Museum {number}", description="", time_slot="10:00", duration="2 hours", cost_estimate="€10")
+    ])
+
+
+def test_days_are_streamed_before_repair_crews_run(monkeypatch):
+    events = []
+    checks = iter([[Violation("cost", "Too expensive", day_number=2)], []])
+    monkeypatch.setattr(crew, "validate_itinerary", lambda itinerary, days, budget: next(checks))
+
+    def repair(inputs, plan, research, problems):
+        events.append(("repair", plan.day_number))
+        return plan.model_copy(update={"theme": "Repaired"})
+
+    monkeypatch.setattr(crew, "repair_day", repair)
+    itinerary = Itinerary(trip_title="Trip", summary="", days=[_day(1), _day(2)])
+    inputs = {"destination": "Atlantis", "duration": "2", "interests": "art", "budget": "low"}
+
+    crew.validate_and_repair(itinerary, inputs, ResearchOutput(destination="Atlantis", facts=[]),
+                             lambda event, payload: events.append((event, payload["day_number"])), streamed={})
+
+    assert events == [("day_plan", 1), ("day_plan", 2), ("repair", 2), ("day_plan", 2)]
+
+
+def test_days_changed_after_streaming_are_streamed_again(monkeypatch):
+    events = []
+    monkeypatch.setattr(crew, "validate_itinerary", lambda itinerary, days, budget: [])
+    first, second = _day(1), _day(2)
+    streamed = {plan.day_number: plan.model_dump() for plan in (first, second)}
+    # Changed by a later step (cross-day check, time order or routing) after it was streamed
+    second.activities[0].name = "Museum 1"
+    itinerary = Itinerary(trip_title="Trip", summary="", days=[first, second])
+    inputs = {"destination": "Atlantis", "duration": "2", "interests": "art", "budget": "low"}
+
+    crew.validate_and_repair(itinerary, inputs, None, lambda event, payload: events.append(payload), streamed=streamed)
+
+    assert [(payload["day_number"], payload["activities"][0]["name"]) for payload in events] == [(2, "Museum 1")]
@@ -0,0 +1,19 @@
+"""Destination resolution against the offline gazetteer."""
+import pytest
+from core import gazetteer
+
+
+@pytest.mark.parametrize("name, expected", [("Roma", "Rome"), ("paris", "Paris"), ("Paris, France", "Paris")])
+def test_resolve_exact_and_alias(name, expected):
+    assert gazetteer.resolve(name).name == expected
+
+
+@pytest.mark.parametrize("name", ["Paros", "Parma", "Yalta", "Sienna"])
+def test_resolve_does_not_replace_unknown_places_with_near_misses(name):
+    assert gazetteer.resolve(name) is None
+
+
+def test_near_misses_are_only_suggestions():
+    assert gazetteer.suggest("Parma").name == "Palma"
+    assert gazetteer.suggest("Pariss").name == "Paris"
+    assert gazetteer.resolve("Pariss") is None
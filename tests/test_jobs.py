@@ -0,0 +1,87 @@
+"""Planning job claiming and lease recovery across worker processes."""
+import time
+from datetime import datetime, timedelta
+import pytest
+from core import jobs
+from core.database import Base, engine, SessionLocal, PlanningJob
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        self.submitted.append(args)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    executor = RecordingExecutor()
+    monkeypatch.setattr(jobs, "get_executor", lambda: executor)
+    session = SessionLocal()
+    session.executor = executor
+    yield session
+    session.close()
+
+
+def add_job(db, status="queued", owner=None, heartbeat_at=None) -> str:
+    job = jobs.new_planning_job(db, "session", {"destination": "Rome"})
+    job.status, job.owner, job.heartbeat_at = status, owner, heartbeat_at
+    db.commit()
+    return job.job_id
+
+
+def test_only_one_worker_claims_a_job(db):
+    job_id = add_job(db)
+    assert jobs.claim_job(db, job_id)
+    assert not jobs.claim_job(SessionLocal(), job_id)
+    assert jobs.get_job(db, job_id).owner == jobs.WORKER_ID
+
+
+def test_resume_leaves_jobs_of_live_workers_alone(db):
+    live = add_job(db, "running", "other-worker", datetime.utcnow())
+    dead = add_job(db, "running", "dead-worker", datetime.utcnow() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 1))
+    queued = add_job(db)
+
+    assert jobs.resume_pending_jobs() == 2
+    assert sorted(args[0] for args in db.executor.submitted) == sorted([dead, queued])
+    db.expire_all()
+    assert jobs.get_job(db, live).status == "running"
+    assert jobs.get_job(db, dead).status == "queued"
+
+
+def test_expired_jobs_only_are_recovered_periodically(db):
+    dead = add_job(db, "running", "dead-worker", None)
+    add_job(db)
+
+    assert jobs.resume_pending_jobs(include_queued=False) == 1
+    assert [args[0] for args in db.executor.submitted] == [dead]
+
+
+def test_startup_recovers_jobs_of_a_dead_process_without_new_traffic(db, monkeypatch):
+    class Pool(RecordingExecutor):
+        def __init__(self, **options):
+            super().__init__()
+            db.executor = self
+
+        def shutdown(self, **options):
+            pass
+
+    monkeypatch.undo()
+    monkeypatch.setattr(jobs, "ThreadPoolExecutor", Pool)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+    # Still within its lease when this process starts
+    dead = add_job(db, "running", "previous-process", datetime.utcnow())
+
+    try:
+        assert jobs.start_workers() == 0
+        for _ in range(100):
+            if db.executor.submitted:
+                break
+            time.sleep(0.02)
+    finally:
+        jobs.shutdown_workers()
+    assert [args[0] for args in db.executor.submitted] == [dead]
@@ -0,0 +1,18 @@
+"""Per-session failure log buffer."""
+from core.logger import logger, get_logger, dump_session_logs
+
+
+def test_dump_includes_records_still_in_the_queue():
+    dumped = []
+    sink = logger.add(dumped.append, level="ERROR", filter=lambda record: record["extra"].get("ring_dump"))
+    try:
+        log = get_logger(__name__).bind(session_id="ring-test")
+        for step in range(20):
+            log.info("step {}", step)
+        dump_session_logs("ring-test", "Turn failed")
+    finally:
+        logger.remove(sink)
+
+    assert len(dumped) == 1
+    assert "last 20 log records" in dumped[0]
+    assert "step 19" in dumped[0]
@@ -0,0 +1,63 @@
+"""Speculative research prefetch."""
+import threading
+import time
+import pytest
+from core import prefetch
+from core.admission import current_priority, priority_scope, PRIORITY_PLANNING, PRIORITY_PREFETCH
+from core.metrics import PREFETCHES
+
+
+@pytest.fixture
+def research_pool(monkeypatch):
+    """One prefetch worker whose research blocks until `release` is set; records the priority it ends with."""
+    release, priorities = threading.Event(), []
+
+    def run(item):
+        with priority_scope(item.priority):
+            release.wait(5)
+            priorities.append(current_priority())
+        return f"research for {item.destination}"
+
+    monkeypatch.setattr(prefetch, "_run", run)
+    monkeypatch.setattr(prefetch, "PREFETCH_WORKERS", 1)
+    monkeypatch.setattr(prefetch, "RESEARCH_PREFETCH_ENABLED", True)
+    prefetch.shutdown_prefetch()
+    yield release, priorities
+    release.set()
+    prefetch.shutdown_prefetch()
+
+
+def test_shared_prefetch_counts_one_hit(research_pool):
+    release, _ = research_pool
+    hits = PREFETCHES.value(outcome="hit")
+    prefetch.prefetch_research("shared-a", "Lisbon")
+    prefetch.prefetch_research("shared-b", "Lisbon")
+    release.set()
+
+    assert prefetch.take_prefetched_research("shared-a", "Lisbon") == "research for Lisbon"
+    assert prefetch.take_prefetched_research("shared-b", "Lisbon") == "research for Lisbon"
+    assert PREFETCHES.value(outcome="hit") - hits == 1
+    assert prefetch.prefetch_stats()["hit_rate"] <= 1
+
+
+def test_waiting_job_raises_the_running_prefetch_priority(research_pool):
+    release, priorities = research_pool
+    prefetch.prefetch_research("waiting", "Oslo")
+    while not prefetch._by_session.get("waiting").future.running():
+        time.sleep(0.001)
+    threading.Timer(0.1, release.set).start()
+
+    with priority_scope(PRIORITY_PLANNING):
+        assert prefetch.take_prefetched_research("waiting", "Oslo") == "research for Oslo"
+    assert priorities == [PRIORITY_PLANNING] and PRIORITY_PLANNING < PRIORITY_PREFETCH
+
+
+def test_job_does_not_wait_for_a_queued_prefetch(research_pool):
+    release, _ = research_pool
+    prefetch.prefetch_research("busy", "Rome")
+    prefetch.prefetch_research("queued", "Bergen")
+
+    assert prefetch.take_prefetched_research("queued", "Bergen") is None
+    # Its only session left, so the queued prefetch is dropped
+    assert PREFETCHES.value(outcome="cancelled") >= 1
+    release.set()
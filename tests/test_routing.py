@@ -0,0 +1,51 @@
+"""Regrouping planned landmarks by area."""
+from core.models import Activity, DayPlan, DaySkeleton, Itinerary, TripSkeleton
+from core.routing import regroup_days, regroup_skeleton
+
+# Vatican-side and Colosseum-side landmarks, mixed across two days
+MIXED_DAYS = [
+    ["Colosseum", "Vatican Museums", "Roman Forum"],
+    ["St. Peter's Basilica", "Palatine Hill", "Castel Sant'Angelo"]
+]
+AREAS = [{"Colosseum", "Roman Forum", "Palatine Hill"}, {"Vatican Museums", "St. Peter's Basilica", "Castel Sant'Angelo"}]
+
+
+def _activity(name: str, time_slot: str) -> Activity:
+    return Activity(name=name, description=name, time_slot=time_slot, duration="1 hour", cost_estimate="Free")
+
+
+def test_skeleton_days_are_grouped_by_area():
+    skeleton = TripSkeleton(
+        trip_title="Rome", summary="Rome", wow_experience="Trevi Fountain", wow_day=1,
+        days=[DaySkeleton(day_number=number, theme="Sights", area="Rome", landmarks=list(landmarks))
+              for number, landmarks in enumerate(MIXED_DAYS, start=1)]
+    )
+    assert regroup_skeleton("Rome", skeleton)
+    assert all(set(day.landmarks) in AREAS for day in skeleton.days)
+
+
+def test_short_trip_days_are_grouped_by_area_and_keep_their_slots():
+    slots = ["09:00", "11:00", "13:00", "15:00"]
+    itinerary = Itinerary(trip_title="Rome", summary="Rome", days=[
+        DayPlan(day_number=number, theme="Sights", activities=[
+            *(_activity(name, slot) for name, slot in zip(landmarks[:2], slots)),
+            _activity("Lunch at a trattoria", slots[2]),
+            _activity(landmarks[2], slots[3])
+        ])
+        for number, landmarks in enumerate(MIXED_DAYS, start=1)
+    ])
+    assert regroup_days("Rome", itinerary)
+    for day in itinerary.days:
+        names = [activity.name for activity in day.activities]
+        assert names[2] == "Lunch at a trattoria"
+        assert set(names[:2] + names[3:]) in AREAS
+        assert [activity.time_slot for activity in day.activities] == slots
+
+
+def test_cities_without_coordinates_are_left_alone():
+    itinerary = Itinerary(trip_title="Nowhere", summary="", days=[
+        DayPlan(day_number=number, theme="", activities=[_activity(name, "10:00") for name in landmarks])
+        for number, landmarks in enumerate(MIXED_DAYS, start=1)
+    ])
+    assert not regroup_days("Atlantis", itinerary)
+    assert [[activity.name for activity in day.activities] for day in itinerary.days] == MIXED_DAYS
@@ -0,0 +1,23 @@
+"""Write-behind session cache."""
+from core.database import empty_preferences
+from core.session_cache import SessionCache
+
+
+def test_overlapping_turns_of_one_session_keep_both_answers():
+    cache = SessionCache()
+    cache.put("overlap", None, empty_preferences())
+    base = dict(cache._find("overlap").data)
+
+    # Both turns read the same preferences before either stored its answer
+    cache.put("overlap", None, {**base, "duration": "3 days"}, base=base)
+    session = cache.put("overlap", None, {**base, "budget": "Low"}, base=base)
+
+    assert session.data["duration"] == "3 days"
+    assert session.data["budget"] == "Low"
+    assert session.dirty
+
+
+def test_put_without_base_replaces_the_preferences():
+    cache = SessionCache()
+    cache.put("replace", None, {**empty_preferences(), "duration": "3 days"})
+    assert cache.put("replace", None, empty_preferences()).data["duration"] is None
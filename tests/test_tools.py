@@ -0,0 +1,11 @@
+"""Search cache keys."""
+from core.tools import normalize_query
+
+
+def test_word_order_is_part_of_the_key():
+    assert normalize_query("train from Florence to Rome") != normalize_query("train from Rome to Florence")
+
+
+def test_case_punctuation_spacing_and_articles_are_ignored():
+    assert normalize_query("Louvre ticket price 2025") == normalize_query("the louvre  ticket price, 2025?")
+    assert normalize_query("Opening hours of the the Uffizi") == "opening hours of uffizi"
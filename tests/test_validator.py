@@ -0,0 +1,26 @@
+"""Budget limits of the itinerary validator."""
+import pytest
+from core.models import Activity, DayPlan
+from core.validator import validate_day
+
+
+def _day(*costs: str) -> DayPlan:
+    return DayPlan(day_number=1, theme="Sights", activities=[
+        Activity(name=f"Temple {index}", description="", time_slot=f"{9 + index}:00", duration="1 hour", cost_estimate=cost)
+        for index, cost in enumerate(costs)
+    ])
+
+
+@pytest.mark.parametrize("costs", [("¥500", "¥1,500", "¥2000"), ("3000 HUF", "4500 HUF"), ("₩15,000", "20000 KRW")])
+def test_non_euro_amounts_are_converted_before_the_limits(costs):
+    assert validate_day(_day(*costs), "low") == []
+
+
+def test_expensive_amounts_are_still_flagged_in_any_currency():
+    rules = [violation.rule for violation in validate_day(_day("¥12,000", "¥6000"), "low")]
+    assert rules == ["activity_budget", "daily_budget"]
+
+
+def test_euro_limits_are_unchanged():
+    rules = [violation.rule for violation in validate_day(_day("€50", "€60"), "low")]
+    assert rules == ["activity_budget", "activity_budget", "daily_budget"]